@@ -1,102 +1,4 @@
-import os
-import sqlite3
-from datetime import datetime
-
-class ExpenseTracker:
-    def __init__(self):
-        self.categories = ["Food", "Transportation", "Housing", "Entertainment", "Utilities", "Other"]
-        self.db_file = "expenses.db"
-        self.init_db()
-    
-    def get_db_connection(self):
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        return conn
-    
-    def init_db(self):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        # Create expenses table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            amount REAL NOT NULL,
-            category TEXT NOT NULL,
-            description TEXT,
-            date TEXT NOT NULL
-        )
-        ''')
-        
-        # Create categories table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
-        )
-        ''')
-        
-        # Insert default categories if they don't exist
-        for category in self.categories:
-            cursor.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (category,))
-        
-        conn.commit()
-        conn.close()
-    
-    def add_expense(self, amount, category, description=""):
-        if category not in self.categories:
-            return False
-        
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO expenses (amount, category, description, date) VALUES (?, ?, ?, ?)",
-            (float(amount), category, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        )
-        conn.commit()
-        conn.close()
-        return True
-    
-    def remove_expense(self, expense_id):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
-        
-        if cursor.rowcount > 0:
-            conn.commit()
-            conn.close()
-            return True
-        
-        conn.close()
-        return False
-    
-    def get_expenses(self, category=None):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        if category and category != "All":
-            cursor.execute("SELECT * FROM expenses WHERE category = ?", (category,))
-        else:
-            cursor.execute("SELECT * FROM expenses")
-        
-        expenses = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return expenses
-    
-    def get_total(self, category=None):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        if category and category != "All":
-            cursor.execute("SELECT SUM(amount) as total FROM expenses WHERE category = ?", (category,))
-        else:
-            cursor.execute("SELECT SUM(amount) as total FROM expenses")
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        # Return 0 if no expenses found
-        return result['total'] or 0
+from expense_repository import get_repository
 
 
 def display_menu():
@@ -111,7 +13,7 @@ def display_menu():
 
 
 def main():
-    tracker = ExpenseTracker()
+    tracker = get_repository()
     
     while True:
         choice = display_menu()
@@ -177,6 +79,8 @@ def main():
                     expense_id = int(input("Enter the ID of the expense to remove: "))
                     if tracker.remove_expense(expense_id):
                         print("Expense removed successfully!")
+                    elif tracker.is_archived(expense_id):
+                        print("That expense is archived and cannot be removed.")
                     else:
                         print("Expense ID not found.")
                 except ValueError:
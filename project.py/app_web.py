@@ -1,10 +1,33 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, send_file
+import io
+import mimetypes
 import os
 import sqlite3
+import threading
 from datetime import datetime
 
+from assets import (COMPRESSIBLE_MIMETYPES, IMMUTABLE_CACHE_CONTROL, MIN_COMPRESS_SIZE, AssetManifest,
+                    gzip_body, preferred_encoding)
+from cache import VersionedCache
+from changefeed import HEARTBEAT, HEARTBEAT_INTERVAL, ChangeFeed, Subscription
+from charts import CHART_FORMATS, CHART_KINDS, ChartRenderer
+from expense_repository import DEFAULT_PAGE_SIZE, get_repository, parse_cursor
+from exporter import EXPORT_FORMATS, gzip_chunks, iter_export
+import instrumentation
+from importer import DEFAULT_BATCH_SIZE, get_reader
+from ledgers import DEFAULT_LEDGER_DIR, LedgerAggregator, LedgerHandleCache, LedgerRouter
+from reports import REPORT_FORMATS, Period, format_reports, periods_for_year
+from search import SearchQuery
+from snapshot import DEFAULT_MAX_STALENESS
+from stats import DEFAULT_WARN_RATIO, check_month, current_month
+from trend import BUCKETS, DEFAULT_POINTS, MAX_POINTS
+from writebehind import DEFAULT_FLUSH_INTERVAL, DEFAULT_WRITE_BATCH_SIZE, QueueFull
+
 app = Flask(__name__)
 
+# Upper limit for the paginated expense views
+MAX_PAGE_SIZE = 500
+
 # Add template filters
 @app.template_filter('formatdate')
 def format_date(value, format='%Y-%m-%d'):
@@ -16,148 +39,172 @@ def format_date(value, format='%Y-%m-%d'):
 
 @app.context_processor
 def inject_now():
-    return {'now': datetime}
-
-class ExpenseTracker:
-    def __init__(self):
-        self.categories = ["Food", "Transportation", "Housing", "Entertainment", "Utilities", "Other"]
-        self.db_file = "expenses.db"
-        self.init_db()
-    
-    def get_db_connection(self):
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        return conn
-    
-    def init_db(self):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        # Create expenses table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            amount REAL NOT NULL,
-            category TEXT NOT NULL,
-            description TEXT,
-            date TEXT NOT NULL
-        )
-        ''')
-        
-        # Create categories table if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
+    return {'now': datetime, 'asset_url': asset_url}
+
+def asset_url(name):
+    """URL of a file under static/: its hashed copy once `python assets.py build` has run"""
+    filename = asset_manifest.lookup(name)
+    if filename is None:
+        return url_for('static', filename=name)
+    return url_for('asset_file', filename=filename)
+
+def get_page_args(args=None):
+    """Read and validate the limit/after pagination query parameters"""
+    if args is None:
+        args = request.args
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    return limit, args.get('after') or None
+
+
+# Startup: metrics, the ledger (migrated on open) and the background threads.
+# Chart workers are spawned processes (see charts.py), which re-import the
+# entry module as __mp_main__ when this file is run as a script; they only
+# render, so none of this may run there.
+if __name__ != '__mp_main__':
+    # Per-statement and per-route metrics at /metrics (set EXPENSE_METRICS=0 to turn off).
+    # Installed before the tracker opens its connections so they are instrumented.
+    if os.environ.get('EXPENSE_METRICS', '1') == '1':
+        slow_query_ms = os.environ.get('EXPENSE_SLOW_QUERY_MS')
+        instrumentation.install(float(slow_query_ms) if slow_query_ms else None)
+        instrumentation.instrument_app(app, profiling=os.environ.get('EXPENSE_PROFILE') == '1')
+
+    # The shared repository for the ledger
+    tracker = get_repository("expenses.db")
+
+    # Optional write-behind mode: inserts from concurrent requests are committed in batches
+    if os.environ.get('EXPENSE_WRITE_BEHIND') == '1':
+        tracker.enable_write_behind(
+            batch_size=int(os.environ.get('EXPENSE_WRITE_BATCH_SIZE', DEFAULT_WRITE_BATCH_SIZE)),
+            flush_interval=float(os.environ.get('EXPENSE_WRITE_FLUSH_MS', DEFAULT_FLUSH_INTERVAL * 1000)) / 1000,
         )
-        ''')
-        
-        # Insert default categories if they don't exist
-        for category in self.categories:
-            cursor.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (category,))
-        
-        conn.commit()
-        conn.close()
-    
-    def add_expense(self, amount, category, description=""):
-        if category not in self.categories:
-            return False
-        
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO expenses (amount, category, description, date) VALUES (?, ?, ?, ?)",
-            (float(amount), category, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    # Optional analytics snapshot: reports, trends and statistics read an in-memory
+    # copy of the ledger, refreshed in the background, instead of expenses.db
+    if os.environ.get('EXPENSE_ANALYTICS_SNAPSHOT') == '1':
+        max_staleness = float(os.environ.get('EXPENSE_SNAPSHOT_MAX_STALENESS_MS',
+                                             DEFAULT_MAX_STALENESS * 1000)) / 1000
+        refresh_ms = os.environ.get('EXPENSE_SNAPSHOT_REFRESH_MS')
+        tracker.enable_snapshot(
+            max_staleness=max_staleness,
+            refresh_interval=float(refresh_ms) / 1000 if refresh_ms else max_staleness / 2,
         )
-        conn.commit()
-        conn.close()
-        return True
-    
-    def remove_expense(self, expense_id):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
-        
-        if cursor.rowcount > 0:
-            conn.commit()
-            conn.close()
-            return True
-        
-        conn.close()
-        return False
-    
-    def get_expenses(self, category=None):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        if category and category != "All":
-            cursor.execute("SELECT * FROM expenses WHERE category = ?", (category,))
-        else:
-            cursor.execute("SELECT * FROM expenses")
-        
-        expenses = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return expenses
-    
-    def get_total(self, category=None):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        if category and category != "All":
-            cursor.execute("SELECT SUM(amount) as total FROM expenses WHERE category = ?", (category,))
-        else:
-            cursor.execute("SELECT SUM(amount) as total FROM expenses")
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        # Return 0 if no expenses found
-        return result['total'] or 0
-    
-    def get_category_totals(self):
-        totals = {}
-        for category in self.categories:
-            totals[category] = self.get_total(category)
-        return totals
-    
-    def get_monthly_totals(self):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        # SQLite date functions to extract year and month
-        cursor.execute('''
-        SELECT 
-            strftime('%Y-%m', date) as month,
-            SUM(amount) as total
-        FROM expenses
-        GROUP BY month
-        ORDER BY month
-        ''')
-        
-        monthly_expenses = {row['month']: row['total'] for row in cursor.fetchall()}
-        conn.close()
-        
-        return monthly_expenses
-
-
-# Create expense tracker instance
-tracker = ExpenseTracker()
+
+    # Rendered pages and API results, valid until the ledger's data version changes
+    cache = VersionedCache()
+
+    # Hashed, precompressed CSS, JS and fonts from the last `python assets.py build`
+    asset_manifest = AssetManifest()
+
+    # Inserts and deletes pushed to the open pages over /api/stream
+    change_feed = ChangeFeed(tracker)
+
+    # Server-side chart images, rendered in worker processes
+    chart_renderer = ChartRenderer()
+
+    # Other ledgers (one SQLite file each), for totals across households or teams
+    ledger_handles = LedgerHandleCache(LedgerRouter(os.environ.get('EXPENSE_LEDGER_DIR', DEFAULT_LEDGER_DIR)),
+                                       read_only=True)
+    ledger_aggregator = LedgerAggregator(ledger_handles)
+
+def wants_json():
+    """True for the pages' own fetch() calls, which stay on the page instead of following a redirect"""
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
+def cached(key, compute, version=None):
+    if version is None:
+        version = tracker.data_version.current()
+    return cache.get_or_compute(key, version, compute)
+
+def versioned_json(compute, version=None, month=None):
+    """Serve compute()'s result as JSON tagged with the data version.
+
+    A request whose If-None-Match matches gets a 304 without recomputing anything.
+    Analytics results pass tracker.analytics_version(), the version they reflect.
+    Results for the current month (budgets and alerts) pass it as month, so a
+    new month is never answered from the last one's cache.
+    """
+    if version is None:
+        version = tracker.data_version.current()
+    etag = f"v{version}-{month}" if month else f"v{version}"
+    # Weak comparison, since compress_response() weakens the ETag of a gzipped body
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        # Tagged as the client holds it: weak if it came with a gzipped body
+        weak = request.if_none_match.is_weak(etag)
+    else:
+        key = f"{request.full_path}|{month}" if month else request.full_path
+        response = jsonify(cache.get_or_compute(key, version, compute))
+        weak = False
+    response.set_etag(etag, weak=weak)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip pages and API results for clients that accept it"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+    if preferred_encoding(request.headers.get('Accept-Encoding'), ('gzip',)) is None:
+        return response
+    response.set_data(gzip_body(body))
+    response.headers['Content-Encoding'] = 'gzip'
+    # The gzipped bytes differ from the identity ones, so a strong ETag no longer holds
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+@app.route('/assets/<path:filename>')
+def asset_file(filename):
+    # Only built files are served, with the precompressed copy the client prefers
+    resolved = asset_manifest.resolve(filename, request.headers.get('Accept-Encoding'))
+    if resolved is None:
+        return "Asset not found", 404
+    path, encoding = resolved
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                         conditional=True)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    if asset_manifest.encodings[filename]:
+        response.vary.add('Accept-Encoding')
+    # The name changes whenever the content does, so browsers never need to ask again
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
 
 @app.route('/')
 def index():
-    return render_template('index.html', 
+    # Alerts are for the current month, so a new month renders the page afresh
+    return cached('index:' + current_month(), lambda: render_template('index.html', 
                           categories=tracker.categories,
                           total=tracker.get_total(),
-                          category_totals=tracker.get_category_totals())
+                          category_totals=tracker.get_category_totals(),
+                          alerts=tracker.get_budget_alerts()))
 
 @app.route('/expenses')
 def expenses():
     category = request.args.get('category', default=None)
-    expenses = tracker.get_expenses(category)
+    limit, after = get_page_args()
+    try:
+        expenses, next_cursor = tracker.get_expenses_page(category, limit, after)
+    except ValueError:
+        return "Invalid cursor", 400
     return render_template('expenses.html', 
                           expenses=expenses, 
                           categories=tracker.categories,
-                          selected_category=category)
+                          selected_category=category,
+                          total=tracker.get_total(category),
+                          limit=limit,
+                          after=after,
+                          next_cursor=next_cursor)
 
 @app.route('/add_expense', methods=['POST'])
 def add_expense():
@@ -166,8 +213,10 @@ def add_expense():
     description = request.form.get('description', '')
     
     try:
-        float(amount)
         if tracker.add_expense(amount, category, description):
+            # Open pages pick the new row up from the change stream
+            if wants_json():
+                return jsonify({'added': True}), 201
             # Determine where to redirect based on the referer
             referer = request.headers.get('Referer', '')
             if '/expenses' in referer:
@@ -176,36 +225,286 @@ def add_expense():
                 return redirect(url_for('index', success=1))
         else:
             return "Invalid category", 400
-    except ValueError:
+    except (TypeError, ValueError):
         return "Invalid amount", 400
+    except sqlite3.IntegrityError:
+        # A row the table's constraints refused, on either write path
+        return "Invalid expense", 400
+    except QueueFull:
+        # Back-pressure from the write-behind queue; the row was never queued
+        return "Server busy, try again shortly", 503, {'Retry-After': '1'}
+    except TimeoutError:
+        # Still queued and may yet commit, so a blind retry could store it twice
+        if wants_json():
+            return jsonify({'added': False, 'queued': True}), 202
+        return "Expense queued but not yet confirmed; check the expense list before resubmitting", 202
 
 @app.route('/remove_expense/<int:expense_id>', methods=['POST'])
 def remove_expense(expense_id):
     if tracker.remove_expense(expense_id):
+        if wants_json():
+            return jsonify({'removed': expense_id})
         return redirect(url_for('expenses', removed=1))
+    elif tracker.is_archived(expense_id):
+        return "Archived expenses are read-only", 409
     else:
         return "Expense not found", 404
 
 @app.route('/analytics')
 def analytics():
-    return render_template('analytics.html',
+    return cached('analytics', lambda: render_template('analytics.html',
                           categories=tracker.categories,
                           total=tracker.get_total(),
                           category_totals=tracker.get_category_totals(),
-                          monthly_totals=tracker.get_monthly_totals())
+                          monthly_totals=tracker.get_monthly_totals()))
+
+@app.route('/analytics/chart/<kind>.<format>')
+def analytics_chart(kind, format):
+    if kind not in CHART_KINDS or format not in CHART_FORMATS:
+        return "Unknown chart", 404
+    
+    def load_data():
+        if kind == 'category':
+            return tracker.get_category_totals()
+        if kind == 'monthly':
+            return tracker.get_monthly_totals()
+        trend = tracker.get_trend('day', MAX_POINTS)
+        return trend['labels'], trend['values']
+    
+    version = tracker.analytics_version() if kind == 'trend' else tracker.data_version.current()
+    etag = f"v{version}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        image = chart_renderer.render(kind, format, version, load_data)
+        response = Response(image, mimetype=CHART_FORMATS[format])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/expenses')
 def api_expenses():
     category = request.args.get('category', default=None)
-    return jsonify(tracker.get_expenses(category))
+    limit, after = get_page_args()
+    try:
+        if after:
+            parse_cursor(after)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    def page():
+        expenses, next_cursor = tracker.get_expenses_page(category, limit, after)
+        return {'expenses': expenses, 'next_cursor': next_cursor}
+    
+    return versioned_json(page)
+
+@app.route('/api/stream')
+def api_stream():
+    # Server-Sent Events: a "change" event per batch of writes, "reset" when the page should reload
+    last_seq = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        last_seq = int(last_seq) if last_seq else None
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    
+    ready = threading.Event()
+    subscription = Subscription(ready.set)
+    change_feed.subscribe(subscription, last_seq)
+    
+    def stream():
+        try:
+            # Browsers reconnect after 3 seconds if the stream drops
+            yield b"retry: 3000\n\n"
+            while True:
+                ready.wait(HEARTBEAT_INTERVAL)
+                ready.clear()
+                events = subscription.take()
+                yield b"".join(events) if events else HEARTBEAT
+        finally:
+            # Runs when the client disconnects and the next write fails
+            change_feed.unsubscribe(subscription)
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/expenses/search')
+def api_expenses_search():
+    # ?q=coffee&category=Food&min_amount=5&max_amount=20&from=2025-01-01&to=2025-06-30
+    limit, after = get_page_args()
+    try:
+        query = SearchQuery.from_args(request.args)
+        if after:
+            parse_cursor(after)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def page():
+        expenses, next_cursor = tracker.search_expenses(query, limit, after)
+        return {'expenses': expenses, 'next_cursor': next_cursor}
+    
+    return versioned_json(page)
+
+@app.route('/api/expenses/bulk', methods=['POST'])
+def api_expenses_bulk():
+    # Format comes from ?format= or the Content-Type (text/csv, otherwise JSON Lines)
+    format = request.args.get('format')
+    if format is None:
+        format = 'csv' if request.mimetype == 'text/csv' else 'jsonl'
+    try:
+        reader = get_reader(format)
+        batch_size = int(request.args.get('batch_size', DEFAULT_BATCH_SIZE))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Stream the request body rather than loading it into memory
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    result = tracker.import_expenses(reader(lines), max(1, batch_size))
+    # A file with any rejected record is not imported at all
+    return jsonify(result.to_dict()), 400 if result.rejected else 200
+
+@app.route('/api/expenses/export')
+def api_expenses_export():
+    format = request.args.get('format', 'csv')
+    if format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unsupported format: {format}"}), 400
+    category = request.args.get('category', default=None)
+    
+    # Rows are fetched and encoded chunk by chunk while the response is sent
+    chunks = iter_export(tracker.iter_expenses(category), format)
+    headers = {'Content-Disposition': f'attachment; filename=expenses.{format}'}
+    if request.args.get('gzip') == '1':
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    
+    return Response(chunks, mimetype=EXPORT_FORMATS[format], headers=headers)
 
 @app.route('/api/category_totals')
 def api_category_totals():
-    return jsonify(tracker.get_category_totals())
+    return versioned_json(tracker.get_category_totals)
 
 @app.route('/api/monthly_totals')
 def api_monthly_totals():
-    return jsonify(tracker.get_monthly_totals())
+    return versioned_json(tracker.get_monthly_totals)
+
+@app.route('/api/trend')
+def api_trend():
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return jsonify({'error': f"Unsupported bucket: {bucket}"}), 400
+    try:
+        points = int(request.args.get('points', DEFAULT_POINTS))
+    except ValueError:
+        points = DEFAULT_POINTS
+    points = max(3, min(points, MAX_POINTS))
+    return versioned_json(lambda: tracker.get_trend(bucket, points), tracker.analytics_version())
+
+@app.route('/api/reports')
+def api_reports():
+    periods = request.args.getlist('period')
+    year = request.args.get('year', type=int)
+    granularity = request.args.get('granularity', 'monthly')
+    format = request.args.get('format', 'json')
+    details = request.args.get('details') == '1'
+    
+    try:
+        if year:
+            periods.extend(periods_for_year(year, granularity))
+        if not periods:
+            raise ValueError("Give at least one period or a year")
+        if format not in REPORT_FORMATS:
+            raise ValueError(f"Unsupported format: {format}")
+        for period in periods:
+            Period(period)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if format == 'json':
+        return versioned_json(lambda: tracker.generate_reports(periods, details), tracker.analytics_version())
+    body = cached(request.full_path,
+                  lambda: format_reports(tracker.generate_reports(periods, details), format),
+                  tracker.analytics_version())
+    return Response(body, mimetype=REPORT_FORMATS[format])
+
+@app.route('/api/stats')
+def api_stats():
+    category = request.args.get('category')
+    start = request.args.get('from')
+    end = request.args.get('to')
+    try:
+        if start:
+            check_month(start, 'from')
+        if end:
+            check_month(end, 'to')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def stats():
+        result = tracker.get_stats(category, start, end)
+        result['budgets'] = tracker.get_budgets()
+        return result
+    return versioned_json(stats, tracker.analytics_version(), current_month())
+
+@app.route('/api/budgets')
+def api_budgets():
+    month = request.args.get('month')
+    try:
+        if month:
+            check_month(month)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return versioned_json(lambda: tracker.get_budgets(month), month=None if month else current_month())
+
+@app.route('/api/budgets', methods=['POST'])
+def api_set_budget():
+    # A JSON object or form fields: category, limit and optionally warn_ratio
+    data = request.get_json(silent=True) or request.form
+    try:
+        if not tracker.set_budget(data.get('category'), data.get('limit'),
+                                  data.get('warn_ratio', DEFAULT_WARN_RATIO)):
+            return jsonify({'error': f"Unknown category: {data.get('category')}"}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(tracker.get_budgets())
+
+@app.route('/api/budgets/<category>', methods=['DELETE'])
+def api_remove_budget(category):
+    if not tracker.remove_budget(category):
+        return jsonify({'error': f"No budget for {category}"}), 404
+    return jsonify(tracker.get_budgets())
+
+@app.route('/api/write_queue')
+def api_write_queue():
+    if tracker.writer is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(tracker.writer.metrics(), enabled=True))
+
+@app.route('/api/snapshot')
+def api_snapshot():
+    if tracker.snapshot is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(tracker.snapshot.metrics(), enabled=True))
+
+@app.route('/api/ledgers')
+def api_ledgers():
+    return jsonify(ledger_handles.router.list_ledgers())
+
+@app.route('/api/ledgers/category_totals')
+def api_ledgers_category_totals():
+    try:
+        return jsonify(ledger_aggregator.category_totals(request.args.getlist('ledger') or None))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
+
+@app.route('/api/ledgers/monthly_totals')
+def api_ledgers_monthly_totals():
+    try:
+        return jsonify(ledger_aggregator.monthly_totals(request.args.getlist('ledger') or None))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 404
 
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,471 @@
+"""Yearly archive files for the closed months of a ledger.
+
+Closing a month moves its expenses out of the ledger into an archive file for
+its year (<ledger>-archive/<year>.db next to the ledger), so the live tables
+and their indexes only hold recent history. The archived months' totals
+stay in the ledger's archive_rollup table (migration 8), so totals and
+monthly figures never open an archive.
+
+Readers see the ledger and its archives as one table: attach_archives()
+attaches every archive to a connection and defines the temporary view
+ledger_records as their UNION ALL with the live rows (and ledger_daily_totals
+over the archives' day totals, for the trends). ledger_rows() wraps a query
+over ledger_records into the columns of the expenses view. Archived expenses
+are read-only, and search only covers the live rows.
+
+Usage:
+    python archive.py close 2024-12 [--db expenses.db] [--no-vacuum]
+    python archive.py list [--db expenses.db]
+    python archive.py verify [--db expenses.db]
+"""
+import argparse
+import calendar
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from migrations import SKETCH_SUMMARY, STATS_SUMMARY, migrate
+
+# SQLite attaches at most this many databases to one connection
+MAX_ARCHIVES = 10
+
+SELECT_ARCHIVES = "SELECT year, path, end_ts FROM archives ORDER BY year"
+LEDGER_COLUMNS = "id, amount_cents, category_id, description, ts"
+
+# The columns of the expenses view, over a query on ledger_records. Filters,
+# ordering and limits belong in the inner query, which SQLite answers by
+# merging the index scans of each file; naming the category and formatting the
+# date outside it keeps that merge possible.
+LEDGER_ROWS = '''
+    SELECT id, amount_cents / 100.0 AS amount,
+           (SELECT name FROM categories WHERE categories.id = category_id) AS category,
+           description, datetime(ts, 'unixepoch') AS date
+    FROM ({})
+'''
+
+# Created in each archive file, attached as archive_target while it is written
+ARCHIVE_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS archive_target.categories (id INTEGER PRIMARY KEY, name TEXT NOT NULL)",
+    '''
+    CREATE TABLE IF NOT EXISTS archive_target.expense_records (
+        id INTEGER PRIMARY KEY,
+        amount_cents INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        description TEXT,
+        ts INTEGER NOT NULL
+    )
+    ''',
+    # The same indexes as the live table, so a query plans alike on every file
+    '''
+    CREATE INDEX IF NOT EXISTS archive_target.idx_expense_records_category_ts_amount
+    ON expense_records (category_id, ts, amount_cents)
+    ''',
+    "CREATE INDEX IF NOT EXISTS archive_target.idx_expense_records_ts ON expense_records (ts)",
+    '''
+    CREATE TABLE IF NOT EXISTS archive_target.monthly_summary (
+        month TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        total_cents INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (month, category_id)
+    ) WITHOUT ROWID
+    ''',
+    # Day totals, for the day and week trends
+    '''
+    CREATE TABLE IF NOT EXISTS archive_target.daily_summary (
+        day INTEGER PRIMARY KEY,
+        total_cents INTEGER NOT NULL
+    )
+    ''',
+    # Amount statistics and sketches, as in the ledger's amount_stats and amount_sketch
+    '''
+    CREATE TABLE IF NOT EXISTS archive_target.monthly_stats (
+        month TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        m2 REAL NOT NULL,
+        PRIMARY KEY (month, category_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS archive_target.monthly_sketch (
+        month TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (month, category_id, bucket)
+    ) WITHOUT ROWID
+    ''',
+]
+COPY_CATEGORIES = "INSERT OR REPLACE INTO archive_target.categories SELECT id, name FROM main.categories"
+COPY_RECORDS = f'''
+    INSERT OR REPLACE INTO archive_target.expense_records ({LEDGER_COLUMNS})
+    SELECT {LEDGER_COLUMNS} FROM main.expense_records WHERE ts >= ? AND ts < ?
+'''
+SUMMARIZE = [
+    "DELETE FROM archive_target.monthly_summary",
+    '''
+    INSERT INTO archive_target.monthly_summary (month, category_id, total_cents, count)
+    SELECT strftime('%Y-%m', ts, 'unixepoch'), category_id, SUM(amount_cents), COUNT(*)
+    FROM archive_target.expense_records
+    GROUP BY 1, 2
+    ''',
+    "DELETE FROM archive_target.daily_summary",
+    '''
+    INSERT INTO archive_target.daily_summary (day, total_cents)
+    SELECT ts / 86400, SUM(amount_cents) FROM archive_target.expense_records GROUP BY 1
+    ''',
+    "DELETE FROM archive_target.monthly_stats",
+    "INSERT INTO archive_target.monthly_stats (month, category_id, count, mean, m2)"
+    + STATS_SUMMARY.format(table="archive_target.expense_records"),
+    "DELETE FROM archive_target.monthly_sketch",
+    "INSERT INTO archive_target.monthly_sketch (month, category_id, bucket, count)"
+    + SKETCH_SUMMARY.format(table="archive_target.expense_records"),
+]
+# Only rows the archive already holds are removed, so an expense added while
+# the archive was being written stays in the ledger
+REMOVE_ARCHIVED = '''
+    DELETE FROM main.expense_records
+    WHERE ts >= ?1 AND ts < ?2
+      AND id IN (SELECT id FROM archive_target.expense_records WHERE ts >= ?1 AND ts < ?2)
+'''
+# An archived row that no longer matches the ledger was deleted or edited
+# there after the copy. Checked with the ledger locked just before a month
+# switches over; the archive is then brought up to date and the check rerun.
+COUNT_STALE_ARCHIVED = '''
+    SELECT COUNT(*) FROM archive_target.expense_records a
+    WHERE a.ts >= ?1 AND a.ts < ?2 AND NOT EXISTS (
+        SELECT 1 FROM main.expense_records m
+        WHERE m.id = a.id AND m.amount_cents = a.amount_cents AND m.category_id = a.category_id
+          AND m.description IS a.description AND m.ts = a.ts)
+'''
+DROP_STALE_ARCHIVED = '''
+    DELETE FROM archive_target.expense_records
+    WHERE ts >= ?1 AND ts < ?2 AND id NOT IN (SELECT id FROM main.expense_records WHERE ts >= ?1 AND ts < ?2)
+'''
+# Times a month is brought up to date before close gives up on it
+SWITCH_ATTEMPTS = 5
+# The removal is not logged row by row (see migration 10): the rows are still
+# there, in ledger_records, so it is logged as one reset, which makes open
+# pages reload, and counted as one write
+PAUSE_CHANGE_LOG = "INSERT OR IGNORE INTO main.change_log_paused (id) VALUES (1)"
+RESUME_CHANGE_LOG = "DELETE FROM main.change_log_paused"
+LOG_ARCHIVE_MOVE = "INSERT INTO main.change_log (op, expense_id, ts) VALUES ('reset', 0, ?)"
+BUMP_DATA_VERSION = "UPDATE main.data_version SET version = version + 1 WHERE id = 1"
+CLEAR_MONTH_ROLLUP = "DELETE FROM main.archive_rollup WHERE month = ?"
+COPY_MONTH_ROLLUP = '''
+    INSERT INTO main.archive_rollup (month, category_id, total_cents, count)
+    SELECT month, category_id, total_cents, count FROM archive_target.monthly_summary WHERE month = ?
+'''
+CLEAR_MONTH_STATS = "DELETE FROM main.archive_stats WHERE month = ?"
+COPY_MONTH_STATS = '''
+    INSERT INTO main.archive_stats (month, category_id, count, mean, m2)
+    SELECT month, category_id, count, mean, m2 FROM archive_target.monthly_stats WHERE month = ?
+'''
+CLEAR_MONTH_SKETCH = "DELETE FROM main.archive_sketch WHERE month = ?"
+COPY_MONTH_SKETCH = '''
+    INSERT INTO main.archive_sketch (month, category_id, bucket, count)
+    SELECT month, category_id, bucket, count FROM archive_target.monthly_sketch WHERE month = ?
+'''
+REGISTER_ARCHIVE = '''
+    INSERT INTO main.archives (year, path, end_ts) VALUES (?, ?, ?)
+    ON CONFLICT (year) DO UPDATE SET path = excluded.path, end_ts = max(end_ts, excluded.end_ts)
+'''
+
+
+def _ledger_view(archives):
+    """The body of the ledger_records view for a list of (year, path, end_ts)"""
+    parts = [f"SELECT {LEDGER_COLUMNS} FROM main.expense_records"]
+    for year, _, end_ts in archives:
+        # Rows copied ahead of their month's switch-over stay hidden until end_ts covers them
+        parts.append(f"SELECT {LEDGER_COLUMNS} FROM archive_{year}.expense_records WHERE ts < {end_ts}")
+    return " UNION ALL ".join(parts)
+
+
+def _daily_view(archives):
+    """The body of the ledger_daily_totals view: live rows plus the archives' day totals"""
+    parts = ["SELECT ts / 86400 AS day, amount_cents AS total_cents FROM main.expense_records"]
+    for year, _, end_ts in archives:
+        # end_ts is always the start of a month, so of a day
+        parts.append(f"SELECT day, total_cents FROM archive_{year}.daily_summary WHERE day < {end_ts // 86400}")
+    return " UNION ALL ".join(parts)
+
+
+def _ledger_dir(conn):
+    for _, name, path in conn.execute("PRAGMA database_list"):
+        if name == "main":
+            return os.path.dirname(path) if path else os.getcwd()
+    return os.getcwd()
+
+
+def attach_archives(conn, base=None):
+    """Attach conn's archives and (re)define its ledger_records and ledger_daily_totals views.
+
+    Only two small queries when nothing has changed, so readers call this
+    before every query on ledger_records. Must run outside a transaction.
+    base is the ledger's directory, for a connection that is not opened on
+    the ledger file itself (an in-memory snapshot, see snapshot.py).
+    """
+    archives = conn.execute(SELECT_ARCHIVES).fetchall()
+    body = _ledger_view(archives)
+    current = conn.execute(
+        "SELECT sql FROM sqlite_temp_master WHERE type = 'view' AND name = 'ledger_records'"
+    ).fetchone()
+    if current is not None and current[0].endswith(" AS " + body):
+        return
+
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    wanted = {f"archive_{row[0]}" for row in archives}
+    conn.execute("DROP VIEW IF EXISTS temp.ledger_records")
+    conn.execute("DROP VIEW IF EXISTS temp.ledger_daily_totals")
+    for name in attached:
+        if name.startswith("archive_") and name not in wanted:
+            conn.execute(f"DETACH DATABASE {name}")
+
+    base = base if base is not None else _ledger_dir(conn)
+    for year, path, _ in archives:
+        if f"archive_{year}" in attached:
+            continue
+        full_path = os.path.join(base, path)
+        # A plain ATTACH would silently create an empty file instead
+        if not os.path.exists(full_path):
+            raise FileNotFoundError(f"Archive for {year} not found: {full_path}")
+        conn.execute(f"ATTACH DATABASE ? AS archive_{year}", (full_path,))
+    conn.execute("CREATE TEMP VIEW ledger_daily_totals AS " + _daily_view(archives))
+    # Created last: its definition is what tells that the views are current
+    conn.execute("CREATE TEMP VIEW ledger_records AS " + body)
+
+
+def ledger_rows(query):
+    """Wrap a query selecting * from ledger_records into the columns of the expenses view"""
+    return LEDGER_ROWS.format(query)
+
+
+def _month_start(year, month):
+    return calendar.timegm((year, month, 1, 0, 0, 0))
+
+
+def _months(start_ts, end_ts):
+    """(month label, start, end) for every month in [start_ts, end_ts)"""
+    year, month = time.gmtime(start_ts)[:2]
+    while _month_start(year, month) < end_ts:
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        yield f"{year:04d}-{month:02d}", _month_start(year, month), _month_start(next_year, next_month)
+        year, month = next_year, next_month
+
+
+def _transaction(conn, statements):
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for statement, params in statements:
+            conn.execute(statement, params)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def _switch_month(conn, month, month_start, month_end, statements):
+    """Run a month's switch-over once its archived rows all match the ledger.
+
+    Rows deleted or edited in the ledger since they were copied would
+    otherwise come back, or go back to their old values, through
+    ledger_records. Each write commits to a single file: the archive is
+    brought up to date in a transaction of its own, and the switch-over only
+    writes the ledger.
+    """
+    for _ in range(SWITCH_ATTEMPTS):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if not conn.execute(COUNT_STALE_ARCHIVED, (month_start, month_end)).fetchone()[0]:
+                for statement, params in statements:
+                    conn.execute(statement, params)
+                conn.commit()
+                return
+            conn.rollback()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        _transaction(conn, [
+            (DROP_STALE_ARCHIVED, (month_start, month_end)),
+            (COPY_RECORDS, (month_start, month_end)),
+        ] + [(statement, ()) for statement in SUMMARIZE])
+    raise RuntimeError(f"{month} kept changing while it was archived; run close again")
+
+
+def _archive_year(conn, year, path, end, vacuum):
+    start = _month_start(year, 1)
+    conn.execute("ATTACH DATABASE ? AS archive_target", (os.path.join(_ledger_dir(conn), path),))
+    try:
+        # Copy the rows in the archive's own transaction. Readers only see
+        # archived rows dated before the registered end_ts, so the new ones
+        # stay hidden until their month switches over below.
+        _transaction(conn, [(statement, ()) for statement in ARCHIVE_SCHEMA] + [
+            (COPY_CATEGORIES, ()),
+            (COPY_RECORDS, (start, end)),
+        ] + [(statement, ()) for statement in SUMMARIZE])
+
+        # Then one short ledger transaction per month removes its rows, moves
+        # its totals and statistics to archive_rollup, archive_stats and
+        # archive_sketch and extends end_ts, so writers are never blocked for
+        # long and readers never count a row twice
+        for month, month_start, month_end in _months(start, end):
+            _switch_month(conn, month, month_start, month_end, [
+                (PAUSE_CHANGE_LOG, ()),
+                (REMOVE_ARCHIVED, (month_start, month_end)),
+                (RESUME_CHANGE_LOG, ()),
+                (LOG_ARCHIVE_MOVE, (month_start,)),
+                (BUMP_DATA_VERSION, ()),
+                (CLEAR_MONTH_ROLLUP, (month,)),
+                (COPY_MONTH_ROLLUP, (month,)),
+                (CLEAR_MONTH_STATS, (month,)),
+                (COPY_MONTH_STATS, (month,)),
+                (CLEAR_MONTH_SKETCH, (month,)),
+                (COPY_MONTH_SKETCH, (month,)),
+                (REGISTER_ARCHIVE, (year, path, month_end)),
+            ])
+        moved = conn.execute(
+            "SELECT COUNT(*) FROM archive_target.expense_records WHERE ts >= ? AND ts < ?", (start, end)
+        ).fetchone()[0]
+        if vacuum:
+            conn.execute("VACUUM archive_target")
+    finally:
+        conn.execute("DETACH DATABASE archive_target")
+    return moved
+
+
+def close_months(conn, through, vacuum=True, progress=None):
+    """Archive every expense dated up to the end of the month `through` (YYYY-MM).
+
+    conn must be in autocommit mode (isolation_level=None). Returns the
+    number of rows in the archive files written.
+    """
+    try:
+        year, month = (int(part) for part in through.split("-"))
+        end = _month_start(year + month // 12, month % 12 + 1)
+    except ValueError:
+        raise ValueError(f"Invalid month: {through} (use YYYY-MM)")
+    # Expenses are dated in local time, so the month ends by the local clock
+    now = datetime.now()
+    this_month = _month_start(now.year, now.month)
+    if end > this_month:
+        raise ValueError(f"{through} has not ended yet; only closed months can be archived")
+
+    first = conn.execute("SELECT MIN(ts) FROM expense_records WHERE ts < ?", (end,)).fetchone()[0]
+    if first is None:
+        return 0
+    years = range(time.gmtime(first).tm_year, time.gmtime(end - 1).tm_year + 1)
+    existing = {row[0]: row[1] for row in conn.execute(SELECT_ARCHIVES)}
+    if len(set(years) | set(existing)) > MAX_ARCHIVES:
+        raise ValueError(f"A ledger can have at most {MAX_ARCHIVES} yearly archives")
+
+    stem = os.path.splitext(os.path.basename(conn.execute("PRAGMA database_list").fetchone()[2] or "ledger"))[0]
+    os.makedirs(os.path.join(_ledger_dir(conn), f"{stem}-archive"), exist_ok=True)
+    moved = 0
+    for year in years:
+        path = existing.get(year) or os.path.join(f"{stem}-archive", f"{year}.db")
+        moved += _archive_year(conn, year, path, min(end, _month_start(year + 1, 1)), vacuum)
+        if progress is not None:
+            progress(year)
+    # Merge the search index, which otherwise keeps a delete marker for every archived row
+    conn.execute("INSERT INTO expense_search (expense_search) VALUES ('optimize')")
+    return moved
+
+
+def list_archives(conn):
+    """One dict per archive: year, path, archived through (YYYY-MM), rows and total"""
+    archives = []
+    for year, path, end_ts in conn.execute(SELECT_ARCHIVES).fetchall():
+        rows, total_cents = conn.execute(
+            "SELECT SUM(count), SUM(total_cents) FROM archive_rollup WHERE month >= ? AND month < ?",
+            (f"{year:04d}", f"{year + 1:04d}")
+        ).fetchone()
+        archives.append({
+            'year': year,
+            'path': path,
+            'through': time.strftime("%Y-%m", time.gmtime(end_ts - 1)),
+            'rows': rows or 0,
+            'total': (total_cents or 0) / 100,
+        })
+    return archives
+
+
+def verify_archives(conn):
+    """Return a list of problems with the archives (empty if consistent).
+
+    Checks that archive_rollup matches the archived rows, and that no
+    archived row is still in the ledger.
+    """
+    attach_archives(conn)
+    problems = []
+    for year, _, end_ts in conn.execute(SELECT_ARCHIVES).fetchall():
+        schema = f"archive_{year}"
+        expected = {
+            (row[0], row[1]): (row[2], row[3]) for row in conn.execute(f'''
+                SELECT strftime('%Y-%m', ts, 'unixepoch'), category_id, SUM(amount_cents), COUNT(*)
+                FROM {schema}.expense_records WHERE ts < ? GROUP BY 1, 2
+            ''', (end_ts,))
+        }
+        actual = {
+            (row[0], row[1]): (row[2], row[3]) for row in conn.execute(
+                "SELECT month, category_id, total_cents, count FROM archive_rollup WHERE month >= ? AND month < ?",
+                (f"{year:04d}", f"{year + 1:04d}"))
+        }
+        for key in sorted(set(expected) | set(actual)):
+            if expected.get(key) != actual.get(key):
+                problems.append(f"{year}: totals for {key[0]} category {key[1]} are {actual.get(key)}, "
+                                f"archive rows sum to {expected.get(key)}")
+        duplicates = conn.execute(f'''
+            SELECT COUNT(*) FROM main.expense_records
+            WHERE id IN (SELECT id FROM {schema}.expense_records WHERE ts < ?)
+        ''', (end_ts,)).fetchone()[0]
+        if duplicates:
+            problems.append(f"{year}: {duplicates} archived rows are still in the ledger "
+                            f"(run close again to finish moving them)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move closed months into yearly archive files")
+    parser.add_argument("--db", default="expenses.db", help="database file (default: expenses.db)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    close = subparsers.add_parser("close", help="archive every month up to and including MONTH")
+    close.add_argument("month", help="last month to archive, YYYY-MM")
+    close.add_argument("--no-vacuum", action="store_true", help="leave free pages in the archive files")
+    subparsers.add_parser("list", help="show the archives and what they hold")
+    subparsers.add_parser("verify", help="check the archive totals against the archived rows")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} not found")
+    conn = sqlite3.connect(args.db, isolation_level=None, timeout=30)
+    migrate(conn)
+
+    if args.command == "close":
+        start = time.perf_counter()
+        try:
+            moved = close_months(conn, args.month, vacuum=not args.no_vacuum,
+                                 progress=lambda year: print(f"  archived {year}"))
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Archived {moved:,} rows in {time.perf_counter() - start:.1f}s.")
+        print("Run VACUUM on the ledger to return the freed pages to the disk.")
+    elif args.command == "list":
+        for archive in list_archives(conn):
+            print(f"{archive['year']}  through {archive['through']}  {archive['rows']:>10,} rows  "
+                  f"${archive['total']:>14,.2f}  {archive['path']}")
+    else:
+        problems = verify_archives(conn)
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
+        print("Archives match their totals.")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""ASGI entry point for serving the web app asynchronously.
+
+The read-heavy /api/* routes are served natively here: all SQLite work runs
+on a bounded thread pool, so the event loop never waits on the database and
+a burst of requests queues for a worker thread instead of tying up a server
+thread each. The /api/stream changefeed is served here too, so an open page
+waits on the event loop rather than holding a pool thread. Every other route (pages, forms, bulk import, export) is handed
+to the Flask app, which also runs on the pool.
+
+Usage:
+    uvicorn asgi:app --port 8000
+"""
+import asyncio
+import functools
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from app_web import app as flask_app
+from assets import MIN_COMPRESS_SIZE, gzip_body, preferred_encoding
+from app_web import change_feed, get_page_args, tracker
+from cache import VersionedCache
+from changefeed import HEARTBEAT, HEARTBEAT_INTERVAL, Subscription
+from db import DEFAULT_POOL_SIZE
+from expense_repository import parse_cursor
+from instrumentation import record_request
+from stats import check_month, current_month
+from trend import BUCKETS, DEFAULT_POINTS, MAX_POINTS
+
+# One thread per pooled connection, so a worker never waits for a connection
+DB_WORKERS = DEFAULT_POOL_SIZE
+
+
+class AsyncTracker:
+    """Awaitable access to an ExpenseRepository: every call runs on a bounded thread pool"""
+
+    def __init__(self, tracker, max_workers=DB_WORKERS):
+        self.tracker = tracker
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="sqlite")
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args))
+
+    async def data_version(self):
+        return await self.run(self.tracker.data_version.current)
+
+    async def analytics_version(self):
+        return await self.run(self.tracker.analytics_version)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+db = AsyncTracker(tracker)
+
+# The native routes are timed into the same per-route histogram as Flask's
+# (see instrumentation.instrument_app), under the same switch
+METRICS_ENABLED = os.environ.get('EXPENSE_METRICS', '1') == '1'
+
+# Encoded JSON bodies, valid until the ledger's data version changes
+cache = VersionedCache()
+
+
+async def send_response(send, status, body=b"", content_type="application/json", headers=()):
+    raw_headers = [(b"content-type", content_type.encode()),
+                   (b"content-length", str(len(body)).encode())]
+    raw_headers.extend((name.encode(), value.encode()) for name, value in headers)
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status, data):
+    await send_response(send, status, json.dumps(data).encode())
+
+
+async def versioned_json(scope, send, compute, analytics=False, month=None):
+    """Serve compute()'s result as JSON tagged with the data version, like app_web.versioned_json.
+
+    compute is a plain function; on a cache miss it runs on the thread pool.
+    With analytics, the version is the one the analytics snapshot reflects.
+    month is the current month for results that depend on it.
+    """
+    version = await (db.analytics_version() if analytics else db.data_version())
+    etag = f'"v{version}-{month}"' if month else f'"v{version}"'
+    headers = [("cache-control", "no-cache")]
+    request_headers = dict(scope["headers"])
+
+    # Weak comparison, since a gzipped body is sent with a weak ETag
+    if_none_match = request_headers.get(b"if-none-match", b"").decode("latin-1")
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    if tags & {etag, "W/" + etag, "*"}:
+        # Tagged as the client holds it: weak if it came with a gzipped body
+        if "W/" + etag in tags and etag not in tags:
+            etag = "W/" + etag
+        await send_response(send, 304, headers=[("etag", etag)] + headers)
+        return
+
+    key = (scope["path"], scope["query_string"], month)
+    body = await db.run(cache.get_or_compute, key, version, lambda: json.dumps(compute()).encode())
+    if len(body) >= MIN_COMPRESS_SIZE:
+        headers.append(("vary", "Accept-Encoding"))
+        accept_encoding = request_headers.get(b"accept-encoding", b"").decode("latin-1")
+        if preferred_encoding(accept_encoding, ("gzip",)):
+            identity = body
+            body = await db.run(cache.get_or_compute, key + ("gzip",), version, lambda: gzip_body(identity))
+            headers.append(("content-encoding", "gzip"))
+            etag = "W/" + etag
+    await send_response(send, 200, body, headers=[("etag", etag)] + headers)
+
+
+async def api_expenses(scope, send, args):
+    limit, after = get_page_args(args)
+    try:
+        if after:
+            parse_cursor(after)
+    except ValueError:
+        return await send_json(send, 400, {'error': 'Invalid cursor'})
+
+    def page():
+        expenses, next_cursor = tracker.get_expenses_page(args.get('category'), limit, after)
+        return {'expenses': expenses, 'next_cursor': next_cursor}
+
+    await versioned_json(scope, send, page)
+
+
+async def api_category_totals(scope, send, args):
+    await versioned_json(scope, send, tracker.get_category_totals)
+
+
+async def api_monthly_totals(scope, send, args):
+    await versioned_json(scope, send, tracker.get_monthly_totals)
+
+
+async def api_trend(scope, send, args):
+    bucket = args.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return await send_json(send, 400, {'error': f"Unsupported bucket: {bucket}"})
+    try:
+        points = int(args.get('points', DEFAULT_POINTS))
+    except ValueError:
+        points = DEFAULT_POINTS
+    points = max(3, min(points, MAX_POINTS))
+    await versioned_json(scope, send, lambda: tracker.get_trend(bucket, points), analytics=True)
+
+
+async def api_stats(scope, send, args):
+    category, start, end = args.get('category'), args.get('from'), args.get('to')
+    try:
+        if start:
+            check_month(start, 'from')
+        if end:
+            check_month(end, 'to')
+    except ValueError as e:
+        return await send_json(send, 400, {'error': str(e)})
+
+    def stats():
+        result = tracker.get_stats(category, start, end)
+        result['budgets'] = tracker.get_budgets()
+        return result
+
+    await versioned_json(scope, send, stats, analytics=True, month=current_month())
+
+
+async def api_stream(scope, receive, send):
+    """Server-Sent Events from the change feed, like app_web.api_stream"""
+    headers = dict(scope["headers"])
+    args = dict(parse_qsl(scope["query_string"].decode("latin-1")))
+    last_seq = headers.get(b"last-event-id", b"").decode("latin-1") or args.get('since')
+    try:
+        last_seq = int(last_seq) if last_seq else None
+    except ValueError:
+        return await send_json(send, 400, {'error': 'Invalid Last-Event-ID'})
+
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    # The feed's thread queues events; the loop is woken to send them
+    subscription = Subscription(lambda: loop.call_soon_threadsafe(ready.set))
+    await db.run(change_feed.subscribe, subscription, last_seq)
+
+    async def wait_for_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        ready.set()
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+        await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+        while not disconnected.done():
+            try:
+                await asyncio.wait_for(ready.wait(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            ready.clear()
+            if disconnected.done():
+                break
+            events = subscription.take()
+            await send({"type": "http.response.body", "body": b"".join(events) if events else HEARTBEAT,
+                        "more_body": True})
+    finally:
+        disconnected.cancel()
+        change_feed.unsubscribe(subscription)
+
+
+ROUTES = {
+    '/api/expenses': api_expenses,
+    '/api/category_totals': api_category_totals,
+    '/api/monthly_totals': api_monthly_totals,
+    '/api/trend': api_trend,
+    '/api/stats': api_stats,
+}
+
+
+def wsgi_environ(scope, body):
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    server = scope.get("server") or ("localhost", 80)
+    environ["SERVER_NAME"], environ["SERVER_PORT"] = server[0], str(server[1])
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+async def call_flask(scope, receive, send):
+    """Run the Flask app for one request on the thread pool, streaming its response"""
+    # The request body is read up front, since WSGI reads it synchronously
+    body = bytearray()
+    while True:
+        message = await receive()
+        body.extend(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                              for name, value in headers]
+
+    def start():
+        result = flask_app(wsgi_environ(scope, bytes(body)), start_response)
+        return result, iter(result)
+
+    result, chunks = await db.run(start)
+    try:
+        await send({"type": "http.response.start", "status": started["status"],
+                    "headers": started["headers"]})
+        # Each chunk is produced on the pool, so streamed exports do not block the loop
+        while True:
+            chunk = await db.run(next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(result, "close"):
+            await db.run(result.close)
+
+
+async def timed(route, scope, send, args):
+    """Serve a native route, recording its latency and status like a Flask route"""
+    status = 500
+
+    async def send_recording_status(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        await send(message)
+
+    started = time.perf_counter()
+    try:
+        await route(scope, send_recording_status, args)
+    finally:
+        record_request(scope["path"], scope["method"], status, time.perf_counter() - started)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            db.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        raise ValueError(f"Unsupported scope type: {scope['type']}")
+
+    if scope["path"] == '/api/stream' and scope["method"] == "GET":
+        return await api_stream(scope, receive, send)
+    route = ROUTES.get(scope["path"])
+    if route is not None and scope["method"] == "GET":
+        args = dict(parse_qsl(scope["query_string"].decode("latin-1")))
+        if METRICS_ENABLED:
+            return await timed(route, scope, send, args)
+        return await route(scope, send, args)
+    return await call_flask(scope, receive, send)
@@ -0,0 +1,397 @@
+"""Static assets for the web UI: vendored, minified, content-hashed and precompressed.
+
+The pages' CSS, JavaScript and fonts are served from this app rather than a
+CDN, so they load without network access. build() copies every file in
+ASSETS into static/dist under a name that includes a hash of its content
+(style.css becomes style.1a2b3c4d5e6f.css), minifying the app's own CSS and
+JS on the way and writing .gz (and, with the brotli package, .br) copies
+next to each text file. A manifest maps the source names to the hashed ones.
+
+A hashed file never changes, so the app serves it with an immutable
+Cache-Control and browsers only fetch it once; a new build gives changed
+files new names. Until the first build, or for a file edited since, pages
+link the unhashed file under /static instead.
+
+Usage:
+    python assets.py build
+    python assets.py list
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_FILE = "manifest.json"
+
+# Files under static/ served as hashed assets. Fonts come before the
+# stylesheets that reference them, so the references can be rewritten.
+ASSETS = (
+    "vendor/fontawesome/webfonts/fa-brands-400.woff2",
+    "vendor/fontawesome/webfonts/fa-regular-400.woff2",
+    "vendor/fontawesome/webfonts/fa-solid-900.woff2",
+    "vendor/fontawesome/webfonts/fa-v4compatibility.woff2",
+    "vendor/bootstrap/bootstrap.min.css",
+    "vendor/fontawesome/css/all.min.css",
+    "css/style.css",
+    "vendor/popper/popper.min.js",
+    "vendor/bootstrap/bootstrap.min.js",
+    "vendor/chart.js/chart.umd.min.js",
+    "js/main.js",
+)
+
+# A year, the longest lifetime caches honour
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Extensions worth precompressing; fonts and images are compressed already
+PRECOMPRESS = (".css", ".js", ".svg", ".json")
+
+# Encodings of the precompressed files, best first, and their extensions
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+# Responses compressed on the fly: pages and API results
+COMPRESSIBLE_MIMETYPES = ("text/html", "application/json", "text/csv", "text/plain",
+                          "text/markdown", "application/x-ndjson")
+# Smaller bodies fit in one packet anyway, and gzip's header would outweigh the savings
+MIN_COMPRESS_SIZE = 1024
+
+_CSS_URL = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)")
+# Copied by minify_css as they are (group 1), or a comment it drops (group 2)
+_CSS_VERBATIM = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|url\(\s*[^\s'")][^)]*\)|/\*!.*?\*/)"""
+                           r"|(/\*.*?\*/)", re.S)
+_HASH_LENGTH = 12
+
+
+def minify_css(text):
+    """Strip comments and whitespace from CSS.
+
+    Strings, unquoted url()s and /*! license comments */ are copied as
+    they are.
+    """
+    kept = []
+
+    def protect(match):
+        if match.group(2):
+            return ""
+        kept.append(match.group(1))
+        return f"\0{len(kept) - 1}\0"
+
+    text = _CSS_VERBATIM.sub(protect, text)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r" ?([{};,>]) ?", r"\1", text)
+    text = re.sub(r"([:(]) ", r"\1", text)
+    text = text.replace(" )", ")").replace(";}", "}").strip()
+    return re.sub(r"\0(\d+)\0", lambda match: kept[int(match.group(1))], text) + "\n"
+
+
+def _is_word(char):
+    return char.isalnum() or char in "_$#\\" or ord(char) > 126
+
+
+# After these, a / starts a regular expression rather than a division
+_REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = ("return", "typeof", "case", "do", "else", "in", "of", "void", "yield")
+
+
+def _string_end(text, i):
+    """Index just past the string or template literal that starts at text[i]"""
+    quote, n = text[i], len(text)
+    i += 1
+    while i < n and text[i] != quote:
+        if text[i] == "\\":
+            i += 2
+        elif quote == "`" and text.startswith("${", i):
+            # A template's placeholders can hold strings and templates of their own
+            i += 2
+            depth = 1
+            while i < n and depth:
+                if text[i] in "'\"`":
+                    i = _string_end(text, i)
+                    continue
+                depth += {"{": 1, "}": -1}.get(text[i], 0)
+                i += 1
+        else:
+            i += 1
+    return i + 1
+
+
+def minify_js(text):
+    """Strip comments and whitespace from JavaScript, in the manner of JSMin.
+
+    Strings, template literals and regular expressions are copied as they
+    are. A line break stays wherever dropping it could change how
+    semicolons are inserted, so the result parses the same as the source.
+    /*! license comments */ are kept.
+    """
+    out = []
+    last_token = ""
+    pending = None  # whitespace since the last token: None, " " or "\n"
+    i, n = 0, len(text)
+    while i < n:
+        char = text[i]
+        if char.isspace():
+            start = i
+            while i < n and text[i].isspace():
+                i += 1
+            pending = "\n" if pending == "\n" or "\n" in text[start:i] else " "
+            continue
+        if text.startswith("//", i):
+            while i < n and text[i] != "\n":
+                i += 1
+            continue
+        if text.startswith("/*", i) and not text.startswith("/*!", i):
+            end = text.find("*/", i + 2)
+            end = n if end < 0 else end + 2
+            pending = "\n" if pending == "\n" or "\n" in text[i:end] else pending or " "
+            i = end
+            continue
+
+        last = out[-1][-1] if out else ""
+        start = i
+        if char in "'\"`":
+            i = _string_end(text, i)
+        elif text.startswith("/*!", i):
+            end = text.find("*/", i + 3)
+            i = n if end < 0 else end + 2
+        elif char == "/" and (not last or last in _REGEX_AFTER
+                              or last_token in _REGEX_KEYWORDS):
+            i += 1
+            in_class = False
+            while i < n and (in_class or text[i] != "/"):
+                if text[i] == "\\":
+                    i += 1
+                elif text[i] == "[":
+                    in_class = True
+                elif text[i] == "]":
+                    in_class = False
+                i += 1
+            i += 1
+            while i < n and _is_word(text[i]):
+                i += 1
+        elif _is_word(char):
+            while i < n and _is_word(text[i]):
+                i += 1
+        else:
+            i += 1
+        token = text[start:i]
+
+        if pending and last:
+            first = token[0]
+            if _is_word(last) and _is_word(first) or last == first and last in "+-":
+                out.append(pending)
+            elif pending == "\n" and (_is_word(last) or last in ")]}'\"`+-/") \
+                    and (_is_word(first) or first in "([{'\"`+-!~/"):
+                out.append("\n")
+        out.append(token)
+        last_token = token
+        pending = None
+    return "".join(out) + "\n"
+
+
+def hashed_name(name, data):
+    """name with a hash of data before its extension: css/style.css -> css/style.1a2b3c4d5e6f.css"""
+    root, ext = posixpath.splitext(name)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:_HASH_LENGTH]}{ext}"
+
+
+def _rewrite_css_urls(text, name, files):
+    """Point the url()s of the stylesheet name at the hashed copies of the files they load"""
+    base = posixpath.dirname(name)
+
+    def replace(match):
+        quote, url = match.groups()
+        if ":" in url or url.startswith(("/", "#")):
+            return match.group(0)
+        path = url.partition("?")[0]
+        target = posixpath.normpath(posixpath.join(base, path))
+        if target not in files:
+            return match.group(0)
+        # The hashed copy sits in the same directory as its source
+        return f"url({quote}{posixpath.relpath(files[target]['file'], base)}{quote})"
+
+    return _CSS_URL.sub(replace, text)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR, names=ASSETS):
+    """Write the hashed, minified and precompressed copies of names and their manifest.
+
+    Files from the previous build are kept, since pages rendered before a
+    restart still link them; anything older is removed. Returns {name: entry}.
+    """
+    previous = load_manifest(dist_dir)
+    files = {}
+    for name in names:
+        source = os.path.join(static_dir, name)
+        with open(source, "rb") as f:
+            data = f.read()
+        if name.endswith(".css"):
+            text = data.decode("utf-8")
+            if not name.endswith(".min.css"):
+                text = minify_css(text)
+            text = _rewrite_css_urls(text, name, files)
+            data = text.encode("utf-8")
+        elif name.endswith(".js") and not name.endswith(".min.js"):
+            data = minify_js(data.decode("utf-8")).encode("utf-8")
+
+        entry = {"file": hashed_name(name, data), "size": len(data),
+                 "source_mtime": os.stat(source).st_mtime}
+        _write(os.path.join(dist_dir, entry["file"]), data)
+        if name.endswith(PRECOMPRESS):
+            compressed = {"gzip": gzip.compress(data, 9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(data, quality=11)
+            for encoding, body in compressed.items():
+                # Tiny files can come out larger
+                if len(body) < len(data):
+                    _write(os.path.join(dist_dir, entry["file"] + ENCODINGS[encoding]), body)
+                    entry[encoding] = len(body)
+        files[name] = entry
+
+    manifest = {"files": files}
+    keep = {MANIFEST_FILE}
+    for entries in (files, previous):
+        for entry in entries.values():
+            keep.add(entry["file"])
+            keep.update(entry["file"] + ENCODINGS[encoding] for encoding in ENCODINGS if encoding in entry)
+    for root, _, filenames in os.walk(dist_dir):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            if os.path.relpath(path, dist_dir).replace(os.sep, "/") not in keep:
+                os.remove(path)
+
+    # Written last, so a running build never leaves a manifest naming missing files
+    temp = os.path.join(dist_dir, MANIFEST_FILE + ".tmp")
+    _write(temp, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    os.replace(temp, os.path.join(dist_dir, MANIFEST_FILE))
+    return files
+
+
+def load_manifest(dist_dir=DIST_DIR):
+    """{name: entry} from the last build in dist_dir, or {} if there is none"""
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)["files"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def accepted_encodings(header):
+    """{coding: quality} from an Accept-Encoding header"""
+    accepted = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        match = re.search(r"q\s*=\s*([0-9.]+)", params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def preferred_encoding(header, available):
+    """The coding from available (best first) that the Accept-Encoding header rates highest, or None"""
+    accepted = accepted_encodings(header)
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def gzip_body(body, level=6):
+    """A response body gzipped on the fly; level 6 is most of level 9's saving at a fraction of the time"""
+    return gzip.compress(body, level, mtime=0)
+
+
+class AssetManifest:
+    """The built assets, for linking them from pages and serving them.
+
+    An asset whose source was modified after the build is left out, so the
+    page links its current, unhashed version rather than a stale copy.
+    """
+
+    def __init__(self, dist_dir=DIST_DIR, static_dir=STATIC_DIR):
+        self.dist_dir = dist_dir
+        self.files = {}
+        for name, entry in load_manifest(dist_dir).items():
+            try:
+                modified = os.stat(os.path.join(static_dir, name)).st_mtime
+            except OSError:
+                continue
+            if modified <= entry["source_mtime"]:
+                self.files[name] = entry
+        # Served file -> its precompressed encodings, best first
+        self.encodings = {
+            entry["file"]: [encoding for encoding in ENCODINGS if encoding in entry]
+            for entry in self.files.values()
+        }
+
+    def lookup(self, name):
+        """The hashed file for name, relative to dist_dir, or None if it is not built"""
+        entry = self.files.get(name)
+        return entry["file"] if entry else None
+
+    def resolve(self, filename, accept_encoding):
+        """(path, encoding) to send for a hashed filename, or None if it is not an asset.
+
+        encoding is the precompressed variant the Accept-Encoding header
+        prefers, or None for the file itself.
+        """
+        if filename not in self.encodings:
+            return None
+        path = os.path.join(self.dist_dir, *filename.split("/"))
+        encoding = preferred_encoding(accept_encoding, self.encodings[filename])
+        if encoding is not None:
+            path += ENCODINGS[encoding]
+        return path, encoding
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the web UI's static assets")
+    parser.add_argument("--dist", default=DIST_DIR, help=f"output directory (default: {DIST_DIR})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="minify, hash and precompress the assets")
+    subparsers.add_parser("list", help="show the built assets and their sizes")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        files = build(dist_dir=args.dist)
+        if brotli is None:
+            print("brotli is not installed; writing gzip copies only", file=sys.stderr)
+    else:
+        files = load_manifest(args.dist)
+        if not files:
+            parser.error(f"no build in {args.dist} (run: python assets.py build)")
+
+    print(f"{'asset':<64}{'bytes':>10}{'gzip':>10}{'br':>10}")
+    for name, entry in files.items():
+        sizes = "".join(f"{entry[key]:>10,}" if key in entry else f"{'-':>10}" for key in ("size", "gzip", "br"))
+        print(f"{entry['file']:<64}{sizes}")
+    total = sum(entry["size"] for entry in files.values())
+    sent = sum(min(entry.get(key, entry["size"]) for key in ENCODINGS) for entry in files.values())
+    print(f"{len(files)} assets, {total:,} bytes ({sent:,} compressed)")
+
+if __name__ == "__main__":
+    main()
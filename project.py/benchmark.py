@@ -0,0 +1,844 @@
+"""Benchmarks for the expense tracker.
+
+Usage:
+    python benchmark.py indexes --rows 1000000
+    python benchmark.py pool --threads 8
+    python benchmark.py analytics --rows 100000 1000000 10000000
+    python benchmark.py storage --rows 1000000
+    python benchmark.py search --rows 1000000
+    python benchmark.py archive --rows 1000000 --years 10 --through 2024-12
+    python benchmark.py assets --mbps 10 --rtt 50
+    python benchmark.py snapshot --rows 1000000 --seconds 10
+    python benchmark.py startup
+    python benchmark.py suite --rows 10000 1000000 --output results.json --baseline baseline.json
+"""
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from archive import close_months
+from columnar import cumulative_totals, load_columns
+from db import ConnectionPool
+from expense_repository import ExpenseRepository, get_repository
+from loadtest import percentile
+from migrations import EXPENSE_ROWS, LATEST_VERSION, migrate, month_range, to_timestamp
+
+# Share of expenses and lognormal amount (median, spread) per category, so
+# synthetic ledgers have many small food/transport rows and a few large bills
+CATEGORY_PROFILES = {
+    "Food": (0.38, 18.0, 0.6),
+    "Transportation": (0.20, 15.0, 0.7),
+    "Entertainment": (0.12, 30.0, 0.8),
+    "Other": (0.17, 25.0, 1.0),
+    "Utilities": (0.08, 80.0, 0.4),
+    "Housing": (0.05, 900.0, 0.3),
+}
+# Description words per category; rows cycle through them so that search has
+# realistic common and rare terms (every description also ends in a unique number)
+CATEGORY_DESCRIPTIONS = {
+    "Food": ["groceries market", "coffee shop", "lunch downtown", "dinner with friends", "bakery"],
+    "Transportation": ["bus ticket", "fuel station", "taxi ride", "parking garage", "train pass"],
+    "Entertainment": ["cinema tickets", "concert", "streaming subscription", "museum visit"],
+    "Other": ["pharmacy", "hardware store", "gift shop", "dry cleaning", "bookstore"],
+    "Utilities": ["electricity bill", "water bill", "internet service", "phone plan"],
+    "Housing": ["monthly rent", "home insurance"],
+}
+# Bills land in the first days of a month rather than any day
+BILL_CATEGORIES = ("Utilities", "Housing")
+GENERATE_CHUNK = 100_000
+# The last schema version with a plain expenses table; rows are generated into
+# it and then migrated, which is much faster than inserting through the view
+TEXT_LAYOUT_VERSION = 4
+
+
+def generate_ledger(db_file, rows, seed=42, target=None, years=3):
+    """Fill db_file with rows of synthetic expenses spread over the last few years.
+
+    Categories, amounts and dates follow CATEGORY_PROFILES; weekends are busier
+    and bills fall on the first five days of a month. The same seed always
+    produces the same ledger.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_file)
+    if target is None:
+        target = LATEST_VERSION
+    migrate(conn, min(target, TEXT_LAYOUT_VERSION))
+
+    start = datetime(2026, 1, 1) - timedelta(days=365 * years)
+    days = [start + timedelta(days=i) for i in range(365 * years)]
+    day_labels = [day.strftime("%Y-%m-%d") for day in days]
+    # Weekend days (Saturday, Sunday) are half again as likely
+    day_weights = [1.5 if day.weekday() >= 5 else 1.0 for day in days]
+    bill_days = [i for i, day in enumerate(days) if day.day <= 5]
+
+    categories = list(CATEGORY_PROFILES)
+    category_weights = [CATEGORY_PROFILES[c][0] for c in categories]
+    amount_params = {c: (math.log(median), spread) for c, (_, median, spread) in CATEGORY_PROFILES.items()}
+
+    def rows_iter():
+        for offset in range(0, rows, GENERATE_CHUNK):
+            n = min(GENERATE_CHUNK, rows - offset)
+            chosen = rng.choices(categories, category_weights, k=n)
+            day_indexes = rng.choices(range(len(days)), day_weights, k=n)
+            for i, (category, day_index) in enumerate(zip(chosen, day_indexes)):
+                if category in BILL_CATEGORIES:
+                    day_index = rng.choice(bill_days)
+                mu, sigma = amount_params[category]
+                seconds = rng.randrange(86400)
+                words = CATEGORY_DESCRIPTIONS[category]
+                yield (
+                    round(rng.lognormvariate(mu, sigma), 2),
+                    category,
+                    f"{words[(offset + i) % len(words)]} {offset + i}",
+                    f"{day_labels[day_index]} {seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}",
+                )
+
+    conn.executemany(
+        "INSERT INTO expenses (amount, category, description, date) VALUES (?, ?, ?, ?)",
+        rows_iter()
+    )
+    conn.commit()
+    migrate(conn, target)
+    return conn
+
+
+def best_time(fn, repeat=5):
+    """Return the best wall-clock time of fn over repeat runs, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def query_plan(conn, sql, params):
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return "; ".join(row[3] for row in rows)
+
+
+def bench_indexes(args):
+    """Compare the hot queries before and after the index migration"""
+    start, end = month_range(2025, 6)
+    queries = [
+        ("category total",
+         "SELECT SUM(amount) FROM expenses WHERE category = ?", ("Food",)),
+        ("category page",
+         "SELECT * FROM expenses WHERE category = ? ORDER BY date DESC, id DESC LIMIT 51", ("Food",)),
+        ("recent page",
+         "SELECT * FROM expenses ORDER BY date DESC, id DESC LIMIT 51", ()),
+        ("month report (LIKE)",
+         "SELECT category, SUM(amount) FROM expenses WHERE date LIKE ? GROUP BY category", ("2025-06-%",)),
+        ("month report (range)",
+         "SELECT category, SUM(amount) FROM expenses WHERE date >= ? AND date < ? GROUP BY category",
+         (start, end)),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        print(f"Generating {args.rows:,} rows...")
+        conn = generate_ledger(db_file, args.rows, target=1)
+
+        def run_all():
+            results = {}
+            for name, sql, params in queries:
+                ms = best_time(lambda: conn.execute(sql, params).fetchall(), args.repeat)
+                results[name] = (ms, query_plan(conn, sql, params))
+            return results
+
+        before = run_all()
+        build_start = time.perf_counter()
+        migrate(conn, 2)
+        conn.execute("ANALYZE")
+        print(f"Index build: {time.perf_counter() - build_start:.2f}s")
+        after = run_all()
+        conn.close()
+
+    print(f"\n{'query':<22}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name, _, _ in queries:
+        b, a = before[name][0], after[name][0]
+        print(f"{name:<22}{b:>12.2f}{a:>12.2f}{b / a:>9.1f}x")
+    print("\nQuery plans after migration:")
+    for name, _, _ in queries:
+        print(f"  {name}: {before[name][1]}  ->  {after[name][1]}")
+
+
+def bench_pool(args):
+    """Compare connect-per-query against the pooled, pragma-tuned connections"""
+    # A typical page view: dashboard total, category totals and a page of rows
+    statements = [
+        ("SELECT SUM(total) FROM category_totals", ()),
+        ("SELECT category, total FROM category_totals", ()),
+        (EXPENSE_ROWS + " ORDER BY r.ts DESC, r.id DESC LIMIT 50", ()),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        print(f"Generating {args.rows:,} rows...")
+        generate_ledger(db_file, args.rows).close()
+
+        def connect_per_query():
+            for sql, params in statements:
+                conn = sqlite3.connect(db_file)
+                conn.row_factory = sqlite3.Row
+                conn.execute(sql, params).fetchall()
+                conn.close()
+
+        pool = ConnectionPool(db_file, size=args.threads)
+
+        def pooled():
+            for sql, params in statements:
+                with pool.connection() as conn:
+                    conn.execute(sql, params).fetchall()
+
+        print(f"\n{'mode':<20}{'requests/s':>14}")
+        for name, fn in [("connect per query", connect_per_query), ("connection pool", pooled)]:
+            with ThreadPoolExecutor(max_workers=args.threads) as executor:
+                start = time.perf_counter()
+                list(executor.map(lambda _: fn(), range(args.requests)))
+                elapsed = time.perf_counter() - start
+            print(f"{name:<20}{args.requests / elapsed:>14,.0f}")
+        pool.close()
+
+
+def legacy_trend(conn):
+    """The row-at-a-time trend computation that the columnar path replaced"""
+    expenses = [dict(row) for row in conn.execute("SELECT * FROM expenses")]
+    sorted_expenses = sorted(expenses, key=lambda x: datetime.strptime(x["date"], "%Y-%m-%d %H:%M:%S"))
+    dates = [datetime.strptime(expense["date"], "%Y-%m-%d %H:%M:%S") for expense in sorted_expenses]
+    cumulative = []
+    total = 0
+    for expense in sorted_expenses:
+        total += expense["amount"]
+        cumulative.append(total)
+    return dates, cumulative
+
+
+def columnar_trend(conn):
+    columns = load_columns(conn)
+    return columns.timestamps, cumulative_totals(columns)
+
+
+def bench_analytics(args):
+    """Compare the dict/strptime trend path against the NumPy columnar path"""
+    print(f"{'rows':>12}{'legacy ms':>14}{'columnar ms':>14}{'speedup':>10}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = generate_ledger(os.path.join(tmp, "bench.db"), rows)
+            conn.row_factory = sqlite3.Row
+            legacy = best_time(lambda: legacy_trend(conn), args.repeat)
+            columnar = best_time(lambda: columnar_trend(conn), args.repeat)
+            conn.close()
+        print(f"{rows:>12,}{legacy:>14.0f}{columnar:>14.0f}{legacy / columnar:>9.1f}x")
+
+
+def storage_sizes(conn):
+    """(file bytes, {table or index: bytes}) after a VACUUM; the breakdown needs SQLite's dbstat"""
+    conn.execute("VACUUM")
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    try:
+        objects = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    except sqlite3.OperationalError:
+        objects = {}
+    return page_size * page_count, objects
+
+
+def bench_storage(args):
+    """Compare size and query speed of the text layout with the compact one (migration 5)"""
+    start, end = month_range(2025, 6)
+    text_queries = {
+        "category sums (scan)": ("SELECT category, SUM(amount) FROM expenses GROUP BY category", ()),
+        "month by category": (
+            "SELECT category, SUM(amount) FROM expenses WHERE date >= ? AND date < ? GROUP BY category",
+            (start, end)),
+        "recent page": ("SELECT * FROM expenses ORDER BY date DESC, id DESC LIMIT 51", ()),
+        "category page": (
+            "SELECT * FROM expenses WHERE category = ? ORDER BY date DESC, id DESC LIMIT 51", ("Food",)),
+    }
+    compact_queries = {
+        "category sums (scan)": (
+            "SELECT category_id, SUM(amount_cents) FROM expense_records GROUP BY category_id", ()),
+        "month by category": (
+            "SELECT category_id, SUM(amount_cents) FROM expense_records WHERE ts >= ? AND ts < ? "
+            "GROUP BY category_id", (to_timestamp(start), to_timestamp(end))),
+        "recent page": (EXPENSE_ROWS + " ORDER BY r.ts DESC, r.id DESC LIMIT 51", ()),
+        "category page": (
+            EXPENSE_ROWS + " WHERE r.category_id = (SELECT id FROM categories WHERE name = ?) "
+            "ORDER BY r.ts DESC, r.id DESC LIMIT 51", ("Food",)),
+    }
+
+    def run_all(conn, queries):
+        return {name: best_time(lambda: conn.execute(sql, params).fetchall(), args.repeat)
+                for name, (sql, params) in queries.items()}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        print(f"Generating {args.rows:,} rows...")
+        conn = generate_ledger(db_file, args.rows, target=TEXT_LAYOUT_VERSION)
+        conn.execute("ANALYZE")
+        size_before, objects_before = storage_sizes(conn)
+        text = run_all(conn, text_queries)
+
+        migrate_start = time.perf_counter()
+        migrate(conn)
+        print(f"Migration: {time.perf_counter() - migrate_start:.2f}s")
+        conn.execute("ANALYZE")
+        size_after, objects_after = storage_sizes(conn)
+        compact = run_all(conn, compact_queries)
+        # The same text-layout queries, now answered through the compatibility view
+        view = run_all(conn, text_queries)
+        conn.close()
+
+    print(f"\n{'database size':<22}{size_before / 1e6:>10.1f} MB -> {size_after / 1e6:.1f} MB "
+          f"({1 - size_after / size_before:.0%} smaller)")
+    for name, size in sorted(objects_before.items(), key=lambda item: -item[1])[:6]:
+        print(f"  before  {name:<36}{size / 1e6:>8.1f} MB")
+    for name, size in sorted(objects_after.items(), key=lambda item: -item[1])[:6]:
+        print(f"  after   {name:<36}{size / 1e6:>8.1f} MB")
+
+    print(f"\n{'query':<22}{'text ms':>10}{'compact ms':>12}{'speedup':>10}{'via view ms':>14}")
+    for name in text_queries:
+        t, c = text[name], compact[name]
+        print(f"{name:<22}{t:>10.2f}{c:>12.2f}{t / c:>9.1f}x{view[name]:>14.2f}")
+
+
+# Latency target for one page of search results
+SEARCH_BUDGET_MS = 50
+
+# (name, SearchQuery arguments), from rare to common terms and filters
+SEARCH_CASES = [
+    ("rare number", {'text': "12345"}),
+    ("common word", {'text': "coffee"}),
+    ("two words", {'text': "dinner friends"}),
+    ("prefix", {'text': "gro"}),
+    ("no match", {'text': "zebra"}),
+    ("word + category + month", {'text': "bus", 'category': "Transportation",
+                                 'start': "2025-06-01", 'end': "2025-06-30"}),
+    ("category + amount", {'category': "Housing", 'min_amount': "1500"}),
+    ("amount range", {'min_amount': "100", 'max_amount': "150"}),
+    ("rare amount", {'min_amount': "5000"}),
+    ("month + amount", {'start': "2025-06-01", 'end': "2025-06-30", 'min_amount': "50"}),
+]
+
+
+def bench_search(args):
+    """Time one page of /api/expenses/search results per kind of query against the latency budget"""
+    from search import SearchQuery
+
+    over_budget = False
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        print(f"Generating {args.rows:,} rows...")
+        generate_ledger(db_file, args.rows).close()
+        tracker = get_repository(db_file)
+
+        print(f"\n{'query':<28}{'rows':>6}{'page 1 ms':>11}{'page 2 ms':>11}")
+        for name, filters in SEARCH_CASES:
+            query = SearchQuery(**filters)
+            expenses, next_cursor = tracker.search_expenses(query, args.limit)
+            first = best_time(lambda: tracker.search_expenses(query, args.limit), args.repeat)
+            second = 0.0
+            if next_cursor:
+                second = best_time(lambda: tracker.search_expenses(query, args.limit, next_cursor), args.repeat)
+            flag = "  OVER BUDGET" if max(first, second) > SEARCH_BUDGET_MS else ""
+            over_budget = over_budget or bool(flag)
+            print(f"{name:<28}{len(expenses):>6}{first:>11.2f}{second:>11.2f}{flag}")
+        tracker.close()
+
+    if over_budget:
+        sys.exit(1)
+
+
+def file_size(path):
+    """Size of a database file plus its WAL, in bytes"""
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def bench_archive(args):
+    """Compare ledger size and query speed before and after archiving the closed years"""
+    from search import SearchQuery
+
+    def run_all(tracker):
+        search = SearchQuery(text="coffee")
+        return {
+            "recent page": best_time(lambda: tracker.get_expenses_page(limit=50), args.repeat),
+            "category page": best_time(lambda: tracker.get_expenses_page("Food", limit=50), args.repeat),
+            "search page": best_time(lambda: tracker.search_expenses(search, 50), args.repeat),
+            "total": best_time(tracker.get_total, args.repeat),
+            "monthly totals": best_time(tracker.get_monthly_totals, args.repeat),
+            "day trend": best_time(lambda: tracker.get_trend("day"), args.repeat),
+            "year report": best_time(lambda: tracker.generate_reports(["2020"], True), args.repeat),
+        }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        print(f"Generating {args.rows:,} rows over {args.years} years...")
+        generate_ledger(db_file, args.rows, years=args.years).close()
+        conn = sqlite3.connect(db_file, isolation_level=None)
+        conn.execute("VACUUM")
+        size_before = file_size(db_file)
+
+        tracker = get_repository(db_file)
+        before = run_all(tracker)
+        total_before = tracker.get_total()
+        tracker.close()
+
+        start = time.perf_counter()
+        moved = close_months(conn, args.through)
+        elapsed = time.perf_counter() - start
+        conn.execute("VACUUM")
+        hot_rows = conn.execute("SELECT COUNT(*) FROM expense_records").fetchone()[0]
+        conn.close()
+        size_after = file_size(db_file)
+        archive_dir = os.path.join(tmp, "bench-archive")
+        archive_size = sum(file_size(os.path.join(archive_dir, name))
+                           for name in os.listdir(archive_dir) if name.endswith(".db"))
+
+        tracker = get_repository(db_file)
+        after = run_all(tracker)
+        total_after = tracker.get_total()
+        tracker.close()
+
+    print(f"Archived {moved:,} rows through {args.through} in {elapsed:.1f}s; {hot_rows:,} rows stay live")
+    print(f"Total ${total_before:,.2f} before, ${total_after:,.2f} after")
+    print(f"\n{'ledger file':<22}{size_before / 1e6:>10.1f} MB -> {size_after / 1e6:.1f} MB "
+          f"(archives {archive_size / 1e6:.1f} MB)")
+    print(f"\n{'query':<22}{'before ms':>10}{'after ms':>10}")
+    for name in before:
+        print(f"{name:<22}{before[name]:>10.2f}{after[name]:>10.2f}")
+
+
+def bench_snapshot(args):
+    """Write latency and analytics throughput while both run at once, on the ledger vs the snapshot"""
+    def analytics(tracker):
+        tracker.generate_reports(["2024", "2025"], True)
+        tracker.get_trend("day")
+        tracker.get_stats()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        print(f"Generating {args.rows:,} rows...")
+        generate_ledger(db_file, args.rows).close()
+
+        print(f"\n{'mode':<10}{'writes/s':>10}{'write p50':>11}{'write p99':>11}{'write max':>11}"
+              f"{'analytics/s':>13}{'refresh ms':>12}")
+        for mode in ("ledger", "snapshot"):
+            tracker = ExpenseRepository(db_file)
+            if mode == "snapshot":
+                tracker.enable_snapshot(args.staleness, args.staleness / 2)
+            analytics(tracker)
+            stop = threading.Event()
+            write_ms, runs = [], []
+
+            def write():
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    tracker.add_expense(12.5, "Food", "benchmark")
+                    write_ms.append((time.perf_counter() - start) * 1000)
+
+            def read():
+                while not stop.is_set():
+                    analytics(tracker)
+                    runs.append(1)
+
+            threads = [threading.Thread(target=write)]
+            threads += [threading.Thread(target=read) for _ in range(args.readers)]
+            for thread in threads:
+                thread.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+            refresh = tracker.snapshot.metrics()["refresh_ms_max"] if tracker.snapshot else 0.0
+            tracker.close()
+            write_ms.sort()
+            print(f"{mode:<10}{len(write_ms) / args.seconds:>10,.0f}{percentile(write_ms, 0.5):>11.2f}"
+                  f"{percentile(write_ms, 0.99):>11.2f}{write_ms[-1]:>11.2f}"
+                  f"{len(runs) / args.seconds:>13.1f}{refresh:>12.1f}")
+
+
+# Pages weighed by the assets benchmark
+ASSET_PAGES = ("/", "/expenses", "/analytics")
+# Browsers open this many connections per host, so assets load this many at a time
+PARALLEL_REQUESTS = 6
+_PAGE_ASSETS = re.compile(r'<(?:link|script)\b[^>]*?(?:href|src)="(/(?:static|assets)/[^"]+)"')
+
+
+def page_load(client, path, accept_encoding, mbps, rtt_ms):
+    """Requests, bytes and modelled load time for a first and a repeat visit to path.
+
+    The model is a waterfall: the page, then its assets PARALLEL_REQUESTS at
+    a time, one round trip per wave, with every byte over a link of mbps. A
+    repeat visit fetches the page again and revalidates each asset whose
+    Cache-Control does not let the browser reuse it outright.
+    """
+    headers = {"Accept-Encoding": accept_encoding} if accept_encoding else {}
+    bytes_per_ms = mbps * 1e6 / 8 / 1000
+
+    def load_ms(requests, size):
+        waves = math.ceil((requests - 1) / PARALLEL_REQUESTS)
+        return (1 + waves) * rtt_ms + size / bytes_per_ms
+
+    started = time.perf_counter()
+    page = client.get(path, headers=headers)
+    html = page.data
+    if page.headers.get("Content-Encoding") == "gzip":
+        html = gzip.decompress(html)
+    first = [len(page.data)]
+    repeat = [len(page.data)]
+    for url in _PAGE_ASSETS.findall(html.decode("utf-8")):
+        response = client.get(url, headers=headers)
+        first.append(len(response.data))
+        cache_control = response.headers.get("Cache-Control", "")
+        if "immutable" not in cache_control:
+            revalidated = client.get(url, headers=dict(headers, **{"If-None-Match": response.headers.get("ETag", "")}))
+            repeat.append(len(revalidated.data))
+            revalidated.close()
+        response.close()
+    server_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "requests": len(first),
+        "kb": sum(first) / 1024,
+        "load_ms": load_ms(len(first), sum(first)),
+        "repeat_requests": len(repeat),
+        "repeat_kb": sum(repeat) / 1024,
+        "repeat_load_ms": load_ms(len(repeat), sum(repeat)),
+        "server_ms": server_ms,
+    }
+
+
+def bench_assets(args):
+    """Page weight and modelled load time with the plain static files and with the built assets"""
+    from assets import AssetManifest, brotli, build
+
+    configs = [("static", None), ("static+gzip", "gzip"), ("built+gzip", "gzip")]
+    if brotli is not None:
+        configs.append(("built+br", "br, gzip"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app_web opens expenses.db in the working directory on import
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            import app_web
+
+            db_file = os.path.join(tmp, "bench.db")
+            generate_ledger(db_file, args.rows).close()
+            app_web.tracker = app_web.get_repository(db_file)
+            client = app_web.app.test_client()
+            dist_dir = os.path.join(tmp, "dist")
+            build(dist_dir=dist_dir)
+
+            print(f"{args.mbps:g} Mbit/s, {args.rtt:g} ms round trips, {PARALLEL_REQUESTS} requests at a time\n")
+            print(f"{'assets':<14}{'page':<12}{'requests':>9}{'KB':>9}{'load ms':>9}"
+                  f"{'repeat req':>12}{'repeat KB':>11}{'repeat ms':>11}{'server ms':>11}")
+            for name, accept_encoding in configs:
+                app_web.asset_manifest = AssetManifest(dist_dir if name.startswith("built") else tmp)
+                # Pages are cached with the asset URLs in them
+                app_web.cache.clear()
+                for path in ASSET_PAGES:
+                    client.get(path)
+                    runs = [page_load(client, path, accept_encoding, args.mbps, args.rtt)
+                            for _ in range(args.repeat)]
+                    result = min(runs, key=lambda run: run["server_ms"])
+                    print(f"{name:<14}{path:<12}{result['requests']:>9}{result['kb']:>9.1f}"
+                          f"{result['load_ms']:>9.0f}{result['repeat_requests']:>12}"
+                          f"{result['repeat_kb']:>11.1f}{result['repeat_load_ms']:>11.0f}{result['server_ms']:>11.1f}")
+            app_web.tracker.close()
+        finally:
+            os.chdir(cwd)
+
+
+# Import-time budgets for the entry points, in milliseconds
+STARTUP_BUDGETS_MS = {
+    "app": 60,
+    "expense_analyzer": 100,
+    "app_web": 400,
+}
+
+
+def import_time_ms(module, cwd):
+    """Cumulative import time of module in a fresh interpreter, from -X importtime"""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, env=env, capture_output=True, text=True, check=True
+    )
+    for line in reversed(result.stderr.splitlines()):
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+def bench_startup(args):
+    """Check each entry point's import time against its budget; exits 1 if any is over"""
+    over_budget = False
+    print(f"{'module':<20}{'import ms':>12}{'budget ms':>12}")
+    # Run in an empty directory so app_web's startup does not touch a real ledger
+    with tempfile.TemporaryDirectory() as tmp:
+        for module, budget in STARTUP_BUDGETS_MS.items():
+            ms = min(import_time_ms(module, tmp) for _ in range(args.repeat))
+            flag = "" if ms <= budget else "  OVER BUDGET"
+            over_budget = over_budget or ms > budget
+            print(f"{module:<20}{ms:>12.1f}{budget:>12}{flag}")
+    if over_budget:
+        sys.exit(1)
+
+
+# Pages and API routes exercised by the suite's load test
+SUITE_PATHS = (
+    "/",
+    "/expenses",
+    "/analytics",
+    "/api/expenses?limit=50",
+    "/api/category_totals",
+    "/api/monthly_totals",
+    "/api/trend?bucket=day&points=500",
+    "/api/reports?year=2025&granularity=quarterly",
+)
+# get_expenses() loads every row into dicts, so it is skipped on larger ledgers
+FULL_LIST_MAX_ROWS = 1_000_000
+
+
+def suite_micro(db_file, rows, repeat):
+    """Time the tracker and analyzer methods, in milliseconds (best of repeat)"""
+    from expense_analyzer import ExpenseAnalyzer
+
+    tracker = get_repository(db_file)
+    analyzer = ExpenseAnalyzer(db_file)
+
+    def monthly_report():
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyzer.generate_monthly_report(2025, 6)
+
+    benchmarks = {
+        "get_expenses(Housing)": lambda: tracker.get_expenses("Housing"),
+        "get_expenses_page": lambda: tracker.get_expenses_page(limit=50),
+        "get_total": tracker.get_total,
+        "get_total(Food)": lambda: tracker.get_total("Food"),
+        "get_category_totals": tracker.get_category_totals,
+        "get_monthly_totals": tracker.get_monthly_totals,
+        "generate_monthly_report": monthly_report,
+    }
+    if rows <= FULL_LIST_MAX_ROWS:
+        benchmarks["get_expenses"] = tracker.get_expenses
+
+    return {name: round(best_time(fn, repeat), 3) for name, fn in benchmarks.items()}
+
+
+def suite_http(db_file, requests, concurrency, repeat):
+    """Load test each path through the Flask test client: cold (uncached) time, then warm throughput"""
+    import app_web
+
+    app_web.tracker = app_web.get_repository(db_file)
+    client = app_web.app.test_client()
+    results = {}
+    for path in SUITE_PATHS:
+        def cold_request():
+            app_web.cache.clear()
+            return client.get(path)
+
+        status = cold_request().status_code
+        cold_ms = best_time(cold_request, repeat)
+
+        def one_request(_):
+            started = time.perf_counter()
+            response = client.get(path)
+            return time.perf_counter() - started, response.status_code >= 400
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            started = time.perf_counter()
+            outcomes = list(executor.map(one_request, range(requests)))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in outcomes)
+        results[path] = {
+            'status': status,
+            'cold_ms': round(cold_ms, 3),
+            'rps': round(requests / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'errors': sum(failed for _, failed in outcomes),
+        }
+    return results
+
+
+def flatten_results(results):
+    """{"rows/section/name/metric": value} for every timing, used to compare runs"""
+    flat = {}
+    for rows, sections in results.items():
+        for name, ms in sections['micro'].items():
+            flat[f"{rows}/micro/{name}/ms"] = ms
+        for path, stats in sections['http'].items():
+            for metric in ('cold_ms', 'p50_ms', 'p99_ms'):
+                flat[f"{rows}/http/{path}/{metric}"] = stats[metric]
+    return flat
+
+
+def compare_results(current, baseline, threshold, min_delta_ms):
+    """Print every metric against the baseline; returns the keys that regressed past threshold.
+
+    Slowdowns smaller than min_delta_ms are ignored as timer and scheduling noise.
+    """
+    current, baseline = flatten_results(current), flatten_results(baseline)
+    regressions = []
+    print(f"\n{'metric':<70}{'baseline':>12}{'current':>12}{'change':>9}")
+    for key, value in current.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]
+        change = (value - before) / before if before else 0.0
+        flag = ""
+        if change > threshold and value - before >= min_delta_ms:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<70}{before:>12.3f}{value:>12.3f}{change:>+8.0%}{flag}")
+    return regressions
+
+
+def bench_suite(args):
+    """Microbenchmarks and test-client load tests per ledger size, saved as JSON"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # app_web opens expenses.db in the working directory on import
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            for rows in args.rows:
+                db_file = os.path.join(tmp, f"suite-{rows}.db")
+                print(f"Generating {rows:,} rows...", file=sys.stderr)
+                generate_ledger(db_file, rows, seed=args.seed).close()
+                results[str(rows)] = {
+                    'micro': suite_micro(db_file, rows, args.repeat),
+                    'http': suite_http(db_file, args.requests, args.concurrency, args.repeat),
+                }
+                get_repository(db_file).close()
+                os.remove(db_file)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec="seconds"),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline['results'], args.threshold, args.min_delta)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) slower than the baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Expense tracker benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    indexes = subparsers.add_parser("indexes", help="full scans vs index seeks")
+    indexes.add_argument("--rows", type=int, default=1_000_000)
+    indexes.add_argument("--repeat", type=int, default=5)
+    indexes.set_defaults(func=bench_indexes)
+
+    pool = subparsers.add_parser("pool", help="connect-per-query vs connection pool throughput")
+    pool.add_argument("--rows", type=int, default=100_000)
+    pool.add_argument("--requests", type=int, default=5_000)
+    pool.add_argument("--threads", type=int, default=8)
+    pool.set_defaults(func=bench_pool)
+
+    analytics = subparsers.add_parser("analytics", help="row-at-a-time vs columnar trend computation")
+    analytics.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    analytics.add_argument("--repeat", type=int, default=3)
+    analytics.set_defaults(func=bench_analytics)
+
+    storage = subparsers.add_parser("storage", help="text vs compact storage format: size and query speed")
+    storage.add_argument("--rows", type=int, default=1_000_000)
+    storage.add_argument("--repeat", type=int, default=5)
+    storage.set_defaults(func=bench_storage)
+
+    search = subparsers.add_parser("search", help="search latency per kind of query against the 50 ms budget")
+    search.add_argument("--rows", type=int, default=1_000_000)
+    search.add_argument("--limit", type=int, default=50)
+    search.add_argument("--repeat", type=int, default=5)
+    search.set_defaults(func=bench_search)
+
+    archive = subparsers.add_parser("archive", help="ledger size and query speed before and after archiving")
+    archive.add_argument("--rows", type=int, default=1_000_000)
+    archive.add_argument("--years", type=int, default=10, help="years of history to generate (default: 10)")
+    archive.add_argument("--through", default="2024-12", help="last month to archive (default: 2024-12)")
+    archive.add_argument("--repeat", type=int, default=5)
+    archive.set_defaults(func=bench_archive)
+
+    assets = subparsers.add_parser("assets", help="page weight and load time, plain vs built static assets")
+    assets.add_argument("--rows", type=int, default=10_000)
+    assets.add_argument("--mbps", type=float, default=10.0, help="modelled bandwidth in Mbit/s (default: 10)")
+    assets.add_argument("--rtt", type=float, default=50.0, help="modelled round trip in ms (default: 50)")
+    assets.add_argument("--repeat", type=int, default=5)
+    assets.set_defaults(func=bench_assets)
+
+    snapshot = subparsers.add_parser("snapshot", help="writes alongside analytics, on the ledger vs the snapshot")
+    snapshot.add_argument("--rows", type=int, default=1_000_000)
+    snapshot.add_argument("--seconds", type=float, default=10.0)
+    snapshot.add_argument("--readers", type=int, default=2, help="threads running analytics (default: 2)")
+    snapshot.add_argument("--staleness", type=float, default=5.0,
+                          help="snapshot max staleness in seconds (default: 5)")
+    snapshot.set_defaults(func=bench_snapshot)
+
+    startup = subparsers.add_parser("startup", help="import time of each entry point against its budget")
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.set_defaults(func=bench_startup)
+
+    suite = subparsers.add_parser("suite", help="microbenchmarks and HTTP load tests, saved as JSON")
+    suite.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000],
+                       help="ledger sizes to test (default: 10000 1000000; add 10000000 for the full run)")
+    suite.add_argument("--repeat", type=int, default=5)
+    suite.add_argument("--requests", type=int, default=200, help="requests per path")
+    suite.add_argument("--concurrency", type=int, default=8)
+    suite.add_argument("--seed", type=int, default=42)
+    suite.add_argument("--output", help="write the results JSON here (default: stdout)")
+    suite.add_argument("--baseline", help="compare against a previous results JSON; exits 1 on regressions")
+    suite.add_argument("--threshold", type=float, default=0.25,
+                       help="relative slowdown that counts as a regression (default: 0.25)")
+    suite.add_argument("--min-delta", type=float, default=1.0,
+                       help="ignore slowdowns smaller than this many ms (default: 1.0)")
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
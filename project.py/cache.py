@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class DataVersion:
+    """The ledger's write counter (maintained by triggers, see migration 4).
+
+    The value is re-read from the database at most every `ttl` seconds, so
+    version checks are usually free; writes made through this process call
+    invalidate() to be seen immediately, and writes from other processes
+    (the CLI, importer) are picked up within `ttl`. Functions added with
+    add_listener() are called after every invalidate().
+    """
+
+    def __init__(self, pool, ttl=1.0):
+        self.pool = pool
+        self.ttl = ttl
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def current(self):
+        with self._lock:
+            if self._version is not None and time.monotonic() - self._checked < self.ttl:
+                return self._version
+
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+
+        with self._lock:
+            self._version = row[0] if row else 0
+            self._checked = time.monotonic()
+            return self._version
+
+    def invalidate(self):
+        with self._lock:
+            self._checked = 0.0
+        for listener in self._listeners:
+            listener()
+
+
+class VersionedCache:
+    """A thread-safe LRU cache whose entries are only valid for the data version
+    they were computed at, and optionally expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, version, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_version, stored_at, value = entry
+                if entry_version == version and (self.ttl is None or now - stored_at < self.ttl):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+
+        # Computed outside the lock; concurrent misses may compute the same value twice
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = (version, now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
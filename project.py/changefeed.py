@@ -0,0 +1,171 @@
+"""Live changefeed: expense inserts and deletes pushed to the web pages as Server-Sent Events.
+
+Triggers append every insert and delete on expense_records to change_log
+(migration 7), whichever process made them; archiving a month appends a
+single reset instead (migration 10). One ChangeFeed thread per
+repository reads new entries while anyone is subscribed, and builds one
+"change" event from them. The event holds the inserted rows, the deleted
+ids, the updated totals and the budget alerts, and is sent to every
+subscriber. Pages patch their tables and charts from it, instead of
+reloading and fetching every dataset again after each write.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+# Past this many changes at once (a bulk import, say), clients get a "reset"
+# event and reload instead of patching row by row
+MAX_EVENT_CHANGES = 500
+# Writes made through this process wake the feed at once; writes from other
+# processes are seen within this many seconds
+POLL_INTERVAL = 1.0
+# A comment line this often keeps proxies from closing an idle stream
+HEARTBEAT_INTERVAL = 15.0
+# Events waiting for a slow client before it is sent a reset instead
+MAX_PENDING_EVENTS = 100
+
+HEARTBEAT = b": keepalive\n\n"
+
+
+def format_event(name, seq, data):
+    """Encode one Server-Sent Event; its id lets a reconnecting client resume after it"""
+    return f"id: {seq}\nevent: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def reset_event(seq):
+    return format_event('reset', seq, {'seq': seq})
+
+
+class Subscription:
+    """The events waiting to be sent to one client.
+
+    wake is called from the feed's thread whenever an event is queued; the
+    client's stream then collects everything queued with take().
+    """
+
+    def __init__(self, wake, max_pending=MAX_PENDING_EVENTS):
+        self.wake = wake
+        self.max_pending = max_pending
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def put(self, seq, event):
+        with self._lock:
+            if len(self._events) >= self.max_pending:
+                # The client has fallen too far behind to patch its page
+                self._events.clear()
+                event = reset_event(seq)
+            self._events.append(event)
+        self.wake()
+
+    def take(self):
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+
+class ChangeFeed:
+    """Reads the change log from one thread while anyone is subscribed, and fans it out"""
+
+    def __init__(self, repository, poll_interval=POLL_INTERVAL):
+        self.repository = repository
+        self.poll_interval = poll_interval
+        self.seq = 0
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        repository.data_version.add_listener(self._wake.set)
+
+    def subscribe(self, subscription, last_seq=None):
+        """Send subscription every event from now on.
+
+        With last_seq (a reconnecting client's Last-Event-ID) the changes it
+        missed are sent first.
+        """
+        with self._lock:
+            if self._thread is None:
+                self.seq = self.repository.get_change_seq()
+                self._thread = threading.Thread(target=self._run, name="changefeed", daemon=True)
+                self._thread.start()
+            self._subscriptions.add(subscription)
+            # Sent under the lock, so the catch-up arrives before newer events
+            if last_seq is not None and last_seq < self.seq:
+                event, seq = self._read(last_seq, self.seq)
+                subscription.put(seq, event)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self._lock:
+                if not self._subscriptions:
+                    self._thread = None
+                    return
+                after = self.seq
+
+            event, seq = self._read(after)
+            if event is None:
+                continue
+            with self._lock:
+                self.seq = seq
+                subscriptions = list(self._subscriptions)
+            for subscription in subscriptions:
+                subscription.put(seq, event)
+
+    def _read(self, after, upto=None):
+        """Build the event for the changes after `after` (up to `upto`); returns (event, seq)"""
+        changes = self.repository.get_changes(after, MAX_EVENT_CHANGES + 1)
+        if changes is not None and upto is not None:
+            changes = [change for change in changes if change['seq'] <= upto]
+        if changes is None or len(changes) > MAX_EVENT_CHANGES:
+            seq = upto if upto is not None else self.repository.get_change_seq()
+            return reset_event(seq), seq
+        if not changes:
+            return None, after
+        # Archiving a month logs one reset for all the rows it moved (migration 10)
+        if any(change['op'] == 'reset' for change in changes):
+            seq = changes[-1]['seq']
+            return reset_event(seq), seq
+
+        # Replay the changes in order, so a row added and removed in the same
+        # batch is never sent, and an updated row is sent as removed and re-added
+        inserted = {}
+        deleted = []
+        months = set()
+        for change in changes:
+            expense_id = change['expense_id']
+            months.add(time.strftime("%Y-%m", time.gmtime(change['ts'])))
+            if change['op'] == 'insert':
+                # A NULL amount means the row has been deleted since; its delete
+                # follows, and drops it like any other row inserted in this batch
+                inserted[expense_id] = None if change['amount'] is None else {
+                    'id': expense_id,
+                    'amount': change['amount'],
+                    'category': change['category'],
+                    'description': change['description'],
+                    'date': change['date'],
+                }
+            elif expense_id in inserted:
+                del inserted[expense_id]
+            else:
+                deleted.append(expense_id)
+
+        seq = changes[-1]['seq']
+        return format_event('change', seq, {
+            'seq': seq,
+            # Newest first, like the expense lists
+            'inserted': sorted(filter(None, inserted.values()), key=lambda row: (row['date'], row['id']),
+                               reverse=True),
+            'deleted': deleted,
+            'total': self.repository.get_total(),
+            'category_totals': self.repository.get_category_totals(),
+            'monthly_totals': self.repository.get_month_totals(sorted(months)),
+            'alerts': self.repository.get_budget_alerts(),
+        }), seq
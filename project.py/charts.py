@@ -0,0 +1,156 @@
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from cache import VersionedCache
+
+# Pick the non-interactive backend up front. matplotlib itself (and numpy) is
+# only imported on the first render, so importing this module stays cheap.
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+CHART_KINDS = ("category", "monthly", "trend")
+CHART_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def _new_figure(figsize):
+    from matplotlib.figure import Figure
+    return Figure(figsize=figsize)
+
+
+def _to_bytes(fig, format):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    # Each figure owns its Agg canvas, so no pyplot global state is involved
+    FigureCanvasAgg(fig)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=format)
+    return buffer.getvalue()
+
+
+def _no_data(fig, format):
+    ax = fig.add_subplot()
+    ax.text(0.5, 0.5, "No expense data available", ha="center", va="center", color="gray")
+    ax.set_axis_off()
+    return _to_bytes(fig, format)
+
+
+def render_category_pie(category_totals, format="png"):
+    """Pie chart of expenses by category, from a {category: total} dict"""
+    fig = _new_figure((10, 7))
+    totals = {category: total for category, total in category_totals.items() if total > 0}
+    if not totals:
+        return _no_data(fig, format)
+
+    ax = fig.add_subplot()
+    ax.pie(list(totals.values()), labels=list(totals.keys()), autopct='%1.1f%%', startangle=140)
+    ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
+    ax.set_title('Expenses by Category')
+    fig.tight_layout()
+    return _to_bytes(fig, format)
+
+
+def render_monthly_bar(monthly_totals, format="png"):
+    """Bar chart of expenses by month, from a {"YYYY-MM": total} dict"""
+    fig = _new_figure((12, 6))
+    if not monthly_totals:
+        return _no_data(fig, format)
+
+    sorted_months = sorted(monthly_totals.keys())
+    months = [datetime.strptime(m, "%Y-%m").strftime("%b %Y") for m in sorted_months]
+    values = [monthly_totals[m] for m in sorted_months]
+
+    ax = fig.add_subplot()
+    ax.bar(months, values, color='skyblue')
+    ax.set_xlabel('Month')
+    ax.set_ylabel('Total Expenses ($)')
+    ax.set_title('Monthly Expenses')
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    return _to_bytes(fig, format)
+
+
+def render_trend_line(trend, format="png"):
+    """Line chart of cumulative expenses, from a (dates, cumulative values) pair"""
+    fig = _new_figure((12, 6))
+    dates, cumulative = trend
+    if not len(dates):
+        return _no_data(fig, format)
+
+    import numpy as np
+
+    ax = fig.add_subplot()
+    ax.plot(np.asarray(dates, dtype="datetime64[s]"), cumulative, marker='o', linestyle='-', color='green')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Cumulative Expenses ($)')
+    ax.set_title('Expense Trend Over Time')
+    fig.autofmt_xdate()  # Auto-format the x-axis for dates
+    ax.grid(True, linestyle='--', alpha=0.7)
+    fig.tight_layout()
+    return _to_bytes(fig, format)
+
+
+RENDERERS = {
+    "category": render_category_pie,
+    "monthly": render_monthly_bar,
+    "trend": render_trend_line,
+}
+
+
+def render_chart(kind, data, format="png"):
+    """Render one chart to PNG or SVG bytes (module-level so worker processes can run it)"""
+    return RENDERERS[kind](data, format)
+
+
+class ChartRenderer:
+    """Renders charts in a process pool and caches the bytes per data version.
+
+    With max_workers=0 charts are rendered in the calling thread instead.
+    """
+
+    def __init__(self, max_workers=None, cache_size=64):
+        self.max_workers = max_workers
+        self.cache = VersionedCache(maxsize=cache_size)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn rather than fork: the parent runs threads and holds SQLite connections
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def render_now(self, kind, data, format="png"):
+        if self.max_workers == 0:
+            return render_chart(kind, data, format)
+        try:
+            return self._get_executor().submit(render_chart, kind, data, format).result()
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool next time and render this one here
+            self.close()
+            return render_chart(kind, data, format)
+
+    def render(self, kind, format, version, load_data):
+        """Return cached chart bytes for this data version, rendering from load_data() on a miss"""
+        return self.cache.get_or_compute(
+            (kind, format), version, lambda: self.render_now(kind, load_data(), format)
+        )
+
+    def render_many(self, jobs):
+        """Render (kind, data, format) jobs in parallel, returning bytes in job order"""
+        if self.max_workers == 0:
+            return [render_chart(*job) for job in jobs]
+        executor = self._get_executor()
+        futures = [executor.submit(render_chart, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
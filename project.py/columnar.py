@@ -0,0 +1,79 @@
+from collections import namedtuple
+
+import numpy as np
+
+from archive import attach_archives
+from migrations import to_timestamp
+
+# Expenses as parallel NumPy arrays, sorted by (date, id). category_codes
+# index into the categories list.
+ExpenseColumns = namedtuple(
+    "ExpenseColumns", ["ids", "amounts", "timestamps", "category_codes", "categories"]
+)
+
+
+def empty_columns():
+    return ExpenseColumns(
+        np.empty(0, dtype=np.int64),
+        np.empty(0, dtype=np.float64),
+        np.empty(0, dtype="datetime64[s]"),
+        np.empty(0, dtype=np.intp),
+        [],
+    )
+
+
+def load_columns(conn, start=None, end=None):
+    """Load expenses (optionally within a [start, end) date range) into columns"""
+    # The compact columns are all integers, so no text is parsed on the way in.
+    # A date range is a ts index seek in every archive.
+    attach_archives(conn)
+    query = "SELECT id, amount_cents, category_id, ts FROM ledger_records"
+    params = []
+    if start is not None and end is not None:
+        query += " WHERE ts >= ? AND ts < ?"
+        params = [to_timestamp(start), to_timestamp(end)]
+
+    # Plain tuples are much cheaper to build than sqlite3.Row objects
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = cursor.execute(query, params).fetchall()
+    if not rows:
+        return empty_columns()
+
+    ids, cents, category_ids, seconds = (np.array(column, dtype=np.int64) for column in zip(*rows))
+    del rows
+    amounts = cents / 100
+    timestamps = seconds.astype("datetime64[s]")
+
+    # Codes index the used categories in name order
+    names = dict(cursor.execute("SELECT id, name FROM categories").fetchall())
+    used, inverse = np.unique(category_ids, return_inverse=True)
+    labels = [names[category_id] for category_id in used.tolist()]
+    by_name = np.argsort(labels, kind="stable")
+    rank = np.empty(len(labels), dtype=np.intp)
+    rank[by_name] = np.arange(len(labels))
+    codes = rank[inverse]
+    labels = [labels[i] for i in by_name]
+
+    order = np.lexsort((ids, timestamps))
+    return ExpenseColumns(
+        ids[order], amounts[order], timestamps[order], codes[order], labels
+    )
+
+
+def cumulative_totals(columns):
+    return np.cumsum(columns.amounts)
+
+
+def category_totals(columns):
+    sums = np.bincount(
+        columns.category_codes, weights=columns.amounts, minlength=len(columns.categories)
+    )
+    return dict(zip(columns.categories, sums.tolist()))
+
+
+def monthly_totals(columns):
+    """Sum amounts per "YYYY-MM" month, in chronological order"""
+    months, inverse = np.unique(columns.timestamps.astype("datetime64[M]"), return_inverse=True)
+    sums = np.bincount(inverse, weights=columns.amounts, minlength=len(months))
+    return dict(zip((str(month) for month in months), sums.tolist()))
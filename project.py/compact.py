@@ -0,0 +1,103 @@
+"""Online migration of a ledger to the compact storage format (migration 5).
+
+migrate() upgrades a ledger in one transaction, which blocks writers for as
+long as the copy takes. This tool does the same upgrade while the app keeps
+running: triggers mirror new writes into expense_records, the existing rows
+are copied over in short batched transactions, and the old tables are then
+swapped for compatibility views in one final transaction.
+
+Usage:
+    python compact.py [--db expenses.db] [--batch-size 50000] [--pause 0.05] [--vacuum]
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+from migrations import (COMPACT_COPY, COMPACT_INDEXES, COMPACT_PREPARE, COMPACT_ROLLUP_TRIGGERS,
+                        COMPACT_SWAP, COMPACT_SYNC_TRIGGERS, get_schema_version, migrate)
+
+COMPACT_VERSION = 5
+DEFAULT_COPY_BATCH = 50_000
+# Seconds between batches, so the app's writes are not starved
+DEFAULT_PAUSE = 0.05
+
+
+def _transaction(conn, statements):
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for statement in statements:
+            conn.execute(statement)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def compact_online(conn, batch_size=DEFAULT_COPY_BATCH, pause=DEFAULT_PAUSE, progress=None):
+    """Upgrade conn's ledger to the compact format in batches; returns the rows copied"""
+    if get_schema_version(conn) >= COMPACT_VERSION:
+        return 0
+    migrate(conn, COMPACT_VERSION - 1)
+
+    # Indexes and rollups are maintained row by row from the start, so the
+    # final swap has nothing left to build
+    _transaction(conn, COMPACT_PREPARE + COMPACT_INDEXES + COMPACT_ROLLUP_TRIGGERS + COMPACT_SYNC_TRIGGERS)
+
+    # Rows added from now on are mirrored by the triggers, so only ids up to
+    # the current maximum need copying
+    low, high = conn.execute("SELECT MIN(id), MAX(id) FROM expenses").fetchone()
+    copied = 0
+    if low is not None:
+        for start in range(low, high + 1, batch_size):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                copied += conn.execute(COMPACT_COPY, (start, start + batch_size)).rowcount
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            if progress is not None:
+                progress(min(start + batch_size - 1, high), high)
+            time.sleep(pause)
+
+    _transaction(conn, COMPACT_SWAP + [f"PRAGMA user_version = {COMPACT_VERSION}"])
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a ledger to the compact storage format while it is in use")
+    parser.add_argument("--db", default="expenses.db", help="database file (default: expenses.db)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_COPY_BATCH, help="rows copied per transaction")
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE, help="seconds to wait between batches")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="VACUUM afterwards to return the old table's pages to the disk (blocks writers while it runs)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} not found")
+
+    conn = sqlite3.connect(args.db, isolation_level=None, timeout=30)
+    if get_schema_version(conn) >= COMPACT_VERSION:
+        print(f"{args.db} already uses the compact format.")
+        return
+
+    size_before = os.path.getsize(args.db)
+    start = time.perf_counter()
+    copied = compact_online(
+        conn, args.batch_size, args.pause,
+        progress=lambda done, total: print(f"  copied up to id {done:,} of {total:,}", end="\r")
+    )
+    elapsed = time.perf_counter() - start
+    print(f"\nCopied {copied:,} rows in {elapsed:.1f}s.")
+
+    # Without VACUUM the old table's pages stay in the file as free pages for new rows
+    if args.vacuum:
+        conn.execute("VACUUM")
+    conn.close()
+    size_after = os.path.getsize(args.db)
+    print(f"Database size: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Applied once when a pooled connection is opened
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -20000",       # ~20 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",     # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+)
+
+DEFAULT_POOL_SIZE = 8
+
+# Connection class used by connect(); instrumentation swaps in a timing subclass
+_connection_factory = sqlite3.Connection
+
+
+def set_connection_factory(factory):
+    """Use factory (a sqlite3.Connection subclass) for connections opened from now on"""
+    global _connection_factory
+    _connection_factory = factory
+
+
+def connect(db_file):
+    """Open a tuned connection that may be handed between threads by the pool"""
+    conn = sqlite3.connect(db_file, check_same_thread=False, factory=_connection_factory)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """A thread-safe pool of reusable SQLite connections to one database file.
+
+    Idle connections are kept up to `size`; when all are busy an extra
+    connection is opened and closed again on release, so callers never block.
+    """
+
+    def __init__(self, db_file, size=DEFAULT_POOL_SIZE):
+        self.db_file = db_file
+        self.size = size
+        # LIFO so the most recently used (warmest) connection is reused first
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.opened = 0
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.opened += 1
+            return connect(self.db_file)
+
+    def release(self, conn):
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+
+        if self._closed:
+            conn.close()
+            return
+
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_file, size=DEFAULT_POOL_SIZE):
+    """Return the shared pool for a database file, creating it on first use"""
+    key = os.path.abspath(db_file)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_file, size)
+            _pools[key] = pool
+        return pool
+
+
+def close_pool(pool):
+    """Close a pool and, if it is the shared one for its file, forget it"""
+    pool.close()
+    key = os.path.abspath(pool.db_file)
+    with _pools_lock:
+        if _pools.get(key) is pool:
+            del _pools[key]
+
+
+def pool_stats():
+    """(db_file, connections opened, idle connections) for every shared pool"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [(pool.db_file, pool.opened, pool._idle.qsize()) for pool in pools]
@@ -1,60 +1,46 @@
 import os
-import sqlite3
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
-import calendar
+
+from charts import render_category_pie, render_monthly_bar, render_trend_line
+from expense_repository import get_repository
+from reports import format_text
+from snapshot import DEFAULT_MAX_STALENESS
+from stats import format_budgets, format_stats
+
+def save_chart(filename, image):
+    with open(filename, 'wb') as f:
+        f.write(image)
+
 
 class ExpenseAnalyzer:
-    def __init__(self, db_file="expenses.db"):
+    def __init__(self, db_file="expenses.db", snapshot_staleness=None):
+        """With snapshot_staleness (seconds), the analyses read an in-memory copy of the ledger"""
         self.db_file = db_file
         self.init_db()
-    
-    def get_db_connection(self):
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row
-        return conn
+        if snapshot_staleness is not None:
+            self.repository.enable_snapshot(max_staleness=snapshot_staleness)
     
     def init_db(self):
+        # The analyzer only reads: opening a missing file would create an empty ledger
         if not os.path.exists(self.db_file):
-            print(f"Database file {self.db_file} not found. Please run the expense tracker first.")
-            return
-            
-        # Check if we can connect to the database
-        try:
-            conn = self.get_db_connection()
-            conn.close()
-        except sqlite3.Error:
-            print("Error connecting to database. Starting with empty data.")
+            raise FileNotFoundError(f"Database file {self.db_file} not found. Please run the expense tracker first.")
+
+        # Schema upgrades, pooling and caching are shared with the tracker
+        self.repository = get_repository(self.db_file)
 
     def get_expenses(self):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM expenses")
-        expenses = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return expenses
+        return self.repository.get_expenses()
+    
+    def load_columns(self, start=None, end=None):
+        """Load expenses as NumPy columns sorted by date, shared by the row-level analyses"""
+        return self.repository.load_columns(start, end)
     
     def get_categories(self):
         """Get all unique categories from expenses"""
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT category FROM expenses ORDER BY category")
-        categories = [row['category'] for row in cursor.fetchall()]
-        conn.close()
-        return categories
+        return self.repository.get_used_categories()
     
     def get_category_totals(self):
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT category, SUM(amount) as total
-            FROM expenses
-            GROUP BY category
-            ORDER BY category
-        ''')
-        totals = {row['category']: row['total'] for row in cursor.fetchall()}
-        conn.close()
-        return totals
+        return self.repository.get_stored_category_totals()
     
     def plot_expenses_by_category(self):
         """Create a pie chart of expenses by category"""
@@ -64,98 +50,42 @@ class ExpenseAnalyzer:
             print("No expenses to analyze.")
             return
         
-        # Filter out categories with 0 expenses
-        filtered_categories = []
-        filtered_totals = []
-        
-        for category, total in category_totals.items():
-            if total > 0:
-                filtered_categories.append(category)
-                filtered_totals.append(total)
-        
-        plt.figure(figsize=(10, 7))
-        plt.pie(filtered_totals, labels=filtered_categories, autopct='%1.1f%%', startangle=140)
-        plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
-        plt.title('Expenses by Category')
-        plt.tight_layout()
-        plt.savefig('expenses_by_category.png')
-        plt.close()
+        save_chart('expenses_by_category.png', render_category_pie(category_totals))
         
         print("Chart saved as 'expenses_by_category.png'")
     
     def plot_monthly_expenses(self):
         """Create a bar chart of expenses by month"""
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        # SQLite date functions to extract year and month
-        cursor.execute('''
-        SELECT 
-            strftime('%Y-%m', date) as month,
-            SUM(amount) as total
-        FROM expenses
-        GROUP BY month
-        ORDER BY month
-        ''')
-        
-        monthly_expenses = {row['month']: row['total'] for row in cursor.fetchall()}
-        conn.close()
+        monthly_expenses = self.repository.get_monthly_totals()
         
         if not monthly_expenses:
             print("No expenses to analyze.")
             return
         
-        # Sort months chronologically
-        sorted_months = sorted(monthly_expenses.keys())
-        months = [datetime.strptime(m, "%Y-%m").strftime("%b %Y") for m in sorted_months]
-        values = [monthly_expenses[m] for m in sorted_months]
-        
-        plt.figure(figsize=(12, 6))
-        plt.bar(months, values, color='skyblue')
-        plt.xlabel('Month')
-        plt.ylabel('Total Expenses ($)')
-        plt.title('Monthly Expenses')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig('monthly_expenses.png')
-        plt.close()
+        save_chart('monthly_expenses.png', render_monthly_bar(monthly_expenses))
         
         print("Chart saved as 'monthly_expenses.png'")
     
     def plot_expense_trend(self):
         """Create a line chart showing expense trends over time"""
-        expenses = self.get_expenses()
+        from columnar import cumulative_totals
         
-        if not expenses:
+        columns = self.load_columns()
+        
+        if not len(columns.amounts):
             print("No expenses to analyze.")
             return
         
-        # Sort expenses by date
-        sorted_expenses = sorted(expenses, key=lambda x: datetime.strptime(x["date"], "%Y-%m-%d %H:%M:%S"))
-        
-        dates = [datetime.strptime(expense["date"], "%Y-%m-%d %H:%M:%S") for expense in sorted_expenses]
-        amounts = [expense["amount"] for expense in sorted_expenses]
-        
-        # Calculate cumulative expenses
-        cumulative = []
-        total = 0
-        for amount in amounts:
-            total += amount
-            cumulative.append(total)
-        
-        plt.figure(figsize=(12, 6))
-        plt.plot(dates, cumulative, marker='o', linestyle='-', color='green')
-        plt.xlabel('Date')
-        plt.ylabel('Cumulative Expenses ($)')
-        plt.title('Expense Trend Over Time')
-        plt.gcf().autofmt_xdate()  # Auto-format the x-axis for dates
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.tight_layout()
-        plt.savefig('expense_trend.png')
-        plt.close()
+        # Columns are already parsed and sorted by date
+        trend = (columns.timestamps, cumulative_totals(columns))
+        save_chart('expense_trend.png', render_trend_line(trend))
         
         print("Chart saved as 'expense_trend.png'")
     
+    def generate_reports(self, periods, include_expenses=False):
+        """Generate reports for many periods (YYYY, YYYY-Qn or YYYY-MM) in one pass"""
+        return self.repository.generate_reports(periods, include_expenses)
+    
     def generate_monthly_report(self, year=None, month=None):
         """Generate a monthly expense report"""
         if year is None or month is None:
@@ -163,68 +93,33 @@ class ExpenseAnalyzer:
             year = now.year
             month = now.month
         
-        # Convert to strings for SQLite query
-        year_str = str(year)
-        month_str = f"{month:02d}"
-        date_pattern = f"{year_str}-{month_str}-%"
-        
-        conn = self.get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get monthly expenses
-        cursor.execute('''
-            SELECT * FROM expenses 
-            WHERE date LIKE ?
-            ORDER BY date
-        ''', (date_pattern,))
-        
-        monthly_expenses = [dict(row) for row in cursor.fetchall()]
+        reports = self.generate_reports([f"{year:04d}-{month:02d}"], include_expenses=True)
+        print(format_text(reports))
+    
+    def show_statistics(self, start=None, end=None):
+        """Print amount statistics per category, month-over-month totals and this month's budgets"""
+        stats = self.repository.get_stats(start=start, end=end)
         
-        if not monthly_expenses:
-            print(f"No expenses found for {calendar.month_name[month]} {year}")
-            conn.close()
+        if not stats['all']['count']:
+            print("No expenses to analyze.")
             return
         
-        # Calculate totals by category
-        cursor.execute('''
-            SELECT category, SUM(amount) as total
-            FROM expenses
-            WHERE date LIKE ?
-            GROUP BY category
-            ORDER BY total DESC
-        ''', (date_pattern,))
-        
-        categories = {row['category']: row['total'] for row in cursor.fetchall()}
-        
-        # Get total for the month
-        cursor.execute('''
-            SELECT SUM(amount) as total
-            FROM expenses
-            WHERE date LIKE ?
-        ''', (date_pattern,))
-        
-        result = cursor.fetchone()
-        total = result['total'] or 0
-        
-        conn.close()
-        
-        # Print report
-        print(f"\nExpense Report for {calendar.month_name[month]} {year}")
-        print("=" * 40)
-        print(f"Total Expenses: ${total:.2f}")
-        print("\nBreakdown by Category:")
-        for category, amount in categories.items():
-            percentage = (amount / total) * 100
-            print(f"{category}: ${amount:.2f} ({percentage:.1f}%)")
-        
-        print("\nDetailed Expenses:")
-        for expense in monthly_expenses:
-            date = datetime.strptime(expense["date"], "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d")
-            print(f"{date} - {expense['category']} - ${expense['amount']:.2f} - {expense['description']}")
-
+        print(format_stats(stats))
+        print("\nBudgets this month")
+        print(format_budgets(self.repository.get_budgets()))
+        for alert in self.repository.get_budget_alerts():
+            print(f"ALERT: {alert['category']} has used {alert['used_pct']}% of its ${alert['limit']:.2f} budget")
 
 def main():
-    analyzer = ExpenseAnalyzer()
+    snapshot_staleness = None
+    if os.environ.get('EXPENSE_ANALYTICS_SNAPSHOT') == '1':
+        snapshot_staleness = float(os.environ.get('EXPENSE_SNAPSHOT_MAX_STALENESS_MS',
+                                                  DEFAULT_MAX_STALENESS * 1000)) / 1000
+    try:
+        analyzer = ExpenseAnalyzer(snapshot_staleness=snapshot_staleness)
+    except FileNotFoundError as e:
+        print(e)
+        return
     
     while True:
         print("\nExpense Analyzer")
@@ -232,7 +127,8 @@ def main():
         print("2. Generate Monthly Expenses Chart (Bar Chart)")
         print("3. Generate Expense Trend Over Time (Line Chart)")
         print("4. Generate Monthly Report")
-        print("5. Exit")
+        print("5. Show Spending Statistics and Budget Alerts")
+        print("6. Exit")
         
         choice = input("Select an option: ")
         
@@ -261,6 +157,15 @@ def main():
                 print("Invalid input. Please enter valid numbers.")
         
         elif choice == "5":
+            start_input = input("First month (YYYY-MM, press Enter for all): ").strip()
+            end_input = input("Last month (YYYY-MM, press Enter for all): ").strip()
+            
+            try:
+                analyzer.show_statistics(start_input or None, end_input or None)
+            except ValueError as e:
+                print(e)
+        
+        elif choice == "6":
             print("Exiting Expense Analyzer.")
             break
         
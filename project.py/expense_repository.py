@@ -0,0 +1,416 @@
+"""The data-access layer shared by app.py, app_web.py and expense_analyzer.py.
+
+One ExpenseRepository per database file (see get_repository) owns the
+connection pool, the data version and the schema: migrations and category
+seeding run once per process instead of once per entry point. The SQL lives
+here as constant strings, so each statement is prepared once per pooled
+connection and then reused from sqlite3's statement cache.
+"""
+import math
+import os
+import threading
+from datetime import datetime
+
+from archive import attach_archives, ledger_rows
+from cache import DataVersion
+from db import close_pool, get_pool
+from exporter import FETCH_SIZE
+from importer import DEFAULT_BATCH_SIZE, import_expenses
+from migrations import INSERT_EXPENSE, LATEST_VERSION, get_schema_version, migrate, to_timestamp
+from reports import generate_reports
+from search import build_search
+from snapshot import DEFAULT_MAX_STALENESS, LedgerSnapshot
+from stats import DEFAULT_WARN_RATIO, budget_alerts, budget_status, remove_budget, set_budget, spending_stats
+from trend import DEFAULT_POINTS, build_trend
+from writebehind import DEFAULT_FLUSH_INTERVAL, DEFAULT_WRITE_BATCH_SIZE, WriteBehindQueue
+
+DEFAULT_CATEGORIES = ["Food", "Transportation", "Housing", "Entertainment", "Utilities", "Other"]
+
+DEFAULT_PAGE_SIZE = 50
+
+# Writes go to expense_records itself: the expenses view does not report
+# lastrowid or rowcount for rows written by its INSTEAD OF triggers
+DELETE_EXPENSE = "DELETE FROM expense_records WHERE id = ?"
+# Archived expenses are the ones no longer in the ledger itself
+SELECT_LIVE_IDS = "SELECT id FROM main.expense_records WHERE id IN (SELECT value FROM json_each(?))"
+SELECT_LEDGER_ID = "SELECT 1 FROM ledger_records WHERE id = ?"
+SELECT_CATEGORY_NAMES = "SELECT name FROM categories"
+INSERT_CATEGORY = "INSERT OR IGNORE INTO categories (name) VALUES (?)"
+# Expense lists read ledger_records, the live rows plus the archived ones
+# (see archive.py); the + keeps each file on its primary key, merged in id order
+CATEGORY_FILTER = "+category_id = (SELECT id FROM categories WHERE name = ?)"
+SELECT_EXPENSES = ledger_rows("SELECT * FROM ledger_records")
+SELECT_EXPENSES_BY_CATEGORY = ledger_rows(f"SELECT * FROM ledger_records WHERE {CATEGORY_FILTER}")
+SELECT_EXPENSES_BY_ID = ledger_rows("SELECT * FROM ledger_records ORDER BY id")
+SELECT_EXPENSES_BY_CATEGORY_AND_ID = ledger_rows(
+    f"SELECT * FROM ledger_records WHERE {CATEGORY_FILTER} ORDER BY id")
+# Totals are read from the trigger-maintained rollups (plus the archived
+# months' totals) instead of scanning the expenses
+SELECT_TOTAL = "SELECT SUM(total_cents) / 100.0 AS total FROM ledger_category_rollup"
+SELECT_CATEGORY_TOTAL = "SELECT total FROM category_totals WHERE category = ?"
+SELECT_CATEGORY_TOTALS = "SELECT category, total FROM category_totals ORDER BY category"
+SELECT_USED_CATEGORIES = "SELECT category FROM category_totals WHERE count > 0 ORDER BY category"
+SELECT_MONTHLY_TOTALS = '''
+    SELECT month, SUM(total_cents) / 100.0 AS total
+    FROM ledger_monthly_rollup
+    GROUP BY month
+    ORDER BY month
+'''
+SELECT_MONTH_TOTAL = "SELECT SUM(total_cents) / 100.0 AS total FROM ledger_monthly_rollup WHERE month = ?"
+# Separate MIN and MAX queries are each one index seek; combined they scan the log
+SELECT_FIRST_CHANGE = "SELECT MIN(seq) AS seq FROM change_log"
+SELECT_LAST_CHANGE = "SELECT MAX(seq) AS seq FROM change_log"
+# Rows deleted since they were logged come back with a NULL amount
+SELECT_CHANGES = '''
+    SELECT l.seq, l.op, l.expense_id, l.ts, r.amount_cents / 100.0 AS amount, c.name AS category,
+           r.description, datetime(r.ts, 'unixepoch') AS date
+    FROM change_log l
+    LEFT JOIN expense_records r ON r.id = l.expense_id
+    LEFT JOIN categories c ON c.id = r.category_id
+    WHERE l.seq > ?
+    ORDER BY l.seq
+    LIMIT ?
+'''
+
+
+def make_cursor(expense):
+    """Build the opaque pagination cursor pointing just past an expense"""
+    return f"{expense['date']}|{expense['id']}"
+
+
+def parse_cursor(cursor):
+    """Split a pagination cursor into its (date, id) parts, raising ValueError if malformed"""
+    date, sep, expense_id = cursor.rpartition('|')
+    if not sep:
+        raise ValueError("Invalid cursor")
+    datetime.strptime(date, "%Y-%m-%d %H:%M:%S")
+    return date, int(expense_id)
+
+
+def _split_page(expenses, limit):
+    """Trim the extra row fetched past a page and turn it into the next cursor"""
+    next_cursor = None
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        next_cursor = make_cursor(expenses[-1])
+    return expenses, next_cursor
+
+
+class ExpenseRepository:
+    def __init__(self, db_file="expenses.db", pool=None, read_only=False):
+        self.categories = list(DEFAULT_CATEGORIES)
+        self.db_file = db_file
+        self.pool = pool if pool is not None else get_pool(db_file)
+        self.data_version = DataVersion(self.pool)
+        self.writer = None
+        self.snapshot = None
+        self.init_db(read_only)
+
+    def get_db_connection(self):
+        # Borrow a pooled connection for the duration of a with-block
+        return self.pool.connection()
+
+    def get_analytics_connection(self):
+        # The in-memory snapshot when there is one, the ledger itself otherwise
+        if self.snapshot is not None:
+            return self.snapshot.connection()
+        return self.pool.connection()
+
+    def init_db(self, read_only=False):
+        """Create or upgrade the schema and add the default categories.
+
+        A read_only repository is opened without a write unless its schema
+        is behind, and gets no default categories.
+        """
+        with self.get_db_connection() as conn:
+            if read_only:
+                if get_schema_version(conn) < LATEST_VERSION:
+                    migrate(conn)
+                return
+
+            # Create or upgrade the schema (tables and indexes)
+            migrate(conn)
+
+            # Only insert the default categories that are missing, so an
+            # existing ledger is opened without a write
+            existing = {row['name'] for row in conn.execute(SELECT_CATEGORY_NAMES)}
+            missing = [(category,) for category in self.categories if category not in existing]
+            if missing:
+                conn.executemany(INSERT_CATEGORY, missing)
+                conn.commit()
+
+    def enable_write_behind(self, batch_size=DEFAULT_WRITE_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """Route add_expense through a single batching writer thread"""
+        self.writer = WriteBehindQueue(self.pool, batch_size, flush_interval,
+                                       on_commit=self.data_version.invalidate)
+
+    def enable_snapshot(self, max_staleness=DEFAULT_MAX_STALENESS, refresh_interval=None):
+        """Serve reports, trends, statistics and column loads from an in-memory copy of the ledger.
+
+        Their results may then lag the ledger by up to max_staleness seconds;
+        analytics_version() tells which data version they reflect.
+        """
+        if self.snapshot is not None:
+            self.snapshot.close()
+        self.snapshot = LedgerSnapshot(self.pool, max_staleness, refresh_interval)
+
+    def analytics_version(self):
+        """The data version the analytics reads reflect, to key their cached results by"""
+        if self.snapshot is not None:
+            return self.snapshot.current_version()
+        return self.data_version.current()
+
+    def add_expense(self, amount, category, description=""):
+        """Add an expense dated now; False for an unknown category, ValueError for a bad amount"""
+        amount = float(amount)
+        # float() accepts nan and inf, which the integer cents column cannot hold
+        if not math.isfinite(amount):
+            raise ValueError("Invalid amount")
+        if category not in self.categories:
+            return False
+
+        row = (amount, category, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        if self.writer is not None:
+            # Returns once the batch holding this row has committed
+            self.writer.add(row)
+            return True
+
+        with self.get_db_connection() as conn:
+            conn.execute(INSERT_EXPENSE, row)
+            conn.commit()
+        self.data_version.invalidate()
+        return True
+
+    def remove_expense(self, expense_id):
+        with self.get_db_connection() as conn:
+            cursor = conn.execute(DELETE_EXPENSE, (expense_id,))
+
+            if cursor.rowcount > 0:
+                conn.commit()
+                self.data_version.invalidate()
+                return True
+
+        return False
+
+    def is_archived(self, expense_id):
+        """Whether an expense was moved to an archive, where it can no longer be removed"""
+        with self.get_db_connection() as conn:
+            attach_archives(conn)
+            if conn.execute(SELECT_LEDGER_ID, (expense_id,)).fetchone() is None:
+                return False
+            return conn.execute(SELECT_LIVE_IDS, (f"[{int(expense_id)}]",)).fetchone() is None
+
+    def import_expenses(self, records, batch_size=DEFAULT_BATCH_SIZE):
+        """Bulk insert an iterable of expense records in one transaction"""
+        with self.get_db_connection() as conn:
+            result = import_expenses(conn, records, batch_size)
+        self.data_version.invalidate()
+        return result
+
+    def get_expenses(self, category=None):
+        with self.get_db_connection() as conn:
+            attach_archives(conn)
+            if category and category != "All":
+                cursor = conn.execute(SELECT_EXPENSES_BY_CATEGORY, (category,))
+            else:
+                cursor = conn.execute(SELECT_EXPENSES)
+
+            return [dict(row) for row in cursor.fetchall()]
+
+    def iter_expenses(self, category=None, batch_size=FETCH_SIZE):
+        """Yield expenses in id order as batches of rows, without loading the whole table"""
+        with self.get_db_connection() as conn:
+            attach_archives(conn)
+            if category and category != "All":
+                cursor = conn.execute(SELECT_EXPENSES_BY_CATEGORY_AND_ID, (category,))
+            else:
+                cursor = conn.execute(SELECT_EXPENSES_BY_ID)
+
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    def get_expenses_page(self, category=None, limit=DEFAULT_PAGE_SIZE, after=None):
+        """Get one page of expenses, newest first, using a (date, id) keyset cursor.
+
+        Returns a tuple of (expenses, next_cursor); next_cursor is None on the last page.
+        """
+        conditions = []
+        params = []
+
+        if category and category != "All":
+            conditions.append("category_id = (SELECT id FROM categories WHERE name = ?)")
+            params.append(category)
+
+        if after:
+            after_date, after_id = parse_cursor(after)
+            # The view's text date cannot use an index, so seek on the epoch column
+            conditions.append("(ts, id) < (?, ?)")
+            params.extend([to_timestamp(after_date), after_id])
+
+        # Only four query shapes are possible, so each stays in the statement cache
+        query = "SELECT * FROM ledger_records"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        # Fetch one extra row to know whether another page follows
+        query += " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        query = ledger_rows(query)
+
+        with self.get_db_connection() as conn:
+            attach_archives(conn)
+            expenses = [dict(row) for row in conn.execute(query, params).fetchall()]
+            ids = "[" + ",".join(str(expense['id']) for expense in expenses) + "]"
+            live = {row[0] for row in conn.execute(SELECT_LIVE_IDS, (ids,))}
+
+        # Archived expenses are read-only, so the pages offer no delete for them
+        for expense in expenses:
+            expense['archived'] = expense['id'] not in live
+        return _split_page(expenses, limit)
+
+    def search_expenses(self, query, limit=DEFAULT_PAGE_SIZE, after=None):
+        """Get one page of expenses matching a search.SearchQuery, paged like get_expenses_page"""
+        position = None
+        if after:
+            after_date, after_id = parse_cursor(after)
+            position = (to_timestamp(after_date), after_id)
+
+        with self.get_db_connection() as conn:
+            sql, params = build_search(conn, query, limit, position)
+            expenses = [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+        return _split_page(expenses, limit)
+
+    def load_columns(self, start=None, end=None):
+        """Load expenses as NumPy columns sorted by date, shared by the row-level analyses"""
+        # Imported here so that NumPy is only loaded when a row-level analysis runs
+        from columnar import load_columns
+
+        with self.get_analytics_connection() as conn:
+            return load_columns(conn, start, end)
+
+    def generate_reports(self, periods, include_expenses=False):
+        """Generate reports for many periods (YYYY, YYYY-Qn or YYYY-MM) in one pass"""
+        with self.get_analytics_connection() as conn:
+            return generate_reports(conn, periods, include_expenses)
+
+    def get_trend(self, bucket="day", points=DEFAULT_POINTS):
+        with self.get_analytics_connection() as conn:
+            return build_trend(conn, bucket, points)
+
+    def get_stats(self, category=None, start=None, end=None):
+        """Amount statistics per category and month-over-month totals for [start, end] (YYYY-MM)"""
+        with self.get_analytics_connection() as conn:
+            return spending_stats(conn, start, end, category)
+
+    def get_budgets(self, month=None):
+        """Every budget with the month's spending against it (this month by default)"""
+        with self.get_db_connection() as conn:
+            return budget_status(conn, month)
+
+    def get_budget_alerts(self, month=None):
+        """The budgets at warning or over for the month"""
+        with self.get_db_connection() as conn:
+            return budget_alerts(conn, month)
+
+    def set_budget(self, category, limit, warn_ratio=DEFAULT_WARN_RATIO):
+        with self.get_db_connection() as conn:
+            if not set_budget(conn, category, limit, warn_ratio):
+                return False
+            conn.commit()
+        self.data_version.invalidate()
+        return True
+
+    def remove_budget(self, category):
+        with self.get_db_connection() as conn:
+            if not remove_budget(conn, category):
+                return False
+            conn.commit()
+        self.data_version.invalidate()
+        return True
+
+    def get_total(self, category=None):
+        with self.get_db_connection() as conn:
+            if category and category != "All":
+                cursor = conn.execute(SELECT_CATEGORY_TOTAL, (category,))
+            else:
+                cursor = conn.execute(SELECT_TOTAL)
+
+            result = cursor.fetchone()
+
+        # Return 0 if no expenses found
+        return (result['total'] if result else None) or 0
+
+    def get_used_categories(self):
+        """Categories that have at least one expense, in name order"""
+        with self.get_db_connection() as conn:
+            return [row['category'] for row in conn.execute(SELECT_USED_CATEGORIES)]
+
+    def get_stored_category_totals(self):
+        """{category: total} for every category that has expenses, in name order"""
+        with self.get_db_connection() as conn:
+            cursor = conn.execute(SELECT_CATEGORY_TOTALS)
+            return {row['category']: row['total'] for row in cursor.fetchall()}
+
+    def get_category_totals(self):
+        """{category: total} for every known category, including those with no expenses"""
+        stored = self.get_stored_category_totals()
+        return {category: stored.get(category, 0) for category in self.categories}
+
+    def get_monthly_totals(self):
+        with self.get_db_connection() as conn:
+            cursor = conn.execute(SELECT_MONTHLY_TOTALS)
+            return {row['month']: row['total'] for row in cursor.fetchall()}
+
+    def get_month_totals(self, months):
+        """{month: total} for the given YYYY-MM months, 0 for months with no expenses"""
+        with self.get_db_connection() as conn:
+            return {month: conn.execute(SELECT_MONTH_TOTAL, (month,)).fetchone()['total'] or 0
+                    for month in months}
+
+    def get_change_seq(self):
+        """Sequence number of the latest change in the change log, 0 if there is none"""
+        with self.get_db_connection() as conn:
+            return conn.execute(SELECT_LAST_CHANGE).fetchone()['seq'] or 0
+
+    def get_changes(self, after_seq, limit):
+        """Up to limit logged changes after after_seq, oldest first.
+
+        Returns None if some of those changes were already trimmed from the log.
+        """
+        with self.get_db_connection() as conn:
+            first = conn.execute(SELECT_FIRST_CHANGE).fetchone()['seq']
+            if first is not None and first > after_seq + 1:
+                return None
+            return [dict(row) for row in conn.execute(SELECT_CHANGES, (after_seq, limit)).fetchall()]
+
+    def close(self):
+        """Stop the writer and the snapshot, close the connections and drop this repository from the registry"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+        close_pool(self.pool)
+        with _repositories_lock:
+            key = os.path.abspath(self.db_file)
+            if _repositories.get(key) is self:
+                del _repositories[key]
+
+
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+
+def get_repository(db_file="expenses.db"):
+    """Return the shared repository for a database file, setting the schema up on first use"""
+    key = os.path.abspath(db_file)
+    with _repositories_lock:
+        repository = _repositories.get(key)
+        if repository is None:
+            repository = ExpenseRepository(db_file)
+            _repositories[key] = repository
+        return repository
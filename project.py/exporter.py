@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+import zlib
+
+EXPORT_COLUMNS = ("id", "amount", "category", "description", "date")
+
+# Rows pulled from the cursor per chunk
+FETCH_SIZE = 1000
+
+# Content types for the supported export formats (ndjson is an alias of jsonl)
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/jsonl",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def iter_csv(batches):
+    """Yield the CSV header followed by one encoded chunk per batch of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+
+    for rows in batches:
+        writer.writerows(tuple(row[column] for column in EXPORT_COLUMNS) for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header only, when there are no rows at all
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_jsonl(batches):
+    """Yield one encoded chunk of JSON lines per batch of rows"""
+    for rows in batches:
+        yield "".join(json.dumps(dict(row)) + "\n" for row in rows).encode("utf-8")
+
+
+def iter_export(batches, format):
+    if format == "csv":
+        return iter_csv(batches)
+    if format in ("jsonl", "ndjson"):
+        return iter_jsonl(batches)
+    raise ValueError(f"Unsupported format: {format}")
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of byte chunks into a gzip stream without buffering it all"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,195 @@
+"""Bulk import of expenses from CSV or JSON Lines files.
+
+Each record needs `amount` and `category`; `description` and `date`
+("YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS") are optional. Rows are inserted with
+executemany in batches, all inside a single transaction. A file with any
+invalid record is rejected as a whole, so fixing it and importing it again
+never adds a row twice.
+
+Usage:
+    python importer.py bank_export.csv [--batch-size 5000] [--db expenses.db]
+    python importer.py ledger.jsonl
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime
+
+from migrations import INSERT_EXPENSE
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Only the first rejects are kept with their reasons, so memory stays bounded
+MAX_REPORTED_REJECTS = 100
+
+FORMATS = ("csv", "jsonl")
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = 0
+        self.rejects = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.inserted / self.elapsed if self.elapsed else 0.0
+
+    def reject(self, record_number, reason):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({'record': record_number, 'reason': reason})
+
+    def to_dict(self):
+        return {
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'rejects': self.rejects,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+
+def read_csv(lines):
+    """Yield one record per CSV row; the first row must be a header"""
+    yield from csv.DictReader(lines)
+
+
+def read_jsonl(lines):
+    """Yield one record per non-blank line, or a ValueError for lines that are not JSON"""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f"Invalid JSON: {e.msg}")
+
+
+def get_reader(format):
+    if format == "csv":
+        return read_csv
+    if format == "jsonl":
+        return read_jsonl
+    raise ValueError(f"Unsupported format: {format}")
+
+
+def parse_record(record, categories, default_date):
+    """Validate one record and return its (amount, category, description, date) row"""
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Record is not an object")
+
+    try:
+        amount = float(record.get('amount'))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid amount")
+    if not math.isfinite(amount):
+        raise ValueError("Invalid amount")
+
+    category = record.get('category')
+    if category not in categories:
+        raise ValueError(f"Unknown category: {category}")
+
+    date = record.get('date') or default_date
+    try:
+        if len(date) == 10:
+            date = datetime.strptime(date, "%Y-%m-%d").strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            datetime.strptime(date, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date: {date}")
+
+    return amount, category, record.get('description') or "", date
+
+
+def import_expenses(conn, records, batch_size=DEFAULT_BATCH_SIZE):
+    """Insert validated records in batches within one transaction and return an ImportResult.
+
+    If any record is rejected nothing is inserted; the rest are still
+    validated, so every reason is reported at once.
+    """
+    result = ImportResult()
+    start = time.perf_counter()
+
+    categories = {row[0] for row in conn.execute("SELECT name FROM categories")}
+    default_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    batch = []
+
+    try:
+        for record_number, record in enumerate(records, 1):
+            try:
+                batch.append(parse_record(record, categories, default_date))
+            except ValueError as e:
+                result.reject(record_number, str(e))
+                continue
+            if result.rejected:
+                batch.clear()
+                continue
+
+            if len(batch) >= batch_size:
+                conn.executemany(INSERT_EXPENSE, batch)
+                result.inserted += len(batch)
+                batch.clear()
+
+        if result.rejected:
+            conn.rollback()
+            result.inserted = 0
+        else:
+            if batch:
+                conn.executemany(INSERT_EXPENSE, batch)
+                result.inserted += len(batch)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import expenses from a CSV or JSON Lines file")
+    parser.add_argument("file", help="file to import ('-' for stdin)")
+    parser.add_argument("--format", choices=FORMATS,
+                        help="file format (default: from the file extension)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--db", default="expenses.db", help="database file (default: expenses.db)")
+    args = parser.parse_args()
+
+    format = args.format
+    if format is None:
+        extension = os.path.splitext(args.file)[1].lower()
+        format = "csv" if extension == ".csv" else "jsonl"
+    reader = get_reader(format)
+
+    # Opened as the apps open it, so a new ledger gets the default categories
+    from expense_repository import ExpenseRepository
+
+    repository = ExpenseRepository(args.db)
+    try:
+        if args.file == "-":
+            result = repository.import_expenses(reader(sys.stdin), args.batch_size)
+        else:
+            with open(args.file, newline="", encoding="utf-8") as f:
+                result = repository.import_expenses(reader(f), args.batch_size)
+    finally:
+        repository.close()
+
+    if result.rejected:
+        print(f"Nothing imported: {result.rejected} records rejected", file=sys.stderr)
+        for reject in result.rejects:
+            print(f"  record {reject['record']}: {reject['reason']}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Imported {result.inserted} expenses in {result.elapsed:.2f}s "
+          f"({result.rows_per_sec:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
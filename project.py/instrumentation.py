@@ -0,0 +1,287 @@
+"""SQL and request instrumentation, exposed in Prometheus text format.
+
+install() swaps a timing connection class into db.py, so every statement
+run through the pools is counted and timed per statement, with rows
+returned and connections opened. instrument_app() adds per-route latency
+histograms, a /metrics endpoint and an opt-in per-request profiler.
+"""
+import cProfile
+import functools
+import io
+import logging
+import pstats
+import sqlite3
+import threading
+import time
+
+import db
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Statements are labelled by their normalised SQL, cut to this length
+STATEMENT_LABEL_LENGTH = 160
+
+slow_query_log = logging.getLogger("expenses.slow_sql")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((key, list(series)) for key, series in self._values.items())
+        for label_values, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+SQL_SECONDS = Histogram("expenses_sql_statement_seconds",
+                        "Time to execute each SQL statement (up to its first row)", ("statement",))
+SQL_ROWS = Counter("expenses_sql_rows_total", "Rows fetched per SQL statement", ("statement",))
+CONNECTIONS_OPENED = Counter("expenses_db_connections_opened_total", "SQLite connections opened")
+REQUEST_SECONDS = Histogram("expenses_http_request_seconds",
+                            "Request latency per route", ("route", "method", "status"))
+
+METRICS = [SQL_SECONDS, SQL_ROWS, CONNECTIONS_OPENED, REQUEST_SECONDS]
+
+_settings = {'slow_query_ms': None}
+
+
+@functools.lru_cache(maxsize=1024)
+def statement_label(sql):
+    return " ".join(sql.split())[:STATEMENT_LABEL_LENGTH]
+
+
+def _record_statement(sql, parameters, seconds):
+    label = statement_label(sql)
+    SQL_SECONDS.observe(seconds, label)
+    slow_ms = _settings['slow_query_ms']
+    if slow_ms is not None and seconds * 1000 >= slow_ms:
+        slow_query_log.warning("%.1f ms: %s %r", seconds * 1000, label, parameters)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """A cursor that times execute() and counts the rows fetched through it"""
+
+    _statement = None
+    _rows = 0
+
+    def execute(self, sql, parameters=()):
+        self._flush_rows()
+        self._statement = statement_label(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_statement(sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._flush_rows()
+        self._statement = None
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_statement(sql, (), time.perf_counter() - start)
+
+    def _flush_rows(self):
+        # Rows read one at a time are added up here rather than per row
+        if self._rows:
+            SQL_ROWS.inc(self._rows, self._statement)
+            self._rows = 0
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is None:
+            self._flush_rows()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if rows and self._statement is not None:
+            SQL_ROWS.inc(len(rows), self._statement)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        if rows and self._statement is not None:
+            SQL_ROWS.inc(len(rows), self._statement)
+        return rows
+
+    def close(self):
+        self._flush_rows()
+        super().close()
+
+    def __next__(self):
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._flush_rows()
+            raise
+        self._rows += 1
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """A connection whose execute() shortcuts go through InstrumentedCursor"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        CONNECTIONS_OPENED.inc()
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def install(slow_query_ms=None):
+    """Instrument connections opened from now on; log statements slower than slow_query_ms"""
+    _settings['slow_query_ms'] = slow_query_ms
+    db.set_connection_factory(InstrumentedConnection)
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+
+    lines.append("# HELP expenses_db_pool_connections Connections opened and idle per pool")
+    lines.append("# TYPE expenses_db_pool_connections gauge")
+    for db_file, opened, idle in db.pool_stats():
+        lines.append(f'expenses_db_pool_connections{{db="{_escape(db_file)}",state="opened"}} {opened}')
+        lines.append(f'expenses_db_pool_connections{{db="{_escape(db_file)}",state="idle"}} {idle}')
+    return "\n".join(lines) + "\n"
+
+
+def record_request(route, method, status, seconds):
+    REQUEST_SECONDS.observe(seconds, route, method, str(status))
+
+
+def instrument_app(app, profiling=False):
+    """Time every request per route and serve /metrics.
+
+    With profiling on, a request with ?profile=1 returns its cProfile stats
+    instead of the page (?profile=pyinstrument for an HTML flame view, if
+    pyinstrument is installed).
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def start_request():
+        g.request_started = time.perf_counter()
+        mode = request.args.get('profile') if profiling else None
+        if mode == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                mode = '1'
+            else:
+                g.profiler = Profiler()
+                g.profiler.start()
+        if mode and mode != 'pyinstrument':
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def finish_request(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+                buffer = io.StringIO()
+                pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(40)
+                response = Response(buffer.getvalue(), mimetype='text/plain')
+            else:
+                profiler.stop()
+                response = Response(profiler.output_html(), mimetype='text/html')
+        g.response_status = response.status_code
+        return response
+
+    # Recorded at teardown, which runs even when an unhandled exception
+    # skipped after_request, so failed requests are counted as 500s
+    @app.teardown_request
+    def record_finished_request(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+            else:
+                profiler.stop()
+
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else '<unmatched>'
+            status = g.pop('response_status', 500) if exc is None else 500
+            record_request(route, request.method, status, time.perf_counter() - started)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
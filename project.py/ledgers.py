@@ -0,0 +1,185 @@
+"""One SQLite ledger per household or team, with aggregation across them.
+
+Ledgers live as <name>.db files in one directory. Open handles are kept in
+an LRU cache so the number of open files stays bounded, and totals are
+fanned out over a thread pool and merged.
+
+Usage:
+    python ledgers.py totals [--dir ledgers] [ledger ...]
+    python ledgers.py monthly [--dir ledgers] [ledger ...]
+"""
+import argparse
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from db import ConnectionPool
+from expense_repository import ExpenseRepository
+
+DEFAULT_LEDGER_DIR = "ledgers"
+DEFAULT_MAX_OPEN = 32
+
+_LEDGER_NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class LedgerRouter:
+    """Maps ledger names to their database files under one directory"""
+
+    def __init__(self, base_dir=DEFAULT_LEDGER_DIR):
+        self.base_dir = base_dir
+
+    def path_for(self, name):
+        # Names become file names, so only allow a safe character set
+        if not _LEDGER_NAME_RE.match(name or ""):
+            raise ValueError(f"Invalid ledger name: {name}")
+        return os.path.join(self.base_dir, f"{name}.db")
+
+    def list_ledgers(self):
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted(
+            filename[:-3] for filename in os.listdir(self.base_dir)
+            if filename.endswith(".db") and _LEDGER_NAME_RE.match(filename[:-3])
+        )
+
+
+class Ledger:
+    """An open ledger: a repository with its own small connection pool, so it can be closed.
+
+    A read_only ledger, opened for aggregation, is not written to on opening
+    (see ExpenseRepository.init_db).
+    """
+
+    def __init__(self, name, db_file, pool_size=2, read_only=False):
+        self.name = name
+        self.db_file = db_file
+        self.repository = ExpenseRepository(db_file, pool=ConnectionPool(db_file, pool_size),
+                                            read_only=read_only)
+
+    def category_totals(self):
+        return self.repository.get_stored_category_totals()
+
+    def monthly_totals(self):
+        return self.repository.get_monthly_totals()
+
+    def close(self):
+        self.repository.close()
+
+
+class LedgerHandleCache:
+    """LRU cache of open Ledger handles; the least recently used is closed beyond max_open"""
+
+    def __init__(self, router, max_open=DEFAULT_MAX_OPEN, read_only=False):
+        self.router = router
+        self.max_open = max_open
+        self.read_only = read_only
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        db_file = self.router.path_for(name)
+        with self._lock:
+            ledger = self._handles.get(name)
+            if ledger is not None:
+                self._handles.move_to_end(name)
+                return ledger
+
+        if not os.path.exists(db_file):
+            raise KeyError(f"Unknown ledger: {name}")
+        # Opened outside the lock, so a slow open (a migration, say) never
+        # holds up the other ledgers; a thread that loses the race to open
+        # the same ledger closes its handle and uses the cached one
+        opened = Ledger(name, db_file, read_only=self.read_only)
+        closing = []
+        with self._lock:
+            ledger = self._handles.get(name)
+            if ledger is not None:
+                self._handles.move_to_end(name)
+                closing.append(opened)
+            else:
+                ledger = self._handles[name] = opened
+                while len(self._handles) > self.max_open:
+                    # Connections still in use are closed when they are released
+                    closing.append(self._handles.popitem(last=False)[1])
+        for handle in closing:
+            handle.close()
+        return ledger
+
+    def close(self):
+        with self._lock:
+            for ledger in self._handles.values():
+                ledger.close()
+            self._handles.clear()
+
+
+class LedgerAggregator:
+    """Fans totals queries out over many ledgers in parallel and merges the results"""
+
+    def __init__(self, handles, max_workers=8):
+        self.handles = handles
+        self.max_workers = max_workers
+
+    def _fan_out(self, names, query):
+        if names is None:
+            names = self.handles.router.list_ledgers()
+
+        def run(name):
+            return name, query(self.handles.get(name))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(executor.map(run, names))
+
+    def category_totals(self, names=None):
+        """Per-ledger and combined {category: total}"""
+        per_ledger = self._fan_out(names, Ledger.category_totals)
+        combined = {}
+        for totals in per_ledger.values():
+            for category, total in totals.items():
+                combined[category] = combined.get(category, 0) + total
+        return {
+            'ledgers': per_ledger,
+            'combined': combined,
+            'total': sum(combined.values()),
+        }
+
+    def monthly_totals(self, names=None):
+        """Per-ledger and combined {month: total}, months in order"""
+        per_ledger = self._fan_out(names, Ledger.monthly_totals)
+        combined = {}
+        for totals in per_ledger.values():
+            for month, total in totals.items():
+                combined[month] = combined.get(month, 0) + total
+        return {
+            'ledgers': per_ledger,
+            'combined': dict(sorted(combined.items())),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate totals across ledgers")
+    parser.add_argument("command", choices=["totals", "monthly"])
+    parser.add_argument("ledgers", nargs="*", help="ledger names (default: every ledger)")
+    parser.add_argument("--dir", default=DEFAULT_LEDGER_DIR, help="ledger directory (default: ledgers)")
+    args = parser.parse_intermixed_args()
+
+    handles = LedgerHandleCache(LedgerRouter(args.dir), read_only=True)
+    aggregator = LedgerAggregator(handles)
+    names = args.ledgers or None
+    try:
+        if args.command == "totals":
+            result = aggregator.category_totals(names)
+        else:
+            result = aggregator.monthly_totals(names)
+    except (KeyError, ValueError) as e:
+        parser.error(e.args[0])
+    finally:
+        handles.close()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Concurrent HTTP load test for the web app, sync (Flask) vs async (ASGI).
+
+Starts the chosen server(s) on a free port against the database in the
+working directory, fires requests from many client threads over keep-alive
+connections, and reports throughput and latency percentiles.
+
+Usage:
+    python loadtest.py --server sync asgi --concurrency 64 --requests 5000
+    python loadtest.py --url http://127.0.0.1:8000 /api/expenses?limit=50
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_PATHS = (
+    "/api/expenses?limit=50",
+    "/api/category_totals",
+    "/api/monthly_totals",
+    "/api/trend?bucket=day&points=500",
+)
+
+# How each server mode is started; {port} is filled in
+SERVERS = {
+    "sync": [sys.executable, "-m", "flask", "--app", "app_web", "run", "--port", "{port}"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi:app", "--port", "{port}", "--log-level", "warning"],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not start listening on port {port}")
+
+
+def start_server(mode, port):
+    """Start a server in the current directory, importing the app from this project"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [PROJECT_DIR, os.environ.get("PYTHONPATH")])))
+    command = [part.format(port=port) for part in SERVERS[mode]]
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+    except RuntimeError:
+        process.kill()
+        raise
+    return process
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(base_url, paths, concurrency, total_requests, warmup=50):
+    """Issue total_requests GETs (cycling through paths) from concurrency threads"""
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+
+    # Warm caches and connections so the first requests do not skew the tail
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    for i in range(warmup):
+        conn.request("GET", paths[i % len(paths)])
+        conn.getresponse().read()
+    conn.close()
+
+    latencies = []
+    errors = [0]
+    counter = iter(range(total_requests))
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        local = []
+        local_errors = 0
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            start = time.perf_counter()
+            try:
+                conn.request("GET", paths[i % len(paths)])
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'concurrency': concurrency,
+        'elapsed': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the web app's API routes")
+    parser.add_argument("paths", nargs="*", help="request paths (default: the main /api routes)")
+    parser.add_argument("--server", nargs="+", choices=SERVERS, default=["sync", "asgi"],
+                        help="server modes to start and compare (default: sync asgi)")
+    parser.add_argument("--url", help="test an already running server instead")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    paths = args.paths or list(DEFAULT_PATHS)
+    results = {}
+    if args.url:
+        results[args.url] = run_load(args.url, paths, args.concurrency, args.requests)
+    else:
+        for mode in args.server:
+            port = free_port()
+            process = start_server(mode, port)
+            try:
+                results[mode] = run_load(f"http://127.0.0.1:{port}", paths, args.concurrency, args.requests)
+            finally:
+                process.terminate()
+                process.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'server':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['requests']:>9} {r['errors']:>7} {r['rps']:>9.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p90_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
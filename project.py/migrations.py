@@ -0,0 +1,757 @@
+import calendar
+import sqlite3
+import time
+
+# Schema migrations, applied in order. The version reached is stored in
+# PRAGMA user_version so each database is upgraded exactly once.
+MIGRATIONS = [
+    (1, "Create expenses and categories tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount REAL NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT,
+            date TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        )
+        ''',
+    ]),
+    (2, "Add covering indexes for category and date queries", [
+        # Category filters, per-category totals and category pages (the rowid
+        # is implicitly appended, so ORDER BY date, id is served as well)
+        "CREATE INDEX IF NOT EXISTS idx_expenses_category_date_amount ON expenses (category, date, amount)",
+        # Month ranges and the (date, id) keyset pagination
+        "CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date)",
+    ]),
+    (3, "Add trigger-maintained category and monthly rollup tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS category_totals (
+            category TEXT PRIMARY KEY,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS monthly_category_totals (
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (month, category)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_insert AFTER INSERT ON expenses
+        BEGIN
+            INSERT INTO category_totals (category, total, count)
+            VALUES (NEW.category, NEW.amount, 1)
+            ON CONFLICT (category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+            INSERT INTO monthly_category_totals (month, category, total, count)
+            VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.amount, 1)
+            ON CONFLICT (month, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_delete AFTER DELETE ON expenses
+        BEGIN
+            UPDATE category_totals SET total = total - OLD.amount, count = count - 1
+            WHERE category = OLD.category;
+            DELETE FROM category_totals WHERE category = OLD.category AND count <= 0;
+            UPDATE monthly_category_totals SET total = total - OLD.amount, count = count - 1
+            WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category;
+            DELETE FROM monthly_category_totals
+            WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND count <= 0;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS expenses_rollup_update AFTER UPDATE OF amount, category, date ON expenses
+        BEGIN
+            UPDATE category_totals SET total = total - OLD.amount, count = count - 1
+            WHERE category = OLD.category;
+            DELETE FROM category_totals WHERE category = OLD.category AND count <= 0;
+            UPDATE monthly_category_totals SET total = total - OLD.amount, count = count - 1
+            WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category;
+            DELETE FROM monthly_category_totals
+            WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND count <= 0;
+            INSERT INTO category_totals (category, total, count)
+            VALUES (NEW.category, NEW.amount, 1)
+            ON CONFLICT (category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+            INSERT INTO monthly_category_totals (month, category, total, count)
+            VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.amount, 1)
+            ON CONFLICT (month, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+        END
+        ''',
+        # Backfill from the rows already in the ledger
+        "DELETE FROM category_totals",
+        "DELETE FROM monthly_category_totals",
+        '''
+        INSERT INTO category_totals (category, total, count)
+        SELECT category, SUM(amount), COUNT(*) FROM expenses GROUP BY category
+        ''',
+        '''
+        INSERT INTO monthly_category_totals (month, category, total, count)
+        SELECT substr(date, 1, 7), category, SUM(amount), COUNT(*) FROM expenses
+        GROUP BY substr(date, 1, 7), category
+        ''',
+    ]),
+    (4, "Add a data version counter bumped on every write to expenses", [
+        '''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''',
+        "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS expenses_version_insert AFTER INSERT ON expenses
+        BEGIN
+            UPDATE data_version SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS expenses_version_update AFTER UPDATE ON expenses
+        BEGIN
+            UPDATE data_version SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS expenses_version_delete AFTER DELETE ON expenses
+        BEGIN
+            UPDATE data_version SET version = version + 1 WHERE id = 1;
+        END
+        ''',
+    ]),
+]
+
+# Migration 5 replaces the expenses table with expense_records, which keeps
+# amounts as integer cents, categories as ids into categories and dates as
+# epoch seconds (read as UTC, so datetime(ts, 'unixepoch') gives the same
+# text back). expenses, category_totals and monthly_category_totals become
+# views with the old columns, so existing queries and writers keep working.
+# It is split into steps so compact.py can run it online, copying in batches
+# while the app keeps writing; migrate() runs the steps in one transaction.
+
+# The compatibility view's columns, also used by queries that filter on ts
+EXPENSE_ROWS = '''
+    SELECT r.id AS id, r.amount_cents / 100.0 AS amount, c.name AS category,
+           r.description AS description, datetime(r.ts, 'unixepoch') AS date
+    FROM expense_records r JOIN categories c ON c.id = r.category_id
+'''
+
+# One expense given as (amount, category name, description, "YYYY-MM-DD HH:MM:SS")
+INSERT_EXPENSE = '''
+    INSERT INTO expense_records (amount_cents, category_id, description, ts)
+    SELECT CAST(round(?1 * 100) AS INTEGER), id, ?3, CAST(strftime('%s', ?4) AS INTEGER)
+    FROM categories WHERE name = ?2
+'''
+
+_ROLLUP_ADD = '''
+        INSERT INTO category_rollup (category_id, total_cents, count)
+        VALUES (NEW.category_id, NEW.amount_cents, 1)
+        ON CONFLICT (category_id) DO UPDATE SET
+            total_cents = total_cents + excluded.total_cents, count = count + 1;
+        INSERT INTO monthly_rollup (month, category_id, total_cents, count)
+        VALUES (strftime('%Y-%m', NEW.ts, 'unixepoch'), NEW.category_id, NEW.amount_cents, 1)
+        ON CONFLICT (month, category_id) DO UPDATE SET
+            total_cents = total_cents + excluded.total_cents, count = count + 1;
+'''
+
+_ROLLUP_REMOVE = '''
+        UPDATE category_rollup SET total_cents = total_cents - OLD.amount_cents, count = count - 1
+        WHERE category_id = OLD.category_id;
+        DELETE FROM category_rollup WHERE category_id = OLD.category_id AND count <= 0;
+        UPDATE monthly_rollup SET total_cents = total_cents - OLD.amount_cents, count = count - 1
+        WHERE month = strftime('%Y-%m', OLD.ts, 'unixepoch') AND category_id = OLD.category_id;
+        DELETE FROM monthly_rollup
+        WHERE month = strftime('%Y-%m', OLD.ts, 'unixepoch') AND category_id = OLD.category_id
+          AND count <= 0;
+'''
+
+# The new table and its (integer, so drift-free) rollup tables
+COMPACT_PREPARE = [
+    "INSERT OR IGNORE INTO categories (name) SELECT DISTINCT category FROM expenses",
+    '''
+    CREATE TABLE IF NOT EXISTS expense_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        amount_cents INTEGER NOT NULL,
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        description TEXT,
+        ts INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS category_rollup (
+        category_id INTEGER PRIMARY KEY,
+        total_cents INTEGER NOT NULL,
+        count INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS monthly_rollup (
+        month TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        total_cents INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (month, category_id)
+    ) WITHOUT ROWID
+    ''',
+]
+
+COMPACT_INDEXES = [
+    # Covering index for category filters, per-category sums and category
+    # pages (the rowid is implicitly appended, so ORDER BY ts, id is served too)
+    "CREATE INDEX IF NOT EXISTS idx_expense_records_category_ts_amount "
+    "ON expense_records (category_id, ts, amount_cents)",
+    # Date ranges and the (ts, id) keyset pagination
+    "CREATE INDEX IF NOT EXISTS idx_expense_records_ts ON expense_records (ts)",
+]
+
+COMPACT_ROLLUP_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS expense_records_rollup_insert AFTER INSERT ON expense_records
+    BEGIN{_ROLLUP_ADD}    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS expense_records_rollup_delete AFTER DELETE ON expense_records
+    BEGIN{_ROLLUP_REMOVE}    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS expense_records_rollup_update
+    AFTER UPDATE OF amount_cents, category_id, ts ON expense_records
+    BEGIN{_ROLLUP_REMOVE}{_ROLLUP_ADD}    END
+    ''',
+]
+
+# Recompute the rollups in bulk, for rows copied while their triggers were off
+COMPACT_ROLLUP_BACKFILL = [
+    "DELETE FROM category_rollup",
+    "DELETE FROM monthly_rollup",
+    '''
+    INSERT INTO category_rollup (category_id, total_cents, count)
+    SELECT category_id, SUM(amount_cents), COUNT(*) FROM expense_records GROUP BY category_id
+    ''',
+    '''
+    INSERT INTO monthly_rollup (month, category_id, total_cents, count)
+    SELECT strftime('%Y-%m', ts, 'unixepoch'), category_id, SUM(amount_cents), COUNT(*)
+    FROM expense_records GROUP BY 1, category_id
+    ''',
+]
+
+# Mirror writes to the old table into the new one while compact.py copies it
+COMPACT_SYNC_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS expenses_compact_insert AFTER INSERT ON expenses
+    BEGIN
+        INSERT OR IGNORE INTO categories (name) VALUES (NEW.category);
+        INSERT OR IGNORE INTO expense_records (id, amount_cents, category_id, description, ts)
+        SELECT NEW.id, CAST(round(NEW.amount * 100) AS INTEGER), id, NEW.description,
+               CAST(strftime('%s', NEW.date) AS INTEGER)
+        FROM categories WHERE name = NEW.category;
+    END
+    ''',
+    # Rows not copied yet are left alone; the copy picks up their new values
+    '''
+    CREATE TRIGGER IF NOT EXISTS expenses_compact_update AFTER UPDATE ON expenses
+    BEGIN
+        INSERT OR IGNORE INTO categories (name) VALUES (NEW.category);
+        UPDATE expense_records SET
+            id = NEW.id,
+            amount_cents = CAST(round(NEW.amount * 100) AS INTEGER),
+            category_id = (SELECT id FROM categories WHERE name = NEW.category),
+            description = NEW.description,
+            ts = CAST(strftime('%s', NEW.date) AS INTEGER)
+        WHERE id = OLD.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS expenses_compact_delete AFTER DELETE ON expenses
+    BEGIN
+        DELETE FROM expense_records WHERE id = OLD.id;
+    END
+    ''',
+]
+
+# Copy the old rows with ids in [?1, ?2), skipping any already mirrored
+COMPACT_COPY = '''
+    INSERT OR IGNORE INTO expense_records (id, amount_cents, category_id, description, ts)
+    SELECT e.id, CAST(round(e.amount * 100) AS INTEGER), c.id, e.description,
+           CAST(strftime('%s', e.date) AS INTEGER)
+    FROM expenses e JOIN categories c ON c.name = e.category
+    WHERE e.id >= ?1 AND e.id < ?2
+'''
+
+# Replace the old tables with compatibility views
+COMPACT_SWAP = [
+    # Keep handing out ids above any the old table ever used
+    '''
+    UPDATE sqlite_sequence
+    SET seq = MAX(seq, COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'expenses'), 0))
+    WHERE name = 'expense_records'
+    ''',
+    '''
+    INSERT INTO sqlite_sequence (name, seq)
+    SELECT 'expense_records', seq FROM sqlite_sequence
+    WHERE name = 'expenses' AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'expense_records')
+    ''',
+    # Dropping a table drops its indexes and triggers too
+    "DROP TABLE expenses",
+    "DROP TABLE category_totals",
+    "DROP TABLE monthly_category_totals",
+    "CREATE VIEW expenses AS" + EXPENSE_ROWS,
+    '''
+    CREATE TRIGGER expenses_view_insert INSTEAD OF INSERT ON expenses
+    BEGIN
+        INSERT OR IGNORE INTO categories (name) VALUES (NEW.category);
+        INSERT INTO expense_records (id, amount_cents, category_id, description, ts)
+        SELECT NEW.id, CAST(round(NEW.amount * 100) AS INTEGER), id, NEW.description,
+               CAST(strftime('%s', NEW.date) AS INTEGER)
+        FROM categories WHERE name = NEW.category;
+    END
+    ''',
+    '''
+    CREATE TRIGGER expenses_view_update INSTEAD OF UPDATE ON expenses
+    BEGIN
+        INSERT OR IGNORE INTO categories (name) VALUES (NEW.category);
+        UPDATE expense_records SET
+            id = NEW.id,
+            amount_cents = CAST(round(NEW.amount * 100) AS INTEGER),
+            category_id = (SELECT id FROM categories WHERE name = NEW.category),
+            description = NEW.description,
+            ts = CAST(strftime('%s', NEW.date) AS INTEGER)
+        WHERE id = OLD.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER expenses_view_delete INSTEAD OF DELETE ON expenses
+    BEGIN
+        DELETE FROM expense_records WHERE id = OLD.id;
+    END
+    ''',
+    '''
+    CREATE VIEW category_totals AS
+    SELECT c.name AS category, r.total_cents / 100.0 AS total, r.count AS count
+    FROM category_rollup r JOIN categories c ON c.id = r.category_id
+    ''',
+    '''
+    CREATE VIEW monthly_category_totals AS
+    SELECT r.month AS month, c.name AS category, r.total_cents / 100.0 AS total, r.count AS count
+    FROM monthly_rollup r JOIN categories c ON c.id = r.category_id
+    ''',
+    '''
+    CREATE TRIGGER expense_records_version_insert AFTER INSERT ON expense_records
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER expense_records_version_update AFTER UPDATE ON expense_records
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER expense_records_version_delete AFTER DELETE ON expense_records
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END
+    ''',
+]
+
+# In one go, the rows are copied before the indexes and rollups are built,
+# which is several times faster than maintaining them row by row
+MIGRATIONS.append((5, "Store expenses as integer cents, category ids and epoch seconds", [
+    *COMPACT_PREPARE,
+    (COMPACT_COPY, (0, 2 ** 63 - 1)),
+    *COMPACT_INDEXES,
+    *COMPACT_ROLLUP_BACKFILL,
+    *COMPACT_ROLLUP_TRIGGERS,
+    *COMPACT_SWAP,
+]))
+
+MIGRATIONS.append((6, "Add a full-text index over descriptions and an amount index for search", [
+    # External content: the index stores only tokens, the text stays in
+    # expense_records. Prefix indexes make "cof*" style queries index seeks.
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS expense_search USING fts5(
+        description,
+        content = 'expense_records',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS expense_records_search_insert AFTER INSERT ON expense_records
+    BEGIN
+        INSERT INTO expense_search (rowid, description) VALUES (NEW.id, NEW.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS expense_records_search_delete AFTER DELETE ON expense_records
+    BEGIN
+        INSERT INTO expense_search (expense_search, rowid, description)
+        VALUES ('delete', OLD.id, OLD.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS expense_records_search_update
+    AFTER UPDATE OF id, description ON expense_records
+    BEGIN
+        INSERT INTO expense_search (expense_search, rowid, description)
+        VALUES ('delete', OLD.id, OLD.description);
+        INSERT INTO expense_search (rowid, description) VALUES (NEW.id, NEW.description);
+    END
+    ''',
+    # Index the rows already in the ledger
+    "INSERT INTO expense_search (expense_search) VALUES ('rebuild')",
+    # Narrow amount ranges, which search looks up before sorting by date
+    "CREATE INDEX IF NOT EXISTS idx_expense_records_amount ON expense_records (amount_cents)",
+]))
+
+# How many changes the change log keeps for clients catching up on the feed
+CHANGE_LOG_SIZE = 10_000
+
+MIGRATIONS.append((7, "Add a change log of inserted and deleted expenses for the live changefeed", [
+    # Only the id and date are logged: inserted rows are read back from
+    # expense_records, and the date says which month a change touched
+    '''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        op TEXT NOT NULL,
+        expense_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS expense_records_change_insert AFTER INSERT ON expense_records
+    BEGIN
+        INSERT INTO change_log (op, expense_id, ts) VALUES ('insert', NEW.id, NEW.ts);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS expense_records_change_delete AFTER DELETE ON expense_records
+    BEGIN
+        INSERT INTO change_log (op, expense_id, ts) VALUES ('delete', OLD.id, OLD.ts);
+    END
+    ''',
+    # An update is sent as the old row's removal and the new row's insertion
+    '''
+    CREATE TRIGGER IF NOT EXISTS expense_records_change_update AFTER UPDATE ON expense_records
+    BEGIN
+        INSERT INTO change_log (op, expense_id, ts) VALUES ('delete', OLD.id, OLD.ts);
+        INSERT INTO change_log (op, expense_id, ts) VALUES ('insert', NEW.id, NEW.ts);
+    END
+    ''',
+    # Trim the log every thousand changes, so it never holds much more than
+    # CHANGE_LOG_SIZE rows
+    f'''
+    CREATE TRIGGER IF NOT EXISTS change_log_trim AFTER INSERT ON change_log
+    WHEN NEW.seq % 1000 = 0
+    BEGIN
+        DELETE FROM change_log WHERE seq <= NEW.seq - {CHANGE_LOG_SIZE};
+    END
+    ''',
+]))
+
+MIGRATIONS.append((8, "Add yearly archive files for closed months, with their totals kept in the ledger", [
+    # One archive file per year (see archive.py); rows dated before end_ts
+    # have been moved into it
+    '''
+    CREATE TABLE IF NOT EXISTS archives (
+        year INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,
+        end_ts INTEGER NOT NULL
+    )
+    ''',
+    # Precomputed totals of the archived months, so totals never open an archive
+    '''
+    CREATE TABLE IF NOT EXISTS archive_rollup (
+        month TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        total_cents INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (month, category_id)
+    ) WITHOUT ROWID
+    ''',
+    # Rollups of the whole ledger: live rows plus archived months
+    '''
+    CREATE VIEW ledger_monthly_rollup AS
+    SELECT month, category_id, SUM(total_cents) AS total_cents, SUM(count) AS count
+    FROM (
+        SELECT month, category_id, total_cents, count FROM monthly_rollup
+        UNION ALL
+        SELECT month, category_id, total_cents, count FROM archive_rollup
+    )
+    GROUP BY month, category_id
+    ''',
+    '''
+    CREATE VIEW ledger_category_rollup AS
+    SELECT category_id, SUM(total_cents) AS total_cents, SUM(count) AS count
+    FROM (
+        SELECT category_id, total_cents, count FROM category_rollup
+        UNION ALL
+        SELECT category_id, total_cents, count FROM archive_rollup
+    )
+    GROUP BY category_id
+    ''',
+    "DROP VIEW IF EXISTS category_totals",
+    '''
+    CREATE VIEW category_totals AS
+    SELECT c.name AS category, r.total_cents / 100.0 AS total, r.count AS count
+    FROM ledger_category_rollup r JOIN categories c ON c.id = r.category_id
+    ''',
+    "DROP VIEW IF EXISTS monthly_category_totals",
+    '''
+    CREATE VIEW monthly_category_totals AS
+    SELECT r.month AS month, c.name AS category, r.total_cents / 100.0 AS total, r.count AS count
+    FROM ledger_monthly_rollup r JOIN categories c ON c.id = r.category_id
+    ''',
+]))
+
+# Amount statistics per month and category, maintained like the rollups.
+# amount_stats keeps Welford's running mean and sum of squared deviations (m2),
+# which an insert and a delete each update in O(1). amount_sketch counts
+# amounts per bucket of two significant digits (exact below $1): a histogram
+# that merges across months and categories by adding counts, and gives any
+# quantile truncated to two significant digits (less than 10% low).
+_MONTH = "strftime('%Y-%m', {}.ts, 'unixepoch')"
+
+
+def sketch_bucket(cents):
+    """SQL for the sketch bucket of an amount: its cents with all but two significant digits zeroed"""
+    return (f"CASE WHEN abs({cents}) < 100 THEN {cents} ELSE sign({cents}) * CAST("
+            f"substr(abs({cents}), 1, 2) || substr('000000000000000000', 1, length(abs({cents})) - 2)"
+            f" AS INTEGER) END")
+
+
+_STATS_ADD = f'''
+        INSERT INTO amount_stats (month, category_id, count, mean, m2)
+        VALUES ({_MONTH.format("NEW")}, NEW.category_id, 1, NEW.amount_cents, 0)
+        ON CONFLICT (month, category_id) DO UPDATE SET
+            count = count + 1,
+            mean = mean + (NEW.amount_cents - mean) / (count + 1),
+            m2 = m2 + (NEW.amount_cents - mean)
+                      * (NEW.amount_cents - mean - (NEW.amount_cents - mean) / (count + 1));
+        INSERT INTO amount_sketch (month, category_id, bucket, count)
+        VALUES ({_MONTH.format("NEW")}, NEW.category_id, {sketch_bucket("NEW.amount_cents")}, 1)
+        ON CONFLICT (month, category_id, bucket) DO UPDATE SET count = count + 1;
+'''
+
+# Welford's update run backwards; m2 is clamped at 0 against rounding
+_STATS_REMOVE = f'''
+        UPDATE amount_stats SET
+            count = count - 1,
+            mean = CASE WHEN count > 1 THEN (count * mean - OLD.amount_cents) / (count - 1) ELSE 0 END,
+            m2 = CASE WHEN count > 1 THEN max(m2 - (OLD.amount_cents - mean)
+                      * (OLD.amount_cents - (count * mean - OLD.amount_cents) / (count - 1)), 0) ELSE 0 END
+        WHERE month = {_MONTH.format("OLD")} AND category_id = OLD.category_id;
+        DELETE FROM amount_stats
+        WHERE month = {_MONTH.format("OLD")} AND category_id = OLD.category_id AND count <= 0;
+        UPDATE amount_sketch SET count = count - 1
+        WHERE month = {_MONTH.format("OLD")} AND category_id = OLD.category_id
+          AND bucket = {sketch_bucket("OLD.amount_cents")};
+        DELETE FROM amount_sketch
+        WHERE month = {_MONTH.format("OLD")} AND category_id = OLD.category_id
+          AND bucket = {sketch_bucket("OLD.amount_cents")} AND count <= 0;
+'''
+
+# (month, category_id, count, mean, m2) and (month, category_id, bucket,
+# count) computed from scratch over a table of expense records. m2 is summed
+# in a second pass over each group, which stays accurate where a sum of
+# squares would not.
+STATS_SUMMARY = '''
+    SELECT g.month, g.category_id, g.count, g.mean,
+           SUM((r.amount_cents - g.mean) * (r.amount_cents - g.mean))
+    FROM (
+        SELECT strftime('%Y-%m', ts, 'unixepoch') AS month, category_id,
+               COUNT(*) AS count, AVG(amount_cents) AS mean
+        FROM {table} GROUP BY 1, 2
+    ) g
+    JOIN {table} r ON r.category_id = g.category_id
+        AND r.ts >= CAST(strftime('%s', g.month || '-01') AS INTEGER)
+        AND r.ts < CAST(strftime('%s', g.month || '-01', '+1 month') AS INTEGER)
+    GROUP BY g.month, g.category_id
+'''
+SKETCH_SUMMARY = f'''
+    SELECT strftime('%Y-%m', ts, 'unixepoch'), category_id, {sketch_bucket("amount_cents")}, COUNT(*)
+    FROM {{table}} GROUP BY 1, 2, 3
+'''
+
+STATS_BACKFILL = [
+    "DELETE FROM amount_stats",
+    "DELETE FROM amount_sketch",
+    "INSERT INTO amount_stats (month, category_id, count, mean, m2)"
+    + STATS_SUMMARY.format(table="expense_records"),
+    "INSERT INTO amount_sketch (month, category_id, bucket, count)"
+    + SKETCH_SUMMARY.format(table="expense_records"),
+]
+
+MIGRATIONS.append((9, "Add per-month amount statistics and sketches, and category budgets", [
+    '''
+    CREATE TABLE IF NOT EXISTS amount_stats (
+        month TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        m2 REAL NOT NULL,
+        PRIMARY KEY (month, category_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS amount_sketch (
+        month TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (month, category_id, bucket)
+    ) WITHOUT ROWID
+    ''',
+    # The archived months' statistics, copied from their archive files like archive_rollup
+    '''
+    CREATE TABLE IF NOT EXISTS archive_stats (
+        month TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        m2 REAL NOT NULL,
+        PRIMARY KEY (month, category_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS archive_sketch (
+        month TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (month, category_id, bucket)
+    ) WITHOUT ROWID
+    ''',
+    *STATS_BACKFILL,
+    f'''
+    CREATE TRIGGER IF NOT EXISTS expense_records_stats_insert AFTER INSERT ON expense_records
+    BEGIN{_STATS_ADD}    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS expense_records_stats_delete AFTER DELETE ON expense_records
+    BEGIN{_STATS_REMOVE}    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS expense_records_stats_update
+    AFTER UPDATE OF amount_cents, category_id, ts ON expense_records
+    BEGIN{_STATS_REMOVE}{_STATS_ADD}    END
+    ''',
+    # Monthly spending limits; warn_ratio is the share of the limit that raises a warning
+    '''
+    CREATE TABLE IF NOT EXISTS budgets (
+        category_id INTEGER PRIMARY KEY REFERENCES categories (id),
+        limit_cents INTEGER NOT NULL,
+        warn_ratio REAL NOT NULL DEFAULT 0.8
+    )
+    ''',
+    # Budgets change the dashboard's alerts, so they bump the version the caches check
+    '''
+    CREATE TRIGGER IF NOT EXISTS budgets_version_insert AFTER INSERT ON budgets
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS budgets_version_update AFTER UPDATE ON budgets
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS budgets_version_delete AFTER DELETE ON budgets
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END
+    ''',
+]))
+
+# While change_log_paused holds its row, deleted expenses are neither logged
+# nor counted as writes. archive.py sets it inside the transaction that moves
+# a month's rows to its archive: they stay visible through ledger_records, so
+# the move is logged once, as a 'reset' entry, instead of row by row.
+CHANGE_LOG_ACTIVE = "NOT EXISTS (SELECT 1 FROM change_log_paused)"
+
+MIGRATIONS.append((10, "Log archive moves as one change log reset instead of a delete per row", [
+    "CREATE TABLE IF NOT EXISTS change_log_paused (id INTEGER PRIMARY KEY CHECK (id = 1))",
+    "DROP TRIGGER IF EXISTS expense_records_change_delete",
+    f'''
+    CREATE TRIGGER expense_records_change_delete AFTER DELETE ON expense_records
+    WHEN {CHANGE_LOG_ACTIVE}
+    BEGIN
+        INSERT INTO change_log (op, expense_id, ts) VALUES ('delete', OLD.id, OLD.ts);
+    END
+    ''',
+    "DROP TRIGGER IF EXISTS expense_records_version_delete",
+    f'''
+    CREATE TRIGGER expense_records_version_delete AFTER DELETE ON expense_records
+    WHEN {CHANGE_LOG_ACTIVE}
+    BEGIN
+        UPDATE data_version SET version = version + 1 WHERE id = 1;
+    END
+    ''',
+]))
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """Apply every pending migration up to target, one transaction per version.
+
+    Each step takes the write lock before it checks the version again, so
+    when several processes open an old ledger at once, one of them applies
+    it and the others skip it.
+    """
+    current = get_schema_version(conn)
+
+    for version, description, statements in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            current = get_schema_version(conn)
+            if version <= current:
+                conn.rollback()
+                continue
+            for statement in statements:
+                # Either SQL or (SQL, parameters)
+                if isinstance(statement, tuple):
+                    conn.execute(*statement)
+                else:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+    return get_schema_version(conn)
+
+
+def month_range(year, month):
+    """Return the [start, end) date strings covering a month, for index range scans"""
+    start = f"{year:04d}-{month:02d}-01"
+    if month == 12:
+        end = f"{year + 1:04d}-01-01"
+    else:
+        end = f"{year:04d}-{month + 1:02d}-01"
+    return start, end
+
+
+def to_timestamp(date):
+    """Epoch seconds for a "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS" string, read as UTC like the schema does"""
+    return calendar.timegm(time.strptime(date, "%Y-%m-%d" if len(date) == 10 else "%Y-%m-%d %H:%M:%S"))
@@ -0,0 +1,207 @@
+"""Expense reports for many periods, computed in a single ordered pass.
+
+Periods are "YYYY" (year), "YYYY-Qn" (quarter) or "YYYY-MM" (month) and may
+overlap. Totals come from the monthly rollups, archived months included; with
+details the expenses themselves are read once, in date order, for the whole
+span.
+
+Usage:
+    python reports.py 2024-01 2024-Q2 2024 [--details] [--format text|json|csv]
+    python reports.py --year 2024 --granularity monthly
+"""
+import argparse
+import calendar
+import csv
+import io
+import json
+import re
+from datetime import datetime
+
+from archive import attach_archives, ledger_rows
+from db import get_pool
+from migrations import migrate
+
+GRANULARITIES = ("monthly", "quarterly", "yearly")
+REPORT_FORMATS = {"text": "text/plain", "json": "application/json", "csv": "text/csv"}
+
+_PERIOD_RE = re.compile(r"^(\d{4})(?:-(?:Q([1-4])|(\d{2})))?$")
+
+
+class Period:
+    def __init__(self, label):
+        match = _PERIOD_RE.match(label)
+        if not match:
+            raise ValueError(f"Invalid period: {label} (expected YYYY, YYYY-Qn or YYYY-MM)")
+        year, quarter, month = match.groups()
+        year = int(year)
+
+        if month:
+            month = int(month)
+            if not 1 <= month <= 12:
+                raise ValueError(f"Invalid period: {label}")
+            first, last = month, month
+            self.title = f"{calendar.month_name[month]} {year}"
+        elif quarter:
+            first = (int(quarter) - 1) * 3 + 1
+            last = first + 2
+            self.title = f"Q{quarter} {year}"
+        else:
+            first, last = 1, 12
+            self.title = str(year)
+
+        self.label = label
+        self.months = [f"{year:04d}-{m:02d}" for m in range(first, last + 1)]
+        self.start = f"{self.months[0]}-01"
+        self.end = f"{year + 1:04d}-01-01" if last == 12 else f"{year:04d}-{last + 1:02d}-01"
+        # Epoch bounds, computed from numbers: the end of 9999 has no YYYY-MM-DD form
+        self.start_ts = calendar.timegm((year, first, 1, 0, 0, 0))
+        last_start = calendar.timegm((year, last, 1, 0, 0, 0))
+        self.end_ts = last_start + calendar.monthrange(year, last)[1] * 86400
+
+
+def periods_for_year(year, granularity):
+    """Every period label of one granularity within a year"""
+    if granularity == "monthly":
+        return [f"{year:04d}-{month:02d}" for month in range(1, 13)]
+    if granularity == "quarterly":
+        return [f"{year:04d}-Q{quarter}" for quarter in range(1, 5)]
+    if granularity == "yearly":
+        return [f"{year:04d}"]
+    raise ValueError(f"Unsupported granularity: {granularity}")
+
+
+def generate_reports(conn, periods, include_expenses=False):
+    """Build one report dict per period label, reading the data once for all of them"""
+    periods = [Period(label) for label in periods]
+    reports = [
+        {'period': p.label, 'title': p.title, 'start': p.start, 'end': p.end,
+         'total': 0.0, 'count': 0, 'categories': {}}
+        for p in periods
+    ]
+    if not periods:
+        return reports
+    if include_expenses:
+        for report in reports:
+            report['expenses'] = []
+
+    # Each month maps to every report whose period covers it, so a row is
+    # routed to its (at most a few) reports in O(1) instead of testing every period
+    reports_by_month = {}
+    for period, report in zip(periods, reports):
+        for month in period.months:
+            reports_by_month.setdefault(month, []).append(report)
+
+    first_month = min(p.months[0] for p in periods)
+    last_month = max(p.months[-1] for p in periods)
+
+    cursor = conn.execute('''
+        SELECT month, category, total, count FROM monthly_category_totals
+        WHERE month >= ? AND month <= ?
+        ORDER BY month
+    ''', (first_month, last_month))
+    for month, category, total, count in cursor:
+        for report in reports_by_month.get(month, ()):
+            report['total'] += total
+            report['count'] += count
+            report['categories'][category] = report['categories'].get(category, 0.0) + total
+
+    if include_expenses:
+        # Filter on the epoch column, which the ts index of every file serves
+        attach_archives(conn)
+        cursor = conn.execute(
+            ledger_rows("SELECT * FROM ledger_records WHERE ts >= ? AND ts < ? ORDER BY ts, id"),
+            (min(p.start_ts for p in periods), max(p.end_ts for p in periods))
+        )
+        for row in cursor:
+            expense = dict(row)
+            for report in reports_by_month.get(expense['date'][:7], ()):
+                report['expenses'].append(expense)
+
+    for report in reports:
+        report['categories'] = dict(
+            sorted(report['categories'].items(), key=lambda item: item[1], reverse=True)
+        )
+    return reports
+
+
+def format_text(reports):
+    lines = []
+    for report in reports:
+        total = report['total']
+        if not report['count']:
+            lines.append(f"No expenses found for {report['title']}")
+            continue
+
+        lines.append(f"\nExpense Report for {report['title']}")
+        lines.append("=" * 40)
+        lines.append(f"Total Expenses: ${total:.2f}")
+        lines.append("\nBreakdown by Category:")
+        for category, amount in report['categories'].items():
+            percentage = (amount / total) * 100 if total else 0
+            lines.append(f"{category}: ${amount:.2f} ({percentage:.1f}%)")
+
+        if 'expenses' in report:
+            lines.append("\nDetailed Expenses:")
+            for expense in report['expenses']:
+                date = datetime.strptime(expense["date"], "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d")
+                lines.append(f"{date} - {expense['category']} - ${expense['amount']:.2f} - {expense['description']}")
+    return "\n".join(lines)
+
+
+def format_json(reports):
+    return json.dumps(reports, indent=2)
+
+
+def format_csv(reports):
+    """One row per period and category, plus a TOTAL row per period"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["period", "category", "total", "percentage"])
+    for report in reports:
+        total = report['total']
+        for category, amount in report['categories'].items():
+            percentage = (amount / total) * 100 if total else 0
+            writer.writerow([report['period'], category, f"{amount:.2f}", f"{percentage:.1f}"])
+        writer.writerow([report['period'], "TOTAL", f"{total:.2f}", "100.0" if total else "0.0"])
+    return buffer.getvalue()
+
+
+def format_reports(reports, format):
+    if format == "text":
+        return format_text(reports)
+    if format == "json":
+        return format_json(reports)
+    if format == "csv":
+        return format_csv(reports)
+    raise ValueError(f"Unsupported format: {format}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate expense reports for many periods at once")
+    parser.add_argument("periods", nargs="*", help="periods such as 2024, 2024-Q2 or 2024-06")
+    parser.add_argument("--year", type=int, help="report every period of this year")
+    parser.add_argument("--granularity", choices=GRANULARITIES, default="monthly",
+                        help="period size used with --year (default: monthly)")
+    parser.add_argument("--details", action="store_true", help="list the individual expenses")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default="text")
+    parser.add_argument("--db", default="expenses.db", help="database file (default: expenses.db)")
+    args = parser.parse_args()
+
+    periods = list(args.periods)
+    if args.year:
+        periods.extend(periods_for_year(args.year, args.granularity))
+    if not periods:
+        parser.error("give at least one period or --year")
+
+    with get_pool(args.db).connection() as conn:
+        migrate(conn)
+        try:
+            reports = generate_reports(conn, periods, args.details)
+        except ValueError as e:
+            parser.error(str(e))
+
+    print(format_reports(reports, args.format))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Maintenance for the category and monthly rollup tables.
+
+The rollups are kept current by triggers on the expense_records table (see
+migration 5). This module rebuilds them from scratch and verifies them
+against a full aggregation of the ledger.
+
+Usage:
+    python rollups.py verify [--db expenses.db]
+    python rollups.py rebuild [--db expenses.db]
+"""
+import argparse
+import sqlite3
+import sys
+
+from migrations import migrate
+
+# Rollups are summed in integer cents, so they must match exactly
+MONTH = "strftime('%Y-%m', ts, 'unixepoch')"
+
+
+def rebuild_rollups(conn):
+    """Recompute both rollup tables from the expense_records table in one transaction"""
+    try:
+        conn.execute("BEGIN")
+        conn.execute("DELETE FROM category_rollup")
+        conn.execute("DELETE FROM monthly_rollup")
+        conn.execute('''
+            INSERT INTO category_rollup (category_id, total_cents, count)
+            SELECT category_id, SUM(amount_cents), COUNT(*) FROM expense_records GROUP BY category_id
+        ''')
+        conn.execute(f'''
+            INSERT INTO monthly_rollup (month, category_id, total_cents, count)
+            SELECT {MONTH}, category_id, SUM(amount_cents), COUNT(*) FROM expense_records
+            GROUP BY {MONTH}, category_id
+        ''')
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def _compare(expected, actual, label, names):
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        exp_cents, exp_count = expected.get(key, (0, 0))
+        act_cents, act_count = actual.get(key, (0, 0))
+        if exp_count != act_count or exp_cents != act_cents:
+            mismatches.append(
+                f"{label} {names(key)}: expected {exp_cents / 100:.2f} ({exp_count} rows), "
+                f"found {act_cents / 100:.2f} ({act_count} rows)"
+            )
+    return mismatches
+
+
+def verify_rollups(conn):
+    """Return a list of mismatches between the rollups and the ledger (empty if consistent)"""
+    categories = dict(conn.execute("SELECT id, name FROM categories").fetchall())
+
+    expected = {
+        row[0]: (row[1], row[2]) for row in conn.execute(
+            "SELECT category_id, SUM(amount_cents), COUNT(*) FROM expense_records GROUP BY category_id")
+    }
+    actual = {
+        row[0]: (row[1], row[2]) for row in conn.execute(
+            "SELECT category_id, total_cents, count FROM category_rollup")
+    }
+    mismatches = _compare(expected, actual, "category", categories.get)
+
+    expected = {
+        (row[0], row[1]): (row[2], row[3]) for row in conn.execute(f'''
+            SELECT {MONTH}, category_id, SUM(amount_cents), COUNT(*) FROM expense_records
+            GROUP BY {MONTH}, category_id
+        ''')
+    }
+    actual = {
+        (row[0], row[1]): (row[2], row[3]) for row in conn.execute(
+            "SELECT month, category_id, total_cents, count FROM monthly_rollup")
+    }
+    mismatches.extend(_compare(expected, actual, "month/category",
+                               lambda key: f"{key[0]} {categories.get(key[1])}"))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify or rebuild the expense rollup tables")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--db", default="expenses.db", help="database file (default: expenses.db)")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    migrate(conn)
+
+    if args.command == "rebuild":
+        rebuild_rollups(conn)
+        print("Rollups rebuilt.")
+
+    mismatches = verify_rollups(conn)
+    conn.close()
+
+    if mismatches:
+        print(f"{len(mismatches)} rollup mismatches:")
+        for mismatch in mismatches:
+            print(f"  {mismatch}")
+        sys.exit(1)
+    print("Rollups are consistent with the ledger.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Expense search: description text plus category, amount and date filters.
+
+Descriptions are indexed by the expense_search FTS5 table (migration 6).
+build_search() turns a SearchQuery into one SQL statement that combines the
+full-text match with the indexed predicates, and returns results newest
+first with the same (date, id) keyset cursor as the paginated expense list.
+"""
+import re
+
+from migrations import EXPENSE_ROWS, to_timestamp
+
+# A text match or amount range with at most this many rows drives the query:
+# its rows are looked up first and sorted by date. Anything broader is only
+# checked while walking the date (or category) index, which stops as soon as
+# a page is full.
+SELECTIVE_ROWS = 2000
+
+MAX_QUERY_TERMS = 8
+
+# Letters, digits and underscores, as FTS5's unicode61 tokenizer splits them
+_TERM = re.compile(r"\w+", re.UNICODE)
+# A double-quoted phrase, or a bare word
+_TOKEN = re.compile(r'"([^"]*)"|(\w+)', re.UNICODE)
+
+
+def fts_query(text):
+    """Quote free text as FTS5 terms, so its words never act as query syntax.
+
+    Every word must match, and words in double quotes must match as a
+    phrase. As in search-as-you-type, a bare last word also matches as a
+    prefix (served by the index's 2- and 3-character prefix tables) and the
+    others match whole words, which is much cheaper than expanding every
+    word. An unbalanced quote raises ValueError.
+    """
+    text = text or ""
+    if text.count('"') % 2:
+        raise ValueError(f"Invalid q: {text} (unbalanced quote)")
+    terms = []
+    budget = MAX_QUERY_TERMS
+    for phrase, word in _TOKEN.findall(text):
+        words = [word] if word else _TERM.findall(phrase)
+        words = words[:budget]
+        if words:
+            terms.append('"' + " ".join(words) + '"')
+            budget -= len(words)
+        if not budget:
+            break
+    # A one-letter prefix would expand to most of the vocabulary
+    if terms and word and len(word) > 1:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _parse_amount(value, name):
+    try:
+        return round(float(value) * 100)
+    except (ValueError, OverflowError):
+        raise ValueError(f"Invalid {name}: {value}")
+
+
+def _parse_date(value, name):
+    try:
+        return to_timestamp(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value} (use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS)")
+
+
+class SearchQuery:
+    """Search filters; every one is optional and they are combined with AND.
+
+    text must match every description word and quoted phrase (a bare last
+    word as a prefix),
+    amounts are inclusive dollar bounds and dates are inclusive, either days
+    or exact seconds.
+    """
+
+    def __init__(self, text=None, category=None, min_amount=None, max_amount=None, start=None, end=None):
+        self.text = fts_query(text)
+        self.category = category if category and category != "All" else None
+        self.min_cents = _parse_amount(min_amount, "min_amount") if min_amount else None
+        self.max_cents = _parse_amount(max_amount, "max_amount") if max_amount else None
+        self.start_ts = _parse_date(start, "from") if start else None
+        self.end_ts = None
+        if end:
+            # A bare day includes the whole day
+            self.end_ts = _parse_date(end, "to") + (86400 if len(end) == 10 else 1)
+
+    @classmethod
+    def from_args(cls, args):
+        """Build a query from request arguments (q, category, min_amount, max_amount, from, to)"""
+        return cls(args.get('q'), args.get('category'), args.get('min_amount'), args.get('max_amount'),
+                   args.get('from'), args.get('to'))
+
+
+def _is_selective(conn, sql, params):
+    count = conn.execute(f"SELECT COUNT(*) FROM ({sql} LIMIT {SELECTIVE_ROWS + 1})", params).fetchone()[0]
+    return count <= SELECTIVE_ROWS
+
+
+def build_search(conn, query, limit, after=None):
+    """Return (sql, params) for one page of matches; after is a (timestamp, id) keyset position"""
+    match = "r.id IN (SELECT rowid FROM expense_search WHERE expense_search MATCH ?)"
+    amounts = []
+    amount_params = []
+    if query.min_cents is not None:
+        amounts.append("r.amount_cents >= ?")
+        amount_params.append(query.min_cents)
+    if query.max_cents is not None:
+        amounts.append("r.amount_cents <= ?")
+        amount_params.append(query.max_cents)
+
+    # Choose what drives the query by counting rows (at most SELECTIVE_ROWS + 1)
+    # for the text, then the amount range
+    probes = []
+    if query.text:
+        probes.append(("text", [match], [query.text]))
+    if amounts and not query.category:
+        # With a category, the category index already covers the amount
+        probes.append(("amount", amounts, amount_params))
+    drive = None
+    for name, conditions, params in probes:
+        if _is_selective(conn, "SELECT r.id FROM expense_records r WHERE " + " AND ".join(conditions), params):
+            drive = name
+            break
+
+    # A unary + keeps SQLite from using an index for a predicate. With a
+    # driving set, every other predicate becomes a filter on its few rows;
+    # without one, the date or category index returns rows already in order
+    # and the text and amount checks filter them until the page is full.
+    def indexed(condition, usable):
+        return condition if usable else "+" + condition
+
+    conditions = []
+    params = []
+    if query.text:
+        conditions.append(indexed(match, drive == "text"))
+        params.append(query.text)
+    conditions.extend(indexed(condition, drive == "amount") for condition in amounts)
+    params.extend(amount_params)
+    if query.category:
+        conditions.append(indexed("r.category_id", not drive) + " = (SELECT id FROM categories WHERE name = ?)")
+        params.append(query.category)
+    if query.start_ts is not None:
+        conditions.append(indexed("r.ts", not drive) + " >= ?")
+        params.append(query.start_ts)
+    if query.end_ts is not None:
+        conditions.append(indexed("r.ts", not drive) + " < ?")
+        params.append(query.end_ts)
+    if after is not None:
+        conditions.append("(" + indexed("r.ts", not drive) + ", r.id) < (?, ?)")
+        params.extend(after)
+
+    sql = EXPENSE_ROWS
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    # One extra row tells whether another page follows
+    sql += f" ORDER BY {indexed('r.ts', not drive)} DESC, r.id DESC LIMIT ?"
+    params.append(limit + 1)
+    return sql, params
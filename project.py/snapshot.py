@@ -0,0 +1,356 @@
+"""A read-only, in-memory copy of the ledger for the analytics queries.
+
+Reports, trends, statistics and the analyzer's column loads scan a lot of
+rows. Run against expenses.db, each holds a read transaction (and the WAL
+checkpoint behind it) for as long as it runs, competing with /add_expense
+for the file. A LedgerSnapshot copies the ledger into an in-memory SQLite
+database with the backup API once, then keeps it current by replaying only
+what changed:
+
+  * rows with an id above the snapshot's highest id are new;
+  * ids in change_log (see migration 7) since the snapshot's last seq were
+    updated or deleted, so they are deleted from the copy and re-copied if
+    they still exist.
+
+The copy keeps the ledger's rollup and statistics triggers, so those
+follow the replayed rows exactly as on disk. Its search index and its
+change log and data version triggers are dropped: searches stay on the
+ledger, and the index would make replaying several times slower. When the
+change log no longer reaches back far enough, so much changed that copying
+is cheaper, or the schema or archives changed (migrations,
+archive.close_months), the copy is taken again in full.
+
+Reads never see data older than max_staleness seconds: a read finding the
+copy older than that refreshes it first. With a refresh_interval a
+background thread refreshes it ahead of the reads as well. Archives are
+attached to the copy from their files, as they are read-only anyway.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from archive import attach_archives
+from db import connect
+
+# Seconds the analytics reads may lag behind the ledger
+DEFAULT_MAX_STALENESS = 5.0
+# Replaying one change through the copy's triggers takes about as long as
+# backing up this many pages, so past page_count / 6 changes it copies again
+PAGES_PER_CHANGE = 6
+# Seconds a refresh waits for running reads before it copies the ledger again
+# instead of applying the changes; reads arriving meanwhile wait for it
+APPLY_WAIT = 0.25
+# What the copy does not need (see above)
+SELECT_UNUSED_TRIGGERS = '''
+    SELECT name FROM sqlite_master WHERE type = 'trigger' AND (name LIKE 'expense_records_search_%'
+        OR name LIKE 'expense_records_change_%' OR name LIKE 'expense_records_version_%')
+'''
+
+SELECT_VERSION = "SELECT version FROM data_version WHERE id = 1"
+# Anything that changes the schema or the archives makes the copy start over
+SELECT_STRUCTURE = '''
+    SELECT (SELECT user_version FROM pragma_user_version) || '|' ||
+           COALESCE((SELECT group_concat(year || ':' || path || ':' || end_ts, ',')
+                     FROM (SELECT * FROM archives ORDER BY year)), '')
+'''
+SELECT_PAGE_COUNT = "PRAGMA page_count"
+SELECT_MAX_ID = "SELECT COALESCE(MAX(id), 0) FROM expense_records"
+SELECT_FIRST_CHANGE = "SELECT MIN(seq) FROM change_log"
+SELECT_LAST_CHANGE = "SELECT COALESCE(MAX(seq), 0) FROM change_log"
+# Rows above max_id are all copied, so only the older ids are collected
+SELECT_CHANGED_IDS = "SELECT DISTINCT expense_id FROM change_log WHERE seq > ? AND expense_id <= ?"
+# The changed ids are passed as one JSON array, however many there are
+SELECT_CHANGED_ROWS = '''
+    SELECT id, amount_cents, category_id, description, ts FROM expense_records WHERE id > ?
+    UNION ALL
+    SELECT id, amount_cents, category_id, description, ts FROM expense_records
+    WHERE id IN (SELECT value FROM json_each(?))
+'''
+SELECT_CATEGORIES = "SELECT id, name FROM categories"
+INSERT_CATEGORY = "INSERT OR IGNORE INTO categories (id, name) VALUES (?, ?)"
+DELETE_CHANGED = "DELETE FROM expense_records WHERE id IN (SELECT value FROM json_each(?))"
+INSERT_ROW = "INSERT INTO expense_records (id, amount_cents, category_id, description, ts) VALUES (?, ?, ?, ?, ?)"
+
+
+class SharedLock:
+    """Any number of shared holders at once, or a single exclusive one.
+
+    A waiting exclusive holder keeps new shared holders out, so a refresh is
+    never starved by a steady stream of reads.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._exclusive:
+                self._cond.wait()
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._shared -= 1
+                if not self._shared:
+                    self._cond.notify_all()
+
+    def acquire_exclusive(self, timeout=None):
+        """Wait for the shared holders to finish; False if that took longer than timeout"""
+        with self._cond:
+            while self._exclusive:
+                self._cond.wait()
+            self._exclusive = True
+            if self._cond.wait_for(lambda: not self._shared, timeout):
+                return True
+            self._exclusive = False
+            self._cond.notify_all()
+            return False
+
+    def release_exclusive(self):
+        with self._cond:
+            self._exclusive = False
+            self._cond.notify_all()
+
+
+class _Copy:
+    """One in-memory copy of the ledger, and how many readers are using it"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.readers = 0
+        # Replaced by a newer copy; closed when its last reader lets go
+        self.retired = False
+
+
+class LedgerSnapshot:
+    """An in-memory copy of a ledger, refreshed incrementally, for read-only analytics.
+
+    connection() hands out the copy's connection, which the readers share.
+    sqlite3 serializes the statements run on one connection, so concurrent
+    reads queue for it rather than running in parallel; they still never
+    wait on the ledger's writers, which is the point. (An in-memory database
+    is private to its connection, and a shared-cache one serializes its
+    readers just the same.)
+
+    A refresh reads the ledger while the readers run and only holds them off
+    to apply the changes, or, when they run for longer than APPLY_WAIT,
+    takes a new copy instead. A new copy is swapped in without waiting:
+    readers still on the old one finish there, and it is closed when the
+    last of them lets go of it. The copy must never be written to other than
+    by refresh().
+    """
+
+    def __init__(self, pool, max_staleness=DEFAULT_MAX_STALENESS, refresh_interval=None):
+        self.pool = pool
+        self.max_staleness = max_staleness
+        # Archive paths are relative to the ledger's directory
+        self.base = os.path.dirname(os.path.abspath(pool.db_file))
+        self._current = None
+        self.version = None
+        self.structure = None
+        self.seq = 0
+        self.max_id = 0
+        self.refreshed = 0.0
+        # One refresh at a time; the readers and the refresh share the copy through _access
+        self._lock = threading.Lock()
+        self._access = SharedLock()
+        # Guards each copy's reader count, and which copy is current
+        self._readers_lock = threading.Lock()
+        self._open_copies = 0
+        self._stats = {
+            'full_refreshes': 0, 'incremental_refreshes': 0, 'unchanged_refreshes': 0,
+            'rows_applied': 0, 'refresh_ms_last': 0.0, 'refresh_ms_max': 0.0, 'last_error': None,
+        }
+        self._stop = threading.Event()
+        self._thread = None
+        if refresh_interval:
+            self._thread = threading.Thread(target=self._run, args=(refresh_interval,),
+                                            name="ledger-snapshot", daemon=True)
+            self._thread.start()
+
+    @contextmanager
+    def connection(self):
+        """Borrow the copy's connection, refreshing it first if it is older than max_staleness"""
+        self._refresh_if_stale()
+        with self._access.shared():
+            with self._readers_lock:
+                copy = self._current
+                copy.readers += 1
+            try:
+                yield copy.conn
+            finally:
+                with self._readers_lock:
+                    copy.readers -= 1
+                    done = copy.retired and not copy.readers
+                if done:
+                    self._close_copy(copy)
+
+    @property
+    def conn(self):
+        """The current copy's connection, None before the first refresh"""
+        copy = self._current
+        return copy.conn if copy is not None else None
+
+    def current_version(self):
+        """The ledger's data version the copy reflects, refreshing it first if it is stale"""
+        self._refresh_if_stale()
+        return self.version
+
+    def refresh(self):
+        """Bring the copy up to date with the ledger now"""
+        with self._lock:
+            self._refresh()
+
+    def _is_stale(self):
+        return self.conn is None or time.monotonic() - self.refreshed >= self.max_staleness
+
+    def _refresh_if_stale(self):
+        if self._is_stale():
+            with self._lock:
+                # Another reader may have refreshed it while this one waited
+                if self._is_stale():
+                    self._refresh()
+
+    def _refresh(self):
+        started = time.perf_counter()
+        # Taken before reading, so the copy is never older than it claims
+        checked = time.monotonic()
+        if self.conn is None:
+            self._copy()
+            kind = 'full_refreshes'
+        else:
+            kind = self._replay()
+        self.refreshed = checked
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        stats = self._stats
+        stats[kind] += 1
+        stats['refresh_ms_last'] = elapsed_ms
+        stats['refresh_ms_max'] = max(stats['refresh_ms_max'], elapsed_ms)
+
+    def _copy(self):
+        """Copy the whole ledger into a new in-memory database and swap it in"""
+        conn = connect(":memory:")
+        with self.pool.connection() as disk:
+            # An in-memory destination must have the source's page size
+            conn.execute(f"PRAGMA page_size = {disk.execute('PRAGMA page_size').fetchone()[0]}")
+            disk.backup(conn)
+        # Read from the copy, so they match what was copied
+        version = conn.execute(SELECT_VERSION).fetchone()[0]
+        structure = conn.execute(SELECT_STRUCTURE).fetchone()[0]
+        seq = conn.execute(SELECT_LAST_CHANGE).fetchone()[0]
+        max_id = conn.execute(SELECT_MAX_ID).fetchone()[0]
+        for (name,) in conn.execute(SELECT_UNUSED_TRIGGERS).fetchall():
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.execute("DROP TABLE IF EXISTS expense_search")
+        conn.commit()
+        attach_archives(conn, self.base)
+
+        # The copy first: a version must never be ahead of the copy read under it
+        with self._readers_lock:
+            old, self._current = self._current, _Copy(conn)
+            self._open_copies += 1
+            done = old is not None and not old.readers
+            if old is not None:
+                old.retired = True
+        self.version, self.structure, self.seq, self.max_id = version, structure, seq, max_id
+        if done:
+            self._close_copy(old)
+
+    def _close_copy(self, copy):
+        copy.conn.close()
+        with self._readers_lock:
+            self._open_copies -= 1
+
+    def _replay(self):
+        """Apply the ledger's changes since the last refresh, or copy it again if that is cheaper"""
+        with self.pool.connection() as disk:
+            # One read transaction, so the log and the rows agree
+            disk.execute("BEGIN")
+            try:
+                version = disk.execute(SELECT_VERSION).fetchone()[0]
+                structure = disk.execute(SELECT_STRUCTURE).fetchone()[0]
+                if version == self.version and structure == self.structure:
+                    return 'unchanged_refreshes'
+                first = disk.execute(SELECT_FIRST_CHANGE).fetchone()[0]
+                last = disk.execute(SELECT_LAST_CHANGE).fetchone()[0]
+                pages = disk.execute(SELECT_PAGE_COUNT).fetchone()[0]
+                if (structure != self.structure
+                        or (first is not None and first > self.seq + 1)
+                        or last - self.seq > pages // PAGES_PER_CHANGE):
+                    rows = None
+                else:
+                    changed = _json_ids(row[0] for row in disk.execute(SELECT_CHANGED_IDS, (self.seq, self.max_id)))
+                    rows = disk.execute(SELECT_CHANGED_ROWS, (self.max_id, changed)).fetchall()
+                    categories = disk.execute(SELECT_CATEGORIES).fetchall()
+            finally:
+                disk.rollback()
+
+        if rows is None or not self._access.acquire_exclusive(APPLY_WAIT):
+            self._copy()
+            return 'full_refreshes'
+
+        try:
+            conn = self.conn
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(INSERT_CATEGORY, categories)
+                conn.execute(DELETE_CHANGED, (changed,))
+                conn.executemany(INSERT_ROW, rows)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            self.version = version
+            self.seq = last
+            self.max_id = max([self.max_id] + [row[0] for row in rows])
+        finally:
+            self._access.release_exclusive()
+        self._stats['rows_applied'] += len(rows)
+        return 'incremental_refreshes'
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # Reads refresh on their own and report the error themselves
+                self._stats['last_error'] = str(e)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'version': self.version,
+                'seq': self.seq,
+                'age_s': round(time.monotonic() - self.refreshed, 3) if self.conn is not None else None,
+                'max_staleness_s': self.max_staleness,
+                # Above 1 while readers finish on copies already replaced
+                'open_copies': self._open_copies,
+            })
+        stats['refresh_ms_last'] = round(stats['refresh_ms_last'], 2)
+        stats['refresh_ms_max'] = round(stats['refresh_ms_max'], 2)
+        return stats
+
+    def close(self):
+        """Stop the refresher thread and drop the copy"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            self._access.acquire_exclusive()
+            try:
+                if self._current is not None:
+                    self._close_copy(self._current)
+                    self._current = None
+            finally:
+                self._access.release_exclusive()
+
+
+def _json_ids(ids):
+    return "[" + ",".join(str(i) for i in ids) + "]"
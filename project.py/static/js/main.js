@@ -11,6 +11,15 @@ function formatDate(dateString) {
     return date.toLocaleDateString();
 }
 
+// A category's colored badge. Built from nodes, never markup: the name comes
+// from the server's data
+function categoryBadge(category) {
+    const badge = document.createElement('span');
+    badge.className = `badge bg-${category.toLowerCase()}`;
+    badge.textContent = category;
+    return badge;
+}
+
 // Show notification
 function showNotification(message, type = 'success') {
     // Check if notification container exists
@@ -31,10 +40,14 @@ function showNotification(message, type = 'success') {
     const notification = document.createElement('div');
     notification.className = `alert alert-${type} alert-dismissible fade show`;
     notification.role = 'alert';
-    notification.innerHTML = `
-        ${message}
-        <button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close"></button>
-    `;
+    // The message may be a server's response text, so it is never parsed as markup
+    notification.textContent = message;
+    const close = document.createElement('button');
+    close.type = 'button';
+    close.className = 'btn-close';
+    close.dataset.bsDismiss = 'alert';
+    close.setAttribute('aria-label', 'Close');
+    notification.appendChild(close);
     
     // Add notification to container
     container.appendChild(notification);
@@ -48,6 +61,51 @@ function showNotification(message, type = 'success') {
     }, 5000);
 }
 
+// Subscribe to the server's change stream (/api/stream). onChange receives
+// each batch of writes: inserted rows, deleted ids and the updated totals.
+function subscribeToChanges(onChange) {
+    if (!window.EventSource) {
+        return null;
+    }
+    const source = new EventSource('/api/stream');
+    source.addEventListener('change', event => onChange(JSON.parse(event.data)));
+    // Too many changes to patch in place (a bulk import, say): start over
+    source.addEventListener('reset', () => window.location.reload());
+    return source;
+}
+
+// Forms marked data-live are posted with fetch() and the page stays put:
+// the change stream brings the result to this tab and every other open one.
+// The data-live value is shown as a notification on success.
+document.addEventListener('submit', function(event) {
+    const form = event.target;
+    // Cancelled by an inline confirm(), or no change stream to show the result
+    if (!form.matches('form[data-live]') || event.defaultPrevented || !window.EventSource) {
+        return;
+    }
+    event.preventDefault();
+    
+    fetch(form.action, {
+        method: 'POST',
+        body: new FormData(form),
+        headers: { 'Accept': 'application/json' }
+    })
+        .then(response => {
+            if (!response.ok) {
+                return response.text().then(text => showNotification(text, 'danger'));
+            }
+            form.reset();
+            const modal = form.closest('.modal');
+            if (modal) {
+                bootstrap.Modal.getOrCreateInstance(modal).hide();
+            }
+            if (form.dataset.live) {
+                showNotification(form.dataset.live);
+            }
+        })
+        .catch(() => showNotification('Could not reach the server', 'danger'));
+});
+
 // Replace chart colors if they're using the blue primary color
 const chartColors = [
     '#212529', '#6c757d', '#343a40', '#495057', '#212529', '#000000',
@@ -0,0 +1,400 @@
+"""Spending statistics and budget alerts, read from trigger-maintained summaries.
+
+Triggers keep a count, a Welford mean and m2, and a quantile sketch of the
+amounts for every month and category (migration 9). Statistics for any range
+of months and categories are merged from those rows: no expense is read, so
+the cost depends on the number of months and not on the number of expenses.
+Archived months are included from their copies in archive_stats and
+archive_sketch.
+
+Budgets are monthly limits per category. A category is at "warning" once its
+spending for the month reaches warn_ratio of the limit, and "over" once it
+reaches the limit.
+
+Usage:
+    python stats.py show [--category Food] [--from 2025-01] [--to 2025-06] [--db expenses.db]
+    python stats.py budgets [--month 2025-06]
+    python stats.py budget Food 400 [--warn 0.8]
+    python stats.py budget Food --remove
+    python stats.py verify | rebuild
+"""
+import argparse
+import math
+import re
+import sqlite3
+import sys
+from datetime import datetime
+
+from migrations import SKETCH_SUMMARY, STATS_BACKFILL, STATS_SUMMARY, migrate
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+DEFAULT_WARN_RATIO = 0.8
+
+_MONTH_RE = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+# Every month sorts between these
+FIRST_MONTH = "0000-00"
+LAST_MONTH = "9999-99"
+
+SELECT_STATS = '''
+    SELECT category_id, count, mean, m2 FROM amount_stats WHERE month >= ?1 AND month <= ?2{filter}
+    UNION ALL
+    SELECT category_id, count, mean, m2 FROM archive_stats WHERE month >= ?1 AND month <= ?2{filter}
+'''
+SELECT_SKETCH = '''
+    SELECT category_id, bucket, SUM(count) FROM (
+        SELECT category_id, bucket, count FROM amount_sketch WHERE month >= ?1 AND month <= ?2{filter}
+        UNION ALL
+        SELECT category_id, bucket, count FROM archive_sketch WHERE month >= ?1 AND month <= ?2{filter}
+    )
+    GROUP BY category_id, bucket
+    ORDER BY bucket
+'''
+SELECT_MONTHLY = '''
+    SELECT month, SUM(total_cents) FROM ledger_monthly_rollup
+    WHERE month >= ?1 AND month <= ?2{filter}
+    GROUP BY month ORDER BY month
+'''
+CATEGORY_FILTER = " AND category_id = (SELECT id FROM categories WHERE name = ?3)"
+
+# Two index seeks per budget; the current month is never archived, but past ones may be
+SELECT_BUDGETS = '''
+    SELECT c.name AS category, b.limit_cents, b.warn_ratio,
+           COALESCE((SELECT total_cents FROM monthly_rollup r
+                     WHERE r.month = ?1 AND r.category_id = b.category_id), 0)
+           + COALESCE((SELECT total_cents FROM archive_rollup r
+                       WHERE r.month = ?1 AND r.category_id = b.category_id), 0) AS spent_cents
+    FROM budgets b JOIN categories c ON c.id = b.category_id
+    ORDER BY c.name
+'''
+UPSERT_BUDGET = '''
+    INSERT INTO budgets (category_id, limit_cents, warn_ratio)
+    SELECT id, ?, ? FROM categories WHERE name = ?
+    ON CONFLICT (category_id) DO UPDATE SET
+        limit_cents = excluded.limit_cents, warn_ratio = excluded.warn_ratio
+'''
+DELETE_BUDGET = "DELETE FROM budgets WHERE category_id = (SELECT id FROM categories WHERE name = ?)"
+
+
+def current_month():
+    """This month as YYYY-MM, in local time like the dates expenses are stored with"""
+    return datetime.now().strftime("%Y-%m")
+
+
+def check_month(month, name="month"):
+    if not _MONTH_RE.match(month or ""):
+        raise ValueError(f"Invalid {name}: {month} (use YYYY-MM)")
+    return month
+
+
+def merge_moments(a, b):
+    """Combine two (count, mean, m2) summaries as if their values had been seen together"""
+    count_a, mean_a, m2_a = a
+    count_b, mean_b, m2_b = b
+    count = count_a + count_b
+    if not count:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    return (count,
+            mean_a + delta * count_b / count,
+            m2_a + m2_b + delta * delta * count_a * count_b / count)
+
+
+def sketch_quantiles(buckets, quantiles=QUANTILES):
+    """{q: value in cents} from (bucket, count) pairs in bucket order.
+
+    Each quantile is reported as its bucket: the exact value truncated to two
+    significant digits. Unlike a bucket's middle, it never overshoots the
+    values seen (the middle gives 50.50 for a single 50.00).
+    """
+    total = sum(count for _, count in buckets)
+    result = {}
+    if not total:
+        return result
+    targets = iter(sorted(quantiles))
+    q = next(targets)
+    seen = 0
+    for bucket, count in buckets:
+        seen += count
+        # The nearest-rank quantile falls in the first bucket covering it
+        while q is not None and seen >= max(1, math.ceil(q * total)):
+            result[q] = bucket
+            q = next(targets, None)
+        if q is None:
+            break
+    return result
+
+
+def summarize(moments, buckets):
+    """The statistics of one group, in dollars"""
+    count, mean, m2 = moments
+    summary = {
+        'count': count,
+        'total': round(count * mean / 100, 2),
+        'mean': round(mean / 100, 2),
+        # Sample standard deviation
+        'stddev': round(math.sqrt(m2 / (count - 1)) / 100, 2) if count > 1 else 0.0,
+    }
+    for q, value in sketch_quantiles(buckets).items():
+        summary[f"p{round(q * 100)}"] = round(value / 100, 2)
+    return summary
+
+
+def _range(start, end, category):
+    start = check_month(start, "from") if start else FIRST_MONTH
+    end = check_month(end, "to") if end else LAST_MONTH
+    params = [start, end]
+    filter = ""
+    if category and category != "All":
+        filter = CATEGORY_FILTER
+        params.append(category)
+    return filter, params
+
+
+def month_over_month(conn, start=None, end=None, category=None):
+    """Total per month with its change from the month before; months without expenses count as 0"""
+    filter, params = _range(start, end, category)
+    totals = dict(conn.execute(SELECT_MONTHLY.format(filter=filter), params).fetchall())
+    if not totals:
+        return []
+
+    months = []
+    year, month = (int(part) for part in min(totals).split("-"))
+    last = max(totals)
+    previous = None
+    while True:
+        label = f"{year:04d}-{month:02d}"
+        if label > last:
+            break
+        total = totals.get(label, 0) / 100
+        entry = {'month': label, 'total': total, 'change': None, 'change_pct': None}
+        if previous is not None:
+            entry['change'] = round(total - previous, 2)
+            if previous:
+                entry['change_pct'] = round((total - previous) / abs(previous) * 100, 1)
+        months.append(entry)
+        previous = total
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def spending_stats(conn, start=None, end=None, category=None):
+    """Count, total, mean, standard deviation and quantiles per category and overall.
+
+    start and end are inclusive YYYY-MM months; both are optional.
+    """
+    filter, params = _range(start, end, category)
+    names = dict(conn.execute("SELECT id, name FROM categories").fetchall())
+
+    moments = {}
+    for category_id, count, mean, m2 in conn.execute(SELECT_STATS.format(filter=filter), params):
+        moments[category_id] = merge_moments(moments.get(category_id, (0, 0.0, 0.0)), (count, mean, m2))
+
+    buckets = {}
+    overall_buckets = {}
+    for category_id, bucket, count in conn.execute(SELECT_SKETCH.format(filter=filter), params):
+        buckets.setdefault(category_id, []).append((bucket, count))
+        overall_buckets[bucket] = overall_buckets.get(bucket, 0) + count
+
+    overall = (0, 0.0, 0.0)
+    for summary in moments.values():
+        overall = merge_moments(overall, summary)
+
+    return {
+        'from': params[0] if params[0] != FIRST_MONTH else None,
+        'to': params[1] if params[1] != LAST_MONTH else None,
+        'categories': {
+            names[category_id]: summarize(moments[category_id], buckets.get(category_id, []))
+            for category_id in sorted(moments, key=lambda category_id: names[category_id])
+        },
+        'all': summarize(overall, sorted(overall_buckets.items())),
+        'monthly': month_over_month(conn, start, end, category),
+    }
+
+
+def budget_status(conn, month=None):
+    """Every budget with the month's spending against it (this month by default)"""
+    month = check_month(month) if month else current_month()
+    status = []
+    for category, limit_cents, warn_ratio, spent_cents in conn.execute(SELECT_BUDGETS, (month,)):
+        used = spent_cents / limit_cents
+        if used >= 1:
+            level = 'over'
+        elif used >= warn_ratio:
+            level = 'warning'
+        else:
+            level = 'ok'
+        status.append({
+            'category': category,
+            'month': month,
+            'limit': limit_cents / 100,
+            'warn_ratio': warn_ratio,
+            'spent': spent_cents / 100,
+            'remaining': (limit_cents - spent_cents) / 100,
+            'used_pct': round(used * 100, 1),
+            'status': level,
+        })
+    return status
+
+
+def budget_alerts(conn, month=None):
+    """The budgets at warning or over for the month, most used first"""
+    alerts = [budget for budget in budget_status(conn, month) if budget['status'] != 'ok']
+    return sorted(alerts, key=lambda budget: budget['used_pct'], reverse=True)
+
+
+def set_budget(conn, category, limit, warn_ratio=DEFAULT_WARN_RATIO):
+    """Set a category's monthly limit in dollars; returns False for an unknown category.
+
+    The caller commits.
+    """
+    try:
+        limit_cents = round(float(limit) * 100)
+        warn_ratio = float(warn_ratio)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("Invalid limit or warn ratio")
+    if limit_cents <= 0:
+        raise ValueError("A budget limit must be positive")
+    if not 0 < warn_ratio <= 1:
+        raise ValueError("The warn ratio must be between 0 and 1")
+    return conn.execute(UPSERT_BUDGET, (limit_cents, warn_ratio, category)).rowcount > 0
+
+
+def remove_budget(conn, category):
+    """Remove a category's budget; returns False if it had none. The caller commits."""
+    return conn.execute(DELETE_BUDGET, (category,)).rowcount > 0
+
+
+def rebuild_stats(conn):
+    """Recompute the statistics and sketches from the expense_records table in one transaction"""
+    try:
+        conn.execute("BEGIN")
+        for statement in STATS_BACKFILL:
+            conn.execute(statement)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def verify_stats(conn):
+    """Return a list of mismatches between the statistics and the ledger (empty if consistent).
+
+    Counts and sketches must match exactly; means and m2 are running floating
+    point sums, so they only need to agree to nine significant digits.
+    """
+    categories = dict(conn.execute("SELECT id, name FROM categories").fetchall())
+    expected = {(row[0], row[1]): row[2:] for row in conn.execute(STATS_SUMMARY.format(table="expense_records"))}
+    actual = {(row[0], row[1]): row[2:] for row in conn.execute(
+        "SELECT month, category_id, count, mean, m2 FROM amount_stats")}
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        exp = expected.get(key, (0, 0.0, 0.0))
+        act = actual.get(key, (0, 0.0, 0.0))
+        close = all(math.isclose(e, a, rel_tol=1e-9, abs_tol=1e-6) for e, a in zip(exp[1:], act[1:]))
+        if exp[0] != act[0] or not close:
+            mismatches.append(f"stats {key[0]} {categories.get(key[1])}: expected {exp}, found {act}")
+
+    expected = {(row[0], row[1], row[2]): row[3] for row in conn.execute(
+        SKETCH_SUMMARY.format(table="expense_records"))}
+    actual = {(row[0], row[1], row[2]): row[3] for row in conn.execute(
+        "SELECT month, category_id, bucket, count FROM amount_sketch")}
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key, 0) != actual.get(key, 0):
+            mismatches.append(f"sketch {key[0]} {categories.get(key[1])} bucket {key[2]}: "
+                              f"expected {expected.get(key, 0)}, found {actual.get(key, 0)}")
+    return mismatches
+
+
+def format_stats(stats):
+    lines = [f"{'Category':<16}{'Count':>9}{'Total':>14}{'Mean':>10}{'Std dev':>10}"
+             f"{'Median':>10}{'p95':>10}{'p99':>10}"]
+    rows = list(stats['categories'].items()) + [("All", stats['all'])]
+    for name, summary in rows:
+        if not summary['count']:
+            continue
+        lines.append(f"{name:<16}{summary['count']:>9,}{summary['total']:>14,.2f}{summary['mean']:>10,.2f}"
+                     f"{summary['stddev']:>10,.2f}{summary.get('p50', 0):>10,.2f}"
+                     f"{summary.get('p95', 0):>10,.2f}{summary.get('p99', 0):>10,.2f}")
+
+    if stats['monthly']:
+        lines.append(f"\n{'Month':<10}{'Total':>14}{'Change':>14}")
+        for month in stats['monthly'][-12:]:
+            change = ""
+            if month['change'] is not None:
+                change = f"{month['change']:+,.2f}"
+                if month['change_pct'] is not None:
+                    change += f" ({month['change_pct']:+.1f}%)"
+            lines.append(f"{month['month']:<10}{month['total']:>14,.2f}  {change}")
+    return "\n".join(lines)
+
+
+def format_budgets(budgets):
+    if not budgets:
+        return "No budgets set."
+    lines = [f"{'Category':<16}{'Limit':>12}{'Spent':>12}{'Used':>8}  Status"]
+    for budget in budgets:
+        lines.append(f"{budget['category']:<16}{budget['limit']:>12,.2f}{budget['spent']:>12,.2f}"
+                     f"{budget['used_pct']:>7.1f}%  {budget['status'].upper()}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spending statistics and budgets")
+    parser.add_argument("--db", default="expenses.db", help="database file (default: expenses.db)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    show = subparsers.add_parser("show", help="statistics per category and month-over-month totals")
+    show.add_argument("--category")
+    show.add_argument("--from", dest="start", help="first month, YYYY-MM")
+    show.add_argument("--to", dest="end", help="last month, YYYY-MM")
+    budgets = subparsers.add_parser("budgets", help="spending against every budget")
+    budgets.add_argument("--month", help="YYYY-MM (default: this month)")
+    budget = subparsers.add_parser("budget", help="set or remove a category's monthly budget")
+    budget.add_argument("category")
+    budget.add_argument("limit", nargs="?", help="monthly limit in dollars")
+    budget.add_argument("--warn", type=float, default=DEFAULT_WARN_RATIO,
+                        help=f"share of the limit that raises a warning (default: {DEFAULT_WARN_RATIO})")
+    budget.add_argument("--remove", action="store_true")
+    subparsers.add_parser("verify", help="compare the statistics with a full aggregation")
+    subparsers.add_parser("rebuild", help="recompute the statistics from the expense records")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    migrate(conn)
+
+    try:
+        if args.command == "show":
+            print(format_stats(spending_stats(conn, args.start, args.end, args.category)))
+        elif args.command == "budgets":
+            print(format_budgets(budget_status(conn, args.month)))
+        elif args.command == "budget":
+            if args.remove:
+                found = remove_budget(conn, args.category)
+            elif args.limit is None:
+                parser.error("give a limit, or --remove")
+            else:
+                found = set_budget(conn, args.category, args.limit, args.warn)
+            conn.commit()
+            if not found:
+                parser.error(f"no budget or category named {args.category}")
+            print(format_budgets(budget_status(conn)))
+        else:
+            if args.command == "rebuild":
+                rebuild_stats(conn)
+                print("Statistics rebuilt.")
+            mismatches = verify_stats(conn)
+            if mismatches:
+                print(f"{len(mismatches)} statistics mismatches:")
+                for mismatch in mismatches[:50]:
+                    print(f"  {mismatch}")
+                sys.exit(1)
+            print("Statistics are consistent with the ledger.")
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
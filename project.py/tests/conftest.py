@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# The modules live flat in the project directory, next to this one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import generate_ledger  # noqa: E402
+from expense_repository import ExpenseRepository  # noqa: E402
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    """A small generated ledger at the latest schema version"""
+    path = str(tmp_path / "ledger.db")
+    generate_ledger(path, 600, years=2).close()
+    return path
+
+
+@pytest.fixture
+def repository(db_file):
+    repository = ExpenseRepository(db_file)
+    yield repository
+    repository.close()
+
+
+@pytest.fixture(scope="session")
+def web_module(tmp_path_factory):
+    """app_web, imported from an empty directory so its default ledger is a scratch one"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("web"))
+    try:
+        import app_web
+    finally:
+        os.chdir(cwd)
+    return app_web
+
+
+@pytest.fixture
+def web(web_module, repository, monkeypatch):
+    """A Flask test client serving the generated ledger"""
+    monkeypatch.setattr(web_module, "tracker", repository)
+    web_module.cache.clear()
+    return web_module.app.test_client()
+
+
+@pytest.fixture
+def asgi_get(web, web_module, repository, monkeypatch):
+    """Send a GET through asgi.app; returns (status, {header: value}, body)"""
+    import asgi
+
+    db = asgi.AsyncTracker(repository, max_workers=2)
+    monkeypatch.setattr(asgi, "tracker", repository)
+    monkeypatch.setattr(asgi, "db", db)
+    monkeypatch.setattr(asgi, "cache", asgi.VersionedCache())
+
+    def get(path, headers=None):
+        path, _, query = path.partition("?")
+        scope = {"type": "http", "method": "GET", "path": path, "query_string": query.encode(),
+                 "http_version": "1.1", "headers": [(name.lower().encode(), value.encode())
+                                                    for name, value in (headers or {}).items()]}
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(asgi.app(scope, receive, send))
+        start, body = messages[0], b"".join(message.get("body", b"") for message in messages[1:])
+        return start["status"], {name.decode(): value.decode() for name, value in start["headers"]}, body
+
+    yield get
+    db.close()
@@ -0,0 +1,104 @@
+import pytest
+
+from archive import attach_archives, close_months, list_archives, verify_archives
+from db import connect
+from rollups import verify_rollups
+
+SELECT_LEDGER = "SELECT id, amount_cents, category_id, description, ts FROM ledger_records ORDER BY id"
+SELECT_TOTALS = "SELECT category, total FROM category_totals ORDER BY category"
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = connect(db_file)
+    conn.isolation_level = None
+    yield conn
+    conn.close()
+
+
+def _archive_2024(conn):
+    attach_archives(conn)
+    before = conn.execute(SELECT_LEDGER).fetchall()
+    totals = conn.execute(SELECT_TOTALS).fetchall()
+    seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    version = conn.execute("SELECT version FROM data_version").fetchone()[0]
+    moved = close_months(conn, "2024-12", vacuum=False)
+    return before, totals, seq, version, moved
+
+
+def test_archived_rows_stay_in_ledger_records(conn):
+    before, totals, _, _, moved = _archive_2024(conn)
+    assert moved > 0
+
+    attach_archives(conn)
+    assert [tuple(row) for row in conn.execute(SELECT_LEDGER)] == [tuple(row) for row in before]
+    assert conn.execute(SELECT_TOTALS).fetchall() == totals
+    live = conn.execute("SELECT COUNT(*) FROM main.expense_records").fetchone()[0]
+    assert live == len(before) - moved
+    assert conn.execute(
+        "SELECT COUNT(*) FROM main.expense_records WHERE ts < strftime('%s', '2025-01-01')").fetchone()[0] == 0
+    assert verify_archives(conn) == []
+    assert verify_rollups(conn) == []
+    assert [archive['year'] for archive in list_archives(conn)] == [2024]
+
+
+def test_closing_again_moves_nothing_twice(conn):
+    before, _, _, _, moved = _archive_2024(conn)
+    assert moved > 0
+    assert close_months(conn, "2024-12", vacuum=False) == 0
+    attach_archives(conn)
+    assert len(conn.execute(SELECT_LEDGER).fetchall()) == len(before)
+    assert verify_archives(conn) == []
+
+
+def test_each_month_is_logged_as_one_reset(conn):
+    _, _, seq, version, _ = _archive_2024(conn)
+    ops = [row[0] for row in conn.execute("SELECT op FROM change_log WHERE seq > ? ORDER BY seq", (seq,))]
+    assert ops == ["reset"] * 12
+    assert conn.execute("SELECT version FROM data_version").fetchone()[0] == version + 12
+    assert conn.execute("SELECT COUNT(*) FROM change_log_paused").fetchone()[0] == 0
+
+
+def test_archived_expenses_are_read_only(conn, repository):
+    _archive_2024(conn)
+    page, _ = repository.get_expenses_page(after="2024-12-31 23:59:59|999999999", limit=10)
+    assert page and all(expense['archived'] for expense in page)
+    live, _ = repository.get_expenses_page(limit=10)
+    assert live and not any(expense['archived'] for expense in live)
+
+    archived_id = page[0]['id']
+    assert not repository.remove_expense(archived_id)
+    assert repository.is_archived(archived_id)
+    assert not repository.is_archived(live[0]['id'])
+    assert not repository.is_archived(10 ** 9)
+
+
+def test_rows_changed_after_the_copy_are_not_resurrected(conn, db_file, monkeypatch):
+    import archive
+
+    attach_archives(conn)
+    deleted, edited = [row[0] for row in conn.execute(
+        "SELECT id FROM expense_records WHERE ts < strftime('%s', '2024-02-01') ORDER BY id LIMIT 2")]
+    transaction = archive._transaction
+    calls = []
+
+    def change_after_copy(conn, statements):
+        transaction(conn, statements)
+        calls.append(statements)
+        if len(calls) == 1:
+            # Another writer, between the copy and January's switch-over
+            other = connect(db_file)
+            other.execute("DELETE FROM expense_records WHERE id = ?", (deleted,))
+            other.execute("UPDATE expense_records SET amount_cents = 123456, description = 'edited' WHERE id = ?",
+                          (edited,))
+            other.commit()
+            other.close()
+
+    monkeypatch.setattr(archive, "_transaction", change_after_copy)
+    close_months(conn, "2024-12", vacuum=False)
+
+    attach_archives(conn)
+    assert conn.execute("SELECT COUNT(*) FROM ledger_records WHERE id = ?", (deleted,)).fetchone()[0] == 0
+    assert tuple(conn.execute("SELECT amount_cents, description FROM ledger_records WHERE id = ?",
+                              (edited,)).fetchone()) == (123456, 'edited')
+    assert verify_archives(conn) == []
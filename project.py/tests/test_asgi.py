@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+NATIVE_PATHS = (
+    "/api/expenses?limit=20",
+    "/api/expenses?limit=5&category=Food",
+    "/api/category_totals",
+    "/api/monthly_totals",
+    "/api/trend?bucket=week&points=20",
+    "/api/stats?category=Food&from=2025-01&to=2025-06",
+)
+
+
+@pytest.mark.parametrize("path", NATIVE_PATHS)
+def test_native_routes_answer_like_flask(asgi_get, web, path):
+    status, headers, body = asgi_get(path)
+    assert (status, headers["content-type"]) == (200, "application/json")
+    assert json.loads(body) == web.get(path).get_json()
+
+
+@pytest.mark.parametrize("path", [
+    "/api/expenses?after=not-a-cursor",
+    "/api/trend?bucket=hour",
+    "/api/stats?from=2025-13",
+])
+def test_native_routes_reject_bad_arguments(asgi_get, path):
+    status, _, body = asgi_get(path)
+    assert status == 400
+    assert "error" in json.loads(body)
+
+
+def test_other_routes_are_served_by_flask(asgi_get, repository):
+    assert repository.add_expense(5, "Food", "zanzibar")
+    status, headers, body = asgi_get("/api/expenses/search?q=zanzibar")
+    assert status == 200
+    assert [expense["description"] for expense in json.loads(body)["expenses"]] == ["zanzibar"]
+
+    status, headers, body = asgi_get("/api/expenses/export?format=jsonl&category=Food")
+    assert status == 200 and headers["content-type"] == "application/jsonl"
+    assert len(body.splitlines()) == len(repository.get_expenses("Food"))
+
+
+def test_native_routes_are_timed(asgi_get, monkeypatch):
+    import asgi
+
+    recorded = []
+    monkeypatch.setattr(asgi, "METRICS_ENABLED", True)
+    monkeypatch.setattr(asgi, "record_request", lambda *args: recorded.append(args[:3]))
+    asgi_get("/api/category_totals")
+    asgi_get("/api/trend?bucket=hour")
+    assert recorded == [("/api/category_totals", "GET", 200), ("/api/trend", "GET", 400)]
+
+
+def test_lifespan(web_module, monkeypatch):
+    import asgi
+
+    closed = []
+    monkeypatch.setattr(asgi.db, "close", lambda: closed.append(True))
+    messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+    sent = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(asgi.app({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert closed == [True]
@@ -0,0 +1,122 @@
+import gzip
+import os
+import posixpath
+import shutil
+import subprocess
+
+import pytest
+
+import assets
+from assets import AssetManifest, build, minify_css, minify_js
+
+node = shutil.which("node")
+needs_node = pytest.mark.skipif(node is None, reason="node is not installed")
+
+JS_CASES = {
+    "comments in strings": 'const a = "http://x.y/*z*/"; // tail\nconsole.log(a, \'//\', "/*", \'*/\');',
+    "template literals": 'const n = 2;\nconsole.log(`a // ${n /* two */ + 1} ${`in ${"}"}`} /* x */`);',
+    "regex literals": 'const r = /\\/\\/[^/]*\\/*/g;\nconsole.log("a//b/".replace(r, "-"), /[/]/.test("/"), '
+                      '"4/2/1".split(/\\//), 4 / 2 / 1);\nfunction f(s) { return /ab+c/i.test(s) }\n'
+                      'console.log(f("ABBC"), typeof /x/);',
+    "semicolon insertion": 'let a = 1\nlet b = a\n++a\nconsole.log(a, b)\nconst c = a\n'
+                           ';[1, 2].forEach(v => console.log(v + c))',
+    "adjacent operators": 'let i = 1; console.log(i + +i, i - -i, i++ + ++i)',
+}
+
+
+def _run(source):
+    return subprocess.run([node, "-e", source], capture_output=True, text=True, timeout=30)
+
+
+@needs_node
+@pytest.mark.parametrize("source", JS_CASES.values(), ids=JS_CASES.keys())
+def test_minified_js_runs_the_same(source):
+    expected = _run(source)
+    assert expected.returncode == 0, expected.stderr
+    actual = _run(minify_js(source))
+    assert (actual.returncode, actual.stdout) == (0, expected.stdout)
+
+
+@pytest.mark.parametrize("css, expected", [
+    ('a::before { content: "/* not a comment */"; }', 'a::before{content:"/* not a comment */"}'),
+    ('.y { content: "a , b ; c" }', '.y{content:"a , b ; c"}'),
+    ("q { content: 'it\\'s  // x' }", "q{content:'it\\'s  // x'}"),
+    ('.x { background: url( "a b.png" ) }', '.x{background:url("a b.png")}'),
+    (".i { background: url(data:image/svg+xml;utf8,<svg  x='1'></svg>) }",
+     ".i{background:url(data:image/svg+xml;utf8,<svg  x='1'></svg>)}"),
+    ("a > b , c { margin : 0 ; } /* note */ /*! License  */", "a>b,c{margin :0}/*! License  */"),
+    (".a/**/.b { width: calc(1px + 2px) }", ".a.b{width:calc(1px + 2px)}"),
+])
+def test_minify_css(css, expected):
+    assert minify_css(css) == expected + "\n"
+
+
+@pytest.mark.parametrize("name", [name for name in assets.ASSETS if name.endswith((".css", ".js"))
+                                  and ".min." not in name])
+def test_shipped_sources_minify_stably(name):
+    with open(os.path.join(assets.STATIC_DIR, name), encoding="utf-8") as f:
+        source = f.read()
+    minify = minify_css if name.endswith(".css") else minify_js
+    minified = minify(source)
+    assert len(minified) < len(source)
+    assert minify(minified) == minified
+    if name.endswith(".css"):
+        assert minified.count("{") == minified.count("}") == source.count("{")
+    elif node is not None:
+        check = subprocess.run([node, "--check"], input=minified, capture_output=True, text=True, timeout=30)
+        assert check.returncode == 0, check.stderr
+
+
+@pytest.fixture
+def dist(tmp_path):
+    return str(tmp_path / "dist")
+
+
+def test_build_writes_hashed_and_precompressed_copies(dist):
+    files = build(dist_dir=dist)
+    assert set(files) == set(assets.ASSETS)
+    style = files["css/style.css"]
+    assert style["file"].startswith("css/style.") and style["file"].endswith(".css")
+    with open(os.path.join(dist, style["file"]), "rb") as f:
+        data = f.read()
+    assert assets.hashed_name("css/style.css", data) == style["file"]
+    with open(os.path.join(dist, style["file"] + ".gz"), "rb") as f:
+        assert gzip.decompress(f.read()) == data
+    # The stylesheets load the hashed fonts
+    with open(os.path.join(dist, files["vendor/fontawesome/css/all.min.css"]["file"]), encoding="utf-8") as f:
+        icons = f.read()
+    assert posixpath.basename(files["vendor/fontawesome/webfonts/fa-solid-900.woff2"]["file"]) in icons
+
+
+def test_asset_url_resolves_through_the_manifest(web, web_module, dist, monkeypatch):
+    monkeypatch.setattr(web_module, "asset_manifest", AssetManifest(dist_dir=dist))
+    with web_module.app.test_request_context():
+        assert web_module.asset_url("js/main.js") == "/static/js/main.js"
+
+    files = build(dist_dir=dist)
+    manifest = AssetManifest(dist_dir=dist)
+    monkeypatch.setattr(web_module, "asset_manifest", manifest)
+    hashed = files["js/main.js"]["file"]
+    with web_module.app.test_request_context():
+        assert web_module.asset_url("js/main.js") == f"/assets/{hashed}"
+
+    response = web.get(f"/assets/{hashed}", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Cache-Control"] == assets.IMMUTABLE_CACHE_CONTROL
+    with open(os.path.join(dist, hashed), "rb") as f:
+        assert gzip.decompress(response.get_data()) == f.read()
+    assert web.get("/assets/js/main.js").status_code == 404
+
+
+def test_an_edited_source_falls_back_to_static(dist, tmp_path):
+    static = tmp_path / "static"
+    (static / "js").mkdir(parents=True)
+    source = static / "js" / "app.js"
+    source.write_text("console.log( 1 )\n")
+    build(static_dir=str(static), dist_dir=dist, names=("js/app.js",))
+    assert AssetManifest(dist, str(static)).lookup("js/app.js") is not None
+
+    mtime = os.stat(source).st_mtime + 10
+    os.utime(source, (mtime, mtime))
+    assert AssetManifest(dist, str(static)).lookup("js/app.js") is None
@@ -0,0 +1,87 @@
+import contextlib
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from benchmark import compare_results, flatten_results, generate_ledger, suite_micro
+from expense_repository import get_repository
+from loadtest import percentile, run_load
+from migrations import LATEST_VERSION
+
+SELECT_ROWS = "SELECT amount_cents, category_id, description, ts FROM expense_records ORDER BY id"
+
+
+def test_generated_ledgers_are_reproducible(tmp_path):
+    first = generate_ledger(str(tmp_path / "a.db"), 300, seed=7, years=1)
+    second = generate_ledger(str(tmp_path / "b.db"), 300, seed=7, years=1)
+    other = generate_ledger(str(tmp_path / "c.db"), 300, seed=8, years=1)
+    try:
+        rows = first.execute(SELECT_ROWS).fetchall()
+        assert len(rows) == 300
+        assert second.execute(SELECT_ROWS).fetchall() == rows
+        assert other.execute(SELECT_ROWS).fetchall() != rows
+        assert first.execute("PRAGMA user_version").fetchone()[0] == LATEST_VERSION
+    finally:
+        for conn in (first, second, other):
+            conn.close()
+
+
+def test_percentile():
+    assert percentile([], 0.5) == 0.0
+    values = list(range(101))
+    assert [percentile(values, fraction) for fraction in (0, 0.5, 0.99, 1)] == [0, 50, 99, 100]
+
+
+def _results(ms, p99_ms):
+    return {"1000": {"micro": {"get_total": ms}, "http": {"/": {"cold_ms": 1.0, "p50_ms": 1.0, "p99_ms": p99_ms}}}}
+
+
+def test_regressions_need_both_a_ratio_and_a_delta():
+    assert set(flatten_results(_results(2.0, 3.0))) == {
+        "1000/micro/get_total/ms", "1000/http///cold_ms", "1000/http///p50_ms", "1000/http///p99_ms"}
+    with contextlib.redirect_stdout(io.StringIO()):
+        # get_total doubled but by only 0.2 ms; p99 grew by 50% and 10 ms
+        regressions = compare_results(_results(0.4, 30.0), _results(0.2, 20.0), threshold=0.25, min_delta_ms=1.0)
+    assert regressions == ["1000/http///p99_ms"]
+
+
+def test_suite_times_every_method(db_file):
+    try:
+        timings = suite_micro(db_file, 600, repeat=1)
+    finally:
+        get_repository(db_file).close()
+    assert "get_expenses" in timings and "generate_monthly_report" in timings
+    assert all(ms >= 0 for ms in timings.values())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status = 404 if self.path == "/missing" else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_load_test_counts_requests_and_errors(server):
+    result = run_load(server, ["/", "/missing"], concurrency=4, total_requests=40, warmup=2)
+    assert (result["requests"], result["errors"], result["concurrency"]) == (40, 20, 4)
+    assert 0 < result["p50_ms"] <= result["p90_ms"] <= result["p99_ms"] <= result["max_ms"]
@@ -0,0 +1,97 @@
+import gzip
+import json
+
+import pytest
+
+from cache import DataVersion, VersionedCache
+from db import ConnectionPool, connect
+
+
+def test_entries_are_valid_for_their_version():
+    cache = VersionedCache(maxsize=2)
+    calls = []
+
+    def compute(value):
+        return lambda: calls.append(value) or value
+
+    assert cache.get_or_compute("a", 1, compute("a1")) == "a1"
+    assert cache.get_or_compute("a", 1, compute("again")) == "a1"
+    assert cache.get_or_compute("a", 2, compute("a2")) == "a2"
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # Least recently used first out
+    cache.get_or_compute("b", 2, compute("b"))
+    cache.get_or_compute("a", 2, compute("unused"))
+    cache.get_or_compute("c", 2, compute("c"))
+    assert cache.get_or_compute("a", 2, compute("unused")) == "a2"
+    assert cache.get_or_compute("b", 2, compute("b again")) == "b again"
+    assert calls == ["a1", "a2", "b", "c", "b again"]
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("cache.time.monotonic", lambda: now[0])
+    cache = VersionedCache(ttl=5)
+    cache.get_or_compute("k", 1, lambda: "old")
+    now[0] += 4
+    assert cache.get_or_compute("k", 1, lambda: "new") == "old"
+    now[0] += 2
+    assert cache.get_or_compute("k", 1, lambda: "new") == "new"
+
+
+def test_data_version_follows_writes(db_file):
+    pool = ConnectionPool(db_file, 2)
+    version = DataVersion(pool, ttl=60)
+    woken = []
+    version.add_listener(lambda: woken.append(True))
+    try:
+        before = version.current()
+        conn = connect(db_file)
+        conn.execute("DELETE FROM expense_records WHERE id = 1")
+        conn.commit()
+        conn.close()
+        # Another process's write is seen once the ttl has passed, or at once after invalidate()
+        assert version.current() == before
+        version.invalidate()
+        assert version.current() > before
+        assert woken == [True]
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize("encoding", [None, "gzip"])
+def test_api_results_are_revalidated_by_etag(web, repository, encoding):
+    headers = {"Accept-Encoding": encoding} if encoding else {}
+    path = "/api/expenses?limit=100"
+    first = web.get(path, headers=headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert first.headers.get("Content-Encoding") == encoding
+
+    again = web.get(path, headers={**headers, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+
+    assert repository.add_expense(5, "Food", "changes the version")
+    changed = web.get(path, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    body = changed.get_data()
+    if encoding:
+        body = gzip.decompress(body)
+    assert json.loads(body)["expenses"][0]["description"] == "changes the version"
+
+
+@pytest.mark.parametrize("encoding", [None, "gzip"])
+def test_asgi_results_are_revalidated_by_etag(asgi_get, repository, encoding):
+    headers = {"Accept-Encoding": encoding} if encoding else {}
+    status, first, _ = asgi_get("/api/expenses?limit=100", headers)
+    etag = first["etag"]
+    assert (status, etag.startswith("W/")) == (200, encoding is not None)
+
+    status, again, body = asgi_get("/api/expenses?limit=100", {**headers, "If-None-Match": etag})
+    assert (status, again["etag"], body) == (304, etag, b"")
+
+    assert repository.add_expense(5, "Food", "changes the version")
+    status, changed, _ = asgi_get("/api/expenses?limit=100", {**headers, "If-None-Match": etag})
+    assert status == 200 and changed["etag"] != etag
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from archive import close_months
+from changefeed import ChangeFeed, Subscription
+from db import connect
+
+
+def _parse(event):
+    fields = dict(line.split(": ", 1) for line in event.decode().strip().split("\n"))
+    return fields["event"], int(fields["id"]), json.loads(fields["data"])
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def feed(repository):
+    return ChangeFeed(repository, poll_interval=0.05)
+
+
+def test_writes_are_batched_into_one_event(repository, feed):
+    start = repository.get_change_seq()
+    assert repository.add_expense(12.5, "Food", "kept")
+    assert repository.add_expense(3, "Transportation", "dropped")
+    seq = repository.get_change_seq()
+    dropped = repository.get_changes(seq - 1, 1)[0]["expense_id"]
+    assert repository.remove_expense(dropped)
+
+    event, end = feed._read(start)
+    name, event_id, data = _parse(event)
+    assert (name, event_id, end) == ("change", repository.get_change_seq(), event_id)
+    # The row added and removed in the same batch is never sent
+    assert [row["description"] for row in data["inserted"]] == ["kept"]
+    assert data["deleted"] == []
+    assert data["total"] == repository.get_total()
+
+    # Nothing new: no event
+    assert feed._read(end) == (None, end)
+
+
+def test_last_event_id_resumes_with_the_missed_changes(repository, feed):
+    seen = Subscription(lambda: None)
+    feed.subscribe(seen)
+    try:
+        resumed_from = feed.seq
+        repository.add_expense(7, "Food", "missed")
+        assert _wait_for(lambda: feed.seq > resumed_from)
+
+        # A client reconnecting with the id of the last event it saw gets the rest first
+        resumed = Subscription(lambda: None)
+        feed.subscribe(resumed, resumed_from)
+        name, event_id, data = _parse(resumed.take()[0])
+        assert (name, event_id) == ("change", feed.seq)
+        assert [row["description"] for row in data["inserted"]] == ["missed"]
+
+        # The live subscriber saw the same event
+        assert [_parse(event)[2]["inserted"] for event in seen.take()] == [data["inserted"]]
+        feed.unsubscribe(resumed)
+    finally:
+        feed.unsubscribe(seen)
+
+
+def test_a_gap_in_the_change_log_sends_a_reset(repository, feed, db_file):
+    start = repository.get_change_seq()
+    for description in ("one", "two", "three"):
+        repository.add_expense(1, "Food", description)
+    conn = connect(db_file)
+    conn.execute("DELETE FROM change_log WHERE seq <= ?", (start + 1,))
+    conn.commit()
+    conn.close()
+
+    event, seq = feed._read(start)
+    assert _parse(event)[:2] == ("reset", seq)
+    assert seq == repository.get_change_seq()
+
+
+def test_an_archive_move_sends_a_reset(repository, feed, db_file):
+    start = repository.get_change_seq()
+    conn = connect(db_file)
+    conn.isolation_level = None
+    assert close_months(conn, "2024-12", vacuum=False) > 0
+    conn.close()
+
+    event, seq = feed._read(start)
+    assert _parse(event)[:2] == ("reset", seq)
+    assert seq == repository.get_change_seq()
+
+
+def test_a_slow_subscriber_is_sent_a_reset():
+    subscription = Subscription(lambda: None, max_pending=2)
+    subscription.put(1, b"one")
+    subscription.put(2, b"two")
+    subscription.put(3, b"three")
+    [event] = subscription.take()
+    assert _parse(event)[:2] == ("reset", 3)
+
+
+def test_the_thread_stops_with_the_last_subscriber(feed):
+    subscriptions = [Subscription(lambda: None) for _ in range(2)]
+    for subscription in subscriptions:
+        feed.subscribe(subscription)
+    thread = feed._thread
+    assert thread.is_alive()
+
+    for subscription in subscriptions:
+        feed.unsubscribe(subscription)
+    thread.join(5)
+    assert not thread.is_alive()
+    assert feed._thread is None and not feed._subscriptions
+
+
+def test_asgi_stream_unsubscribes_on_disconnect(web_module, repository, feed, monkeypatch):
+    import asgi
+
+    db = asgi.AsyncTracker(repository, max_workers=2)
+    monkeypatch.setattr(asgi, "db", db)
+    monkeypatch.setattr(asgi, "change_feed", feed)
+    start = repository.get_change_seq()
+    sent = []
+    disconnect = asyncio.Event()
+
+    async def receive():
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if b"event: change" in message.get("body", b""):
+            disconnect.set()
+
+    async def client():
+        scope = {"type": "http", "headers": [(b"last-event-id", str(start).encode())], "query_string": b""}
+        stream = asyncio.ensure_future(asgi.api_stream(scope, receive, send))
+        while not feed._subscriptions:
+            await asyncio.sleep(0.01)
+        await db.run(repository.add_expense, 4, "Food", "streamed")
+        await asyncio.wait_for(stream, 5)
+
+    try:
+        asyncio.run(client())
+    finally:
+        db.close()
+
+    assert sent[0]["status"] == 200
+    events = [_parse(message["body"]) for message in sent[2:] if b"event:" in message["body"]]
+    assert [data["inserted"][0]["description"] for name, _, data in events] == ["streamed"]
+    assert not feed._subscriptions
+    assert _wait_for(lambda: feed._thread is None)
@@ -0,0 +1,58 @@
+import pytest
+
+from charts import ChartRenderer, render_chart
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+DATA = {
+    "category": {"Food": 120.5, "Housing": 900.0, "Other": 0.0},
+    "monthly": {"2025-02": 300.0, "2025-01": 250.0},
+    "trend": (["2025-01-01", "2025-01-02", "2025-01-05"], [10.0, 25.5, 40.0]),
+}
+EMPTY = {"category": {"Food": 0}, "monthly": {}, "trend": ([], [])}
+
+
+@pytest.mark.parametrize("kind", DATA)
+def test_charts_render_with_and_without_data(kind):
+    assert render_chart(kind, DATA[kind]).startswith(PNG)
+    assert render_chart(kind, EMPTY[kind]).startswith(PNG)
+    assert b"<svg" in render_chart(kind, DATA[kind], "svg")
+
+
+def test_renders_are_cached_per_version():
+    renderer = ChartRenderer(max_workers=0)
+    loads = []
+
+    def load():
+        loads.append(True)
+        return DATA["monthly"]
+
+    first = renderer.render("monthly", "png", 1, load)
+    assert renderer.render("monthly", "png", 1, load) is first
+    renderer.render("monthly", "svg", 1, load)
+    renderer.render("monthly", "png", 2, load)
+    assert len(loads) == 3
+
+
+def test_worker_processes_render_in_job_order():
+    renderer = ChartRenderer(max_workers=2)
+    try:
+        images = renderer.render_many([(kind, DATA[kind], "svg") for kind in DATA])
+        titles = ("Expenses by Category", "Monthly Expenses", "Expense Trend Over Time")
+        assert [f"<!-- {title} -->".encode() in image for image, title in zip(images, titles)] == [True] * 3
+    finally:
+        renderer.close()
+
+
+def test_chart_route(web, web_module, monkeypatch):
+    monkeypatch.setattr(web_module, "chart_renderer", ChartRenderer(max_workers=0))
+    response = web.get("/analytics/chart/category.png")
+    assert response.status_code == 200
+    assert response.mimetype == "image/png"
+    assert response.get_data().startswith(PNG)
+
+    etag = response.headers["ETag"]
+    assert web.get("/analytics/chart/category.png", headers={"If-None-Match": etag}).status_code == 304
+    assert web.get("/analytics/chart/trend.svg").mimetype == "image/svg+xml"
+    assert web.get("/analytics/chart/pie.png").status_code == 404
+    assert web.get("/analytics/chart/category.gif").status_code == 404
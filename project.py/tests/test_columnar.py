@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from columnar import category_totals, cumulative_totals, empty_columns, load_columns, monthly_totals
+from db import connect
+from expense_analyzer import ExpenseAnalyzer
+
+SELECT_ROWS = '''
+    SELECT r.id, r.amount_cents, c.name, r.ts
+    FROM expense_records r JOIN categories c ON c.id = r.category_id
+    ORDER BY r.ts, r.id
+'''
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = connect(db_file)
+    yield conn
+    conn.close()
+
+
+def test_columns_match_the_rows(conn):
+    rows = conn.execute(SELECT_ROWS).fetchall()
+    columns = load_columns(conn)
+
+    assert columns.ids.tolist() == [row[0] for row in rows]
+    assert columns.amounts.tolist() == pytest.approx([row[1] / 100 for row in rows])
+    assert columns.timestamps.astype(np.int64).tolist() == [row[3] for row in rows]
+    assert columns.categories == sorted(columns.categories)
+    assert [columns.categories[code] for code in columns.category_codes] == [row[2] for row in rows]
+    assert cumulative_totals(columns)[-1] == pytest.approx(sum(row[1] for row in rows) / 100)
+
+
+def test_totals_match_the_rollups(repository, conn):
+    columns = load_columns(conn)
+    assert category_totals(columns) == pytest.approx(repository.get_stored_category_totals())
+    monthly = monthly_totals(columns)
+    assert list(monthly) == sorted(monthly)
+    assert monthly == pytest.approx(repository.get_monthly_totals())
+
+
+def test_date_range(conn):
+    columns = load_columns(conn, "2025-03-01", "2025-04-01")
+    assert len(columns.ids)
+    assert list(monthly_totals(columns)) == ["2025-03"]
+    expected = conn.execute(
+        "SELECT COUNT(*) FROM expense_records WHERE ts >= strftime('%s', '2025-03-01') "
+        "AND ts < strftime('%s', '2025-04-01')").fetchone()[0]
+    assert len(columns.ids) == expected
+
+
+def test_an_empty_range(conn):
+    columns = load_columns(conn, "2030-01-01", "2030-02-01")
+    assert [len(column) for column in columns] == [len(column) for column in empty_columns()]
+    assert category_totals(columns) == {}
+    assert monthly_totals(columns) == {}
+
+
+def test_analyzer_plots_the_trend(db_file, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analyzer = ExpenseAnalyzer(db_file)
+    try:
+        analyzer.plot_expense_trend()
+    finally:
+        analyzer.repository.close()
+    with open(tmp_path / "expense_trend.png", "rb") as f:
+        assert f.read(8) == b"\x89PNG\r\n\x1a\n"
@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+from benchmark import generate_ledger
+from compact import COMPACT_VERSION, compact_online
+from migrations import LATEST_VERSION, get_schema_version, migrate
+from rollups import verify_rollups
+
+SELECT_EXPENSES = "SELECT id, amount, category, description, date FROM expenses ORDER BY id"
+
+# Writes made while the copy runs: to copied rows, rows not copied yet and new rows
+WRITES = [
+    "INSERT INTO expenses (amount, category, description, date) "
+    "VALUES (12.34, 'Food', 'during', '2025-06-01 10:00:00')",
+    "UPDATE expenses SET amount = 99.99, description = 'edited' WHERE id = 3",
+    "UPDATE expenses SET category = 'Gifts' WHERE id = 450",
+    "DELETE FROM expenses WHERE id IN (5, 460)",
+]
+
+
+def _text_ledger(path):
+    conn = generate_ledger(str(path), 500, seed=3, target=COMPACT_VERSION - 1, years=1)
+    conn.close()
+    return sqlite3.connect(str(path), isolation_level=None)
+
+
+@pytest.fixture
+def ledgers(tmp_path):
+    online, offline = _text_ledger(tmp_path / "online.db"), _text_ledger(tmp_path / "offline.db")
+    yield online, offline
+    online.close()
+    offline.close()
+
+
+def test_online_compaction_matches_the_migration(ledgers):
+    online, offline = ledgers
+    progress = []
+
+    def write_during_copy(done, high):
+        if not progress:
+            for statement in WRITES:
+                online.execute(statement)
+        progress.append((done, high))
+
+    copied = compact_online(online, batch_size=100, pause=0, progress=write_during_copy)
+    for statement in WRITES:
+        offline.execute(statement)
+    migrate(offline, COMPACT_VERSION)
+
+    assert progress == [(100, 500), (200, 500), (300, 500), (400, 500), (500, 500)]
+    # The writes came after the first batch; row 460 was deleted before its batch was copied
+    assert copied == 500 - 1
+    assert get_schema_version(online) == COMPACT_VERSION
+    assert online.execute(SELECT_EXPENSES).fetchall() == offline.execute(SELECT_EXPENSES).fetchall()
+    assert verify_rollups(online) == []
+
+    # No mirroring triggers are left behind, and later migrations apply as usual
+    assert online.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'expenses_compact_%'").fetchall() == []
+    migrate(online)
+    assert get_schema_version(online) == LATEST_VERSION
+
+
+def test_compacted_ledgers_are_left_alone(ledgers):
+    online, _ = ledgers
+    compact_online(online, pause=0)
+    assert compact_online(online, pause=0) == 0
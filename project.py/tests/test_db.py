@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+
+import pytest
+
+from db import ConnectionPool, close_pool, connect, get_pool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=2)
+    yield pool
+    pool.close()
+
+
+def _is_open(conn):
+    try:
+        conn.execute("SELECT 1")
+    except sqlite3.ProgrammingError:
+        return False
+    return True
+
+
+def test_connections_are_tuned(tmp_path):
+    conn = connect(str(tmp_path / "tuned.db"))
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+        assert isinstance(conn.execute("SELECT 1 AS one").fetchone(), sqlite3.Row)
+    finally:
+        conn.close()
+
+
+def test_idle_connections_are_reused(pool):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    assert pool.opened == 1
+
+
+def test_busy_pool_opens_extra_connections_and_closes_them(pool):
+    held = [pool.acquire() for _ in range(3)]
+    assert pool.opened == 3
+    for conn in held:
+        pool.release(conn)
+    # Only size connections are kept
+    assert [_is_open(conn) for conn in held] == [True, True, False]
+
+
+def test_release_rolls_back_an_open_transaction(pool):
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+    with pool.connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_connections_move_between_threads(pool):
+    conn = pool.acquire()
+    pool.release(conn)
+    results = []
+
+    def use():
+        with pool.connection() as conn:
+            results.append(conn.execute("SELECT 1").fetchone()[0])
+
+    thread = threading.Thread(target=use)
+    thread.start()
+    thread.join(5)
+    assert results == [1]
+
+
+def test_close_closes_idle_and_released_connections(pool):
+    idle = pool.acquire()
+    busy = pool.acquire()
+    pool.release(idle)
+    pool.close()
+    assert not _is_open(idle)
+    assert _is_open(busy)
+    pool.release(busy)
+    assert not _is_open(busy)
+
+
+def test_shared_pools(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pool = get_pool("shared.db")
+    assert get_pool(str(tmp_path / "shared.db")) is pool
+    close_pool(pool)
+    assert pool._closed
+    assert get_pool("shared.db") is not pool
+    close_pool(get_pool("shared.db"))
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from expense_analyzer import ExpenseAnalyzer
+from expense_repository import DEFAULT_CATEGORIES, ExpenseRepository, get_repository
+
+
+def test_add_and_remove_round_trip(repository):
+    before = repository.get_total()
+    assert repository.add_expense("19.99", "Food", "groceries")
+    expenses, _ = repository.get_expenses_page(limit=1)
+    added = expenses[0]
+    assert (added['amount'], added['category'], added['description']) == (19.99, "Food", "groceries")
+    assert round(repository.get_total() - before, 2) == 19.99
+
+    assert repository.remove_expense(added['id'])
+    assert not repository.remove_expense(added['id'])
+    assert round(repository.get_total(), 2) == round(before, 2)
+
+
+def test_unknown_category_is_refused(repository):
+    assert not repository.add_expense(5, "Yachts")
+
+
+def test_new_ledger_gets_the_default_categories(tmp_path):
+    repository = ExpenseRepository(str(tmp_path / "new.db"))
+    try:
+        assert set(repository.get_category_totals()) == set(DEFAULT_CATEGORIES)
+        assert repository.get_total() in (0, None)
+    finally:
+        repository.close()
+
+
+def test_get_repository_shares_one_instance(db_file):
+    repository = get_repository(db_file)
+    try:
+        assert get_repository(db_file) is repository
+    finally:
+        repository.close()
+    assert get_repository(db_file) is not repository
+    get_repository(db_file).close()
+
+
+def test_analyzer_reads_through_the_repository(db_file):
+    analyzer = ExpenseAnalyzer(db_file)
+    try:
+        assert analyzer.get_category_totals() == analyzer.repository.get_stored_category_totals()
+        assert set(analyzer.get_categories()) <= set(DEFAULT_CATEGORIES)
+    finally:
+        analyzer.repository.close()
+
+
+def test_analyzer_does_not_create_a_missing_ledger(tmp_path):
+    missing = str(tmp_path / "missing.db")
+    with pytest.raises(FileNotFoundError):
+        ExpenseAnalyzer(missing)
+    assert not os.path.exists(missing)
@@ -0,0 +1,77 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from db import connect
+from exporter import gzip_chunks, iter_csv, iter_export, iter_jsonl
+from importer import import_expenses, read_csv
+
+ROWS = [
+    {"id": 1, "amount": 12.5, "category": "Food", "description": 'Lunch, "with" friends',
+     "date": "2025-03-04 00:00:00"},
+    {"id": 2, "amount": 7.0, "category": "Other", "description": "", "date": "2025-03-05 08:30:00"},
+]
+
+
+def test_csv_and_jsonl_chunks():
+    chunks = list(iter_csv([ROWS[:1], ROWS[1:]]))
+    assert len(chunks) == 2
+    records = list(csv.DictReader(io.StringIO(b"".join(chunks).decode(), newline="")))
+    assert [record["description"] for record in records] == [row["description"] for row in ROWS]
+
+    assert list(iter_csv([])) == [b"id,amount,category,description,date\r\n"]
+    lines = b"".join(iter_jsonl([ROWS])).decode().splitlines()
+    assert [json.loads(line) for line in lines] == ROWS
+    with pytest.raises(ValueError):
+        iter_export([ROWS], "xml")
+
+
+def test_gzip_chunks_make_one_stream():
+    chunks = [f"chunk {index}\n".encode() * 50 for index in range(20)]
+    assert gzip.decompress(b"".join(gzip_chunks(iter(chunks)))) == b"".join(chunks)
+
+
+def test_export_is_fetched_in_batches(repository):
+    batches = repository.iter_expenses(batch_size=100)
+    first = next(batches)
+    assert len(first) == 100
+    rows = first + [row for batch in batches for row in batch]
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+    assert sum(row["amount"] for row in rows) == pytest.approx(repository.get_total())
+
+
+@pytest.mark.parametrize("gzipped", [False, True])
+def test_exported_csv_imports_into_a_new_ledger(web, repository, db_file, tmp_path, gzipped):
+    response = web.get("/api/expenses/export?format=csv" + ("&gzip=1" if gzipped else ""))
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == "attachment; filename=expenses.csv"
+    body = response.get_data()
+    if gzipped:
+        assert response.headers["Content-Encoding"] == "gzip"
+        body = gzip.decompress(body)
+
+    # An empty copy of the ledger, with its categories
+    copy = str(tmp_path / "copy.db")
+    conn = connect(db_file)
+    conn.execute("VACUUM INTO ?", (copy,))
+    conn.close()
+    conn = connect(copy)
+    conn.execute("DELETE FROM expense_records")
+    conn.commit()
+    result = import_expenses(conn, read_csv(io.StringIO(body.decode(), newline="")))
+    imported = conn.execute("SELECT SUM(amount_cents) FROM expense_records").fetchone()[0]
+    conn.close()
+
+    assert (result.inserted, result.rejected) == (len(repository.get_expenses()), 0)
+    assert imported / 100 == pytest.approx(repository.get_total())
+
+
+def test_export_filters_by_category(web, repository):
+    response = web.get("/api/expenses/export?format=ndjson&category=Food")
+    assert response.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert rows and {row["category"] for row in rows} == {"Food"}
+    assert web.get("/api/expenses/export?format=xml").status_code == 400
@@ -0,0 +1,96 @@
+import io
+import json
+
+import pytest
+
+from db import connect
+from importer import import_expenses, read_csv, read_jsonl
+
+CSV = """amount,category,description,date
+12.50,Food,"Lunch, with ""friends\"\"",2025-03-04
+7,Transportation,,2025-03-05 08:30:00
+"""
+
+ROWS = [
+    (12.5, "Food", 'Lunch, with "friends"', "2025-03-04 00:00:00"),
+    (7.0, "Transportation", "", "2025-03-05 08:30:00"),
+]
+
+SELECT_IMPORTED = '''
+    SELECT amount_cents / 100.0, c.name, description, datetime(ts, 'unixepoch')
+    FROM expense_records r JOIN categories c ON c.id = r.category_id
+    WHERE r.id > ? ORDER BY r.id
+'''
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = connect(db_file)
+    yield conn
+    conn.close()
+
+
+def _imported(conn, after):
+    return [tuple(row) for row in conn.execute(SELECT_IMPORTED, (after,))]
+
+
+def _last_id(conn):
+    return conn.execute("SELECT MAX(id) FROM expense_records").fetchone()[0]
+
+
+def test_csv_round_trips(conn):
+    last = _last_id(conn)
+    result = import_expenses(conn, read_csv(io.StringIO(CSV, newline="")), batch_size=1)
+    assert (result.inserted, result.rejected) == (2, 0)
+    assert _imported(conn, last) == ROWS
+
+
+def test_jsonl_round_trips(conn):
+    last = _last_id(conn)
+    lines = [json.dumps({"amount": amount, "category": category, "description": description, "date": date})
+             for amount, category, description, date in ROWS]
+    result = import_expenses(conn, read_jsonl(io.StringIO("\n".join(lines) + "\n\n")))
+    assert (result.inserted, result.rejected) == (2, 0)
+    assert _imported(conn, last) == ROWS
+
+
+@pytest.mark.parametrize("record, reason", [
+    ({"amount": "nan", "category": "Food"}, "Invalid amount"),
+    ({"amount": "inf", "category": "Food"}, "Invalid amount"),
+    ({"amount": "ten", "category": "Food"}, "Invalid amount"),
+    ({"category": "Food"}, "Invalid amount"),
+    ({"amount": 1, "category": "Snacks"}, "Unknown category: Snacks"),
+    ({"amount": 1, "category": "Food", "date": "2025-02-30"}, "Invalid date: 2025-02-30"),
+    ({"amount": 1, "category": "Food", "date": 20250101}, "Invalid date: 20250101"),
+    ([1, "Food"], "Record is not an object"),
+])
+def test_a_bad_record_rejects_the_whole_file(conn, record, reason):
+    last = _last_id(conn)
+    good = {"amount": 1, "category": "Food", "description": "good"}
+    lines = [json.dumps(good)] * 3 + [json.dumps(record)] + [json.dumps(good)] * 3
+    # Batches before the bad record have been written, and are rolled back
+    result = import_expenses(conn, read_jsonl(lines), batch_size=2)
+    assert (result.inserted, result.rejected) == (0, 1)
+    assert result.rejects == [{"record": 4, "reason": reason}]
+    assert _last_id(conn) == last
+    assert not conn.in_transaction
+
+
+def test_every_reject_is_reported(conn):
+    result = import_expenses(conn, read_jsonl(['{"amount": 1, "category": "Food"}', "{oops", "[]", "3"]))
+    assert result.inserted == 0
+    assert [reject["record"] for reject in result.rejects] == [2, 3, 4]
+    assert result.rejects[0]["reason"].startswith("Invalid JSON")
+
+
+def test_bulk_route(web, repository):
+    total = repository.get_total()
+    response = web.post("/api/expenses/bulk", data=CSV, content_type="text/csv")
+    assert response.status_code == 200
+    assert response.get_json()["inserted"] == 2
+    assert repository.get_total() == pytest.approx(total + 19.5)
+
+    response = web.post("/api/expenses/bulk?format=jsonl", data='{"amount": 1, "category": "Food"}\n{"amount": 1}\n')
+    assert response.status_code == 400
+    assert response.get_json()["rejects"] == [{"record": 2, "reason": "Unknown category: None"}]
+    assert repository.get_total() == pytest.approx(total + 19.5)
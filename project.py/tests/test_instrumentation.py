@@ -0,0 +1,117 @@
+import logging
+import sqlite3
+
+import pytest
+from flask import Flask
+
+import instrumentation
+from instrumentation import (REQUEST_SECONDS, SQL_ROWS, SQL_SECONDS, Counter, Histogram, InstrumentedConnection,
+                             instrument_app, statement_label)
+
+
+def _count(histogram, *labels):
+    return sum(histogram._values.get(labels, [0])[:-1])
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(seconds, "/a")
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 4.250000',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_counter_escapes_labels():
+    counter = Counter("rows_total", "Rows", ("statement",))
+    counter.inc(2, 'SELECT "a\\b"')
+    counter.inc(3, 'SELECT "a\\b"')
+    assert counter.render()[-1] == 'rows_total{statement="SELECT \\"a\\\\b\\""} 5'
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "metrics.db"), factory=InstrumentedConnection)
+    conn.execute("CREATE TABLE t (x)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    yield conn
+    conn.close()
+
+
+def test_statements_are_timed_and_their_rows_counted(conn):
+    sql = "SELECT x FROM t   WHERE x < ?"
+    label = statement_label(sql)
+    assert label == "SELECT x FROM t WHERE x < ?"
+    timed = _count(SQL_SECONDS, label)
+    rows = SQL_ROWS._values.get((label,), 0)
+
+    assert len(conn.execute(sql, (5,)).fetchall()) == 5
+    assert len(list(conn.execute(sql, (3,)))) == 3
+    cursor = conn.execute(sql, (2,))
+    while cursor.fetchone() is not None:
+        pass
+    assert len(conn.execute(sql, (10,)).fetchmany(4)) == 4
+
+    assert _count(SQL_SECONDS, label) == timed + 4
+    assert SQL_ROWS._values[(label,)] == rows + 5 + 3 + 2 + 4
+
+
+def test_slow_statements_are_logged(conn, monkeypatch, caplog):
+    monkeypatch.setitem(instrumentation._settings, "slow_query_ms", 0)
+    with caplog.at_level(logging.WARNING, logger="expenses.slow_sql"):
+        conn.execute("SELECT COUNT(*) FROM t WHERE x > ?", (4,)).fetchone()
+    assert "SELECT COUNT(*) FROM t WHERE x > ? (4,)" in caplog.text
+
+
+@pytest.fixture
+def app():
+    app = Flask("instrumented")
+    instrument_app(app, profiling=True)
+
+    @app.route("/items/<int:item>")
+    def item(item):
+        if item == 0:
+            raise RuntimeError("boom")
+        return str(item)
+
+    return app
+
+
+def test_requests_are_timed_per_route(app):
+    client = app.test_client()
+    ok = _count(REQUEST_SECONDS, "/items/<int:item>", "GET", "200")
+    failed = _count(REQUEST_SECONDS, "/items/<int:item>", "GET", "500")
+    unmatched = _count(REQUEST_SECONDS, "<unmatched>", "GET", "404")
+
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/2").status_code == 200
+    assert client.get("/items/0").status_code == 500
+    assert client.get("/nowhere").status_code == 404
+
+    assert _count(REQUEST_SECONDS, "/items/<int:item>", "GET", "200") == ok + 2
+    assert _count(REQUEST_SECONDS, "/items/<int:item>", "GET", "500") == failed + 1
+    assert _count(REQUEST_SECONDS, "<unmatched>", "GET", "404") == unmatched + 1
+
+    metrics = client.get("/metrics")
+    assert metrics.mimetype == "text/plain"
+    assert 'expenses_http_request_seconds_count{route="/items/<int:item>",method="GET",status="200"}' \
+        in metrics.get_data(as_text=True)
+
+
+def test_profiled_requests_return_their_stats(app):
+    response = app.test_client().get("/items/3?profile=1")
+    assert response.mimetype == "text/plain"
+    assert "cumulative" in response.get_data(as_text=True)
+
+
+def test_web_app_serves_metrics(web):
+    web.get("/api/category_totals")
+    text = web.get("/metrics").get_data(as_text=True)
+    assert 'expenses_http_request_seconds_count{route="/api/category_totals",method="GET",status="200"}' in text
+    assert "expenses_db_pool_connections" in text
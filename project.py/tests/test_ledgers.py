@@ -0,0 +1,104 @@
+import os
+import threading
+
+import pytest
+
+import ledgers
+from benchmark import generate_ledger
+from ledgers import LedgerAggregator, LedgerHandleCache, LedgerRouter
+
+
+@pytest.fixture(scope="module")
+def ledger_dir(tmp_path_factory):
+    base = tmp_path_factory.mktemp("ledgers")
+    for index, name in enumerate(("home", "team", "club")):
+        generate_ledger(str(base / f"{name}.db"), 200 * (index + 1), years=1).close()
+    return str(base)
+
+
+@pytest.fixture
+def handles(ledger_dir):
+    handles = LedgerHandleCache(LedgerRouter(ledger_dir), max_open=2, read_only=True)
+    yield handles
+    handles.close()
+
+
+def test_names_are_checked(handles):
+    assert handles.router.list_ledgers() == ["club", "home", "team"]
+    with pytest.raises(ValueError):
+        handles.get("../home")
+    with pytest.raises(KeyError):
+        handles.get("missing")
+    assert not os.path.exists(os.path.join(handles.router.base_dir, "missing.db"))
+
+
+def test_the_least_recently_used_handle_is_closed(handles):
+    home = handles.get("home")
+    team = handles.get("team")
+    assert handles.get("home") is home
+    handles.get("club")
+
+    assert list(handles._handles) == ["home", "club"]
+    assert team.repository.pool._closed
+    assert not home.repository.pool._closed
+    # Reopened on the next use
+    assert handles.get("team") is not team
+    assert home.repository.pool._closed
+
+
+def test_concurrent_opens_share_one_handle(handles, monkeypatch):
+    opened = []
+    ready = threading.Barrier(4)
+
+    class SlowLedger(ledgers.Ledger):
+        def __init__(self, *args, **kwargs):
+            # Every thread opens before any of them caches its handle
+            ready.wait(5)
+            super().__init__(*args, **kwargs)
+            opened.append(self)
+
+    monkeypatch.setattr(ledgers, "Ledger", SlowLedger)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(handles.get("home"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    [handle] = set(results)
+    assert len(results) == len(opened) == 4
+    assert [ledger.repository.pool._closed for ledger in opened].count(False) == 1
+    assert not handle.repository.pool._closed
+
+
+def test_totals_are_merged_across_ledgers(handles):
+    aggregator = LedgerAggregator(handles, max_workers=3)
+    result = aggregator.category_totals()
+    assert set(result["ledgers"]) == {"home", "team", "club"}
+    for name, totals in result["ledgers"].items():
+        assert totals == handles.get(name).category_totals()
+    for category, total in result["combined"].items():
+        assert total == pytest.approx(sum(totals.get(category, 0) for totals in result["ledgers"].values()))
+    assert result["total"] == pytest.approx(sum(result["combined"].values()))
+
+    monthly = aggregator.monthly_totals(["home", "team"])
+    assert list(monthly["combined"]) == sorted(monthly["combined"])
+    assert set(monthly["ledgers"]) == {"home", "team"}
+    assert sum(monthly["combined"].values()) == pytest.approx(
+        sum(result["ledgers"]["home"].values()) + sum(result["ledgers"]["team"].values()))
+
+
+def test_ledger_routes(web, web_module, handles, monkeypatch):
+    monkeypatch.setattr(web_module, "ledger_handles", handles)
+    monkeypatch.setattr(web_module, "ledger_aggregator", LedgerAggregator(handles))
+
+    assert web.get("/api/ledgers").get_json() == ["club", "home", "team"]
+    response = web.get("/api/ledgers/category_totals?ledger=home&ledger=club")
+    assert response.status_code == 200
+    totals = response.get_json()
+    assert set(totals["ledgers"]) == {"home", "club"}
+    home, club = handles.get("home").category_totals(), handles.get("club").category_totals()
+    assert totals["combined"] == pytest.approx({category: home.get(category, 0) + club.get(category, 0)
+                                                for category in home.keys() | club.keys()})
+    assert web.get("/api/ledgers/category_totals?ledger=missing").status_code == 404
+    assert web.get("/api/ledgers/monthly_totals?ledger=..%2Fhome").status_code == 400
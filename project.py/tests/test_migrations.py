@@ -0,0 +1,65 @@
+import sqlite3
+import threading
+
+from benchmark import generate_ledger
+from migrations import LATEST_VERSION, get_schema_version, migrate
+from rollups import verify_rollups
+from stats import verify_stats
+
+
+def _text_layout_totals(conn):
+    return dict(conn.execute(
+        "SELECT category, ROUND(SUM(amount), 2) FROM expenses GROUP BY category").fetchall())
+
+
+def test_pre_v5_ledger_migrates_to_latest(tmp_path):
+    db_file = str(tmp_path / "old.db")
+    # Version 4 is the last with a plain text-layout expenses table
+    conn = generate_ledger(db_file, 800, target=4)
+    assert get_schema_version(conn) == 4
+    count = conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    totals = _text_layout_totals(conn)
+
+    assert migrate(conn) == LATEST_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM expense_records").fetchone()[0] == count
+    # The expenses view reads the migrated rows back in the old layout
+    assert _text_layout_totals(conn) == totals
+    assert verify_rollups(conn) == []
+    assert verify_stats(conn) == []
+    conn.close()
+
+
+def test_migrate_is_idempotent(tmp_path):
+    db_file = str(tmp_path / "old.db")
+    conn = generate_ledger(db_file, 100, target=1)
+    assert migrate(conn) == LATEST_VERSION
+    assert migrate(conn) == LATEST_VERSION
+    conn.close()
+
+
+def test_concurrent_migrations_apply_each_step_once(tmp_path):
+    db_file = str(tmp_path / "old.db")
+    generate_ledger(db_file, 500, target=1).close()
+    results, errors = [], []
+
+    def run():
+        conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+        try:
+            results.append(migrate(conn))
+        except sqlite3.Error as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert results == [LATEST_VERSION] * 4
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("SELECT COUNT(*) FROM expense_records").fetchone()[0] == 500
+    assert verify_rollups(conn) == []
+    conn.close()
@@ -0,0 +1,53 @@
+import pytest
+
+from migrations import INSERT_EXPENSE
+
+
+def _page_through(repository, limit, **kwargs):
+    pages, after = [], None
+    while True:
+        expenses, after = repository.get_expenses_page(limit=limit, after=after, **kwargs)
+        pages.append(expenses)
+        if after is None:
+            return pages
+
+
+@pytest.fixture
+def tied_repository(repository):
+    """The generated ledger plus 25 expenses all dated the same second, newer than any other"""
+    with repository.get_db_connection() as conn:
+        conn.executemany(INSERT_EXPENSE, [
+            (1 + i, "Food" if i % 2 else "Other", f"tied {i}", "2030-01-01 12:00:00") for i in range(25)
+        ])
+        conn.commit()
+    return repository
+
+
+def test_pages_cover_every_expense_once_across_equal_timestamps(tied_repository):
+    pages = _page_through(tied_repository, 7)
+    ids = [expense['id'] for page in pages for expense in page]
+    assert all(len(page) == 7 for page in pages[:-1])
+    assert len(ids) == len(set(ids)) == len(tied_repository.get_expenses())
+    # Newest first, and by id within the same second
+    keys = [(expense['date'], expense['id']) for page in pages for expense in page]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_a_page_boundary_inside_a_tie_resumes_after_it(tied_repository):
+    first, after = tied_repository.get_expenses_page(limit=4)
+    assert {expense['date'] for expense in first} == {"2030-01-01 12:00:00"}
+    second, _ = tied_repository.get_expenses_page(limit=4, after=after)
+    assert [expense['id'] for expense in second] == [first[-1]['id'] - i for i in range(1, 5)]
+
+
+def test_category_pages_across_equal_timestamps(tied_repository):
+    pages = _page_through(tied_repository, 5, category="Food")
+    ids = [expense['id'] for page in pages for expense in page]
+    expected = [expense['id'] for expense in tied_repository.get_expenses("Food")]
+    assert sorted(ids) == sorted(expected)
+    assert len(ids) == len(set(ids))
+
+
+def test_malformed_cursor_is_rejected(repository):
+    with pytest.raises(ValueError):
+        repository.get_expenses_page(after="not a cursor")
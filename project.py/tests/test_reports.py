@@ -0,0 +1,73 @@
+import pytest
+
+from db import connect
+from migrations import INSERT_EXPENSE
+from reports import Period, format_reports, generate_reports, periods_for_year
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = connect(db_file)
+    yield conn
+    conn.close()
+
+
+def _expected_total(conn, start, end):
+    return conn.execute("SELECT COALESCE(ROUND(SUM(amount), 2), 0) FROM expenses WHERE date >= ? AND date < ?",
+                        (start, end)).fetchone()[0]
+
+
+def test_overlapping_periods_match_a_recomputation(conn):
+    labels = ["2024", "2024-Q2", "2024-05", "2025-12"]
+    reports = generate_reports(conn, labels)
+    assert [report['period'] for report in reports] == labels
+    for report in reports:
+        assert round(report['total'], 2) == _expected_total(conn, report['start'], report['end'])
+        assert round(sum(report['categories'].values()), 2) == round(report['total'], 2)
+
+
+def test_details_hold_each_periods_expenses_in_date_order(conn):
+    month, quarter = generate_reports(conn, ["2024-05", "2024-Q2"], include_expenses=True)
+    assert len(month['expenses']) == month['count']
+    assert len(quarter['expenses']) == quarter['count']
+    dates = [expense['date'] for expense in quarter['expenses']]
+    assert dates == sorted(dates)
+    assert {expense['id'] for expense in month['expenses']} <= {expense['id'] for expense in quarter['expenses']}
+
+
+def test_the_last_representable_year_reports_with_details(conn):
+    conn.execute(INSERT_EXPENSE, (42.0, "Food", "far future", "9999-12-31 23:59:59"))
+    conn.commit()
+    december, year = generate_reports(conn, ["9999-12", "9999"], include_expenses=True)
+    assert december['total'] == year['total'] == 42.0
+    assert [expense['description'] for expense in year['expenses']] == ["far future"]
+
+
+def test_periods_for_a_year():
+    assert periods_for_year(2024, "quarterly") == ["2024-Q1", "2024-Q2", "2024-Q3", "2024-Q4"]
+    assert len(periods_for_year(2024, "monthly")) == 12
+    with pytest.raises(ValueError):
+        periods_for_year(2024, "weekly")
+
+
+@pytest.mark.parametrize("label", ["2024-13", "2024-Q5", "24", "2024-1"])
+def test_invalid_periods_are_rejected(label):
+    with pytest.raises(ValueError):
+        Period(label)
+
+
+def test_formats_agree(conn):
+    reports = generate_reports(conn, ["2024-Q1"])
+    assert "Q1 2024" in format_reports(reports, "text")
+    assert format_reports(reports, "csv").startswith("period")
+
+
+@pytest.mark.parametrize("query", ["year=9999&details=1", "year=9999&granularity=yearly&details=1&format=csv"])
+def test_web_reports_for_year_9999(web, query):
+    assert web.get(f"/api/reports?{query}").status_code == 200
+
+
+def test_web_rejects_bad_report_requests(web):
+    assert web.get("/api/reports").status_code == 400
+    assert web.get("/api/reports?year=10000").status_code == 400
+    assert web.get("/api/reports?period=2024-13").status_code == 400
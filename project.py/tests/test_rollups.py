@@ -0,0 +1,37 @@
+from db import connect
+from rollups import rebuild_rollups, verify_rollups
+
+
+def _churn(conn):
+    """Insert, update and delete rows the way the web app and the CLI tools do"""
+    conn.execute("DELETE FROM expense_records WHERE id % 5 = 0")
+    conn.execute("UPDATE expense_records SET amount_cents = amount_cents + 99 WHERE id % 7 = 0")
+    conn.execute("UPDATE expense_records SET category_id = 1 + category_id % 6 WHERE id % 11 = 0")
+    conn.execute("UPDATE expense_records SET ts = ts - 86400 * 40 WHERE id % 13 = 0")
+    conn.commit()
+
+
+def test_rollups_follow_writes(db_file, repository):
+    assert repository.add_expense(12.34, "Food", "lunch")
+    assert repository.remove_expense(1)
+    with repository.get_db_connection() as conn:
+        _churn(conn)
+        assert verify_rollups(conn) == []
+
+
+def test_totals_come_from_rollups(repository):
+    with repository.get_db_connection() as conn:
+        expected = {row[0]: row[1] for row in conn.execute(
+            "SELECT category, ROUND(SUM(amount), 2) FROM expenses GROUP BY category")}
+    totals = repository.get_stored_category_totals()
+    assert {category: round(total, 2) for category, total in totals.items()} == expected
+
+
+def test_rebuild_repairs_drift(db_file):
+    conn = connect(db_file)
+    conn.execute("UPDATE category_rollup SET total_cents = total_cents + 1")
+    conn.commit()
+    assert verify_rollups(conn) != []
+    rebuild_rollups(conn)
+    assert verify_rollups(conn) == []
+    conn.close()
@@ -0,0 +1,73 @@
+import pytest
+
+from db import connect
+from search import SearchQuery
+
+
+def _descriptions(repository, text, **filters):
+    expenses, _ = repository.search_expenses(SearchQuery(text, **filters), limit=50)
+    return sorted(expense['description'] for expense in expenses)
+
+
+def _check_index(db_file):
+    conn = connect(db_file)
+    try:
+        # Fails if the index and expense_records disagree
+        conn.execute("INSERT INTO expense_search (expense_search) VALUES ('integrity-check')")
+    finally:
+        conn.close()
+
+
+def test_index_follows_inserts_updates_and_deletes(repository, db_file):
+    assert repository.add_expense(4.5, "Food", "zanzibar coffee")
+    [expense] = repository.search_expenses(SearchQuery("zanzibar"))[0]
+    _check_index(db_file)
+
+    conn = connect(db_file)
+    conn.execute("UPDATE expense_records SET description = 'quokka tea' WHERE id = ?", (expense['id'],))
+    conn.commit()
+    conn.close()
+    assert _descriptions(repository, "zanzibar") == []
+    assert _descriptions(repository, "quokka") == ["quokka tea"]
+    _check_index(db_file)
+
+    assert repository.remove_expense(expense['id'])
+    assert _descriptions(repository, "quokka") == []
+    _check_index(db_file)
+
+
+def test_prefix_and_phrase_queries(repository):
+    for description in ("zanzibar wombat burrow", "zanzibar burrow wombat", "zanzibarian wombat"):
+        assert repository.add_expense(3, "Food", description)
+
+    # Every word must match; only the last one also as a prefix
+    assert _descriptions(repository, "wombat zanzib") == [
+        "zanzibar burrow wombat", "zanzibar wombat burrow", "zanzibarian wombat"]
+    assert _descriptions(repository, "zanzib wombat") == []
+    assert _descriptions(repository, "zanzibar wombat") == ["zanzibar burrow wombat", "zanzibar wombat burrow"]
+    # A quoted phrase matches its words in order, and is never a prefix
+    assert _descriptions(repository, '"wombat burrow"') == ["zanzibar wombat burrow"]
+    assert _descriptions(repository, '"wombat bur"') == []
+    assert _descriptions(repository, '"zanzibar wombat" bur') == ["zanzibar wombat burrow"]
+    # FTS5 syntax outside quotes is not an operator
+    assert _descriptions(repository, "zanzibar* -(burrow") == ["zanzibar burrow wombat", "zanzibar wombat burrow"]
+    assert _descriptions(repository, "wombat", category="Food", min_amount="3", max_amount="3") == [
+        "zanzibar burrow wombat", "zanzibar wombat burrow", "zanzibarian wombat"]
+
+
+@pytest.mark.parametrize("q", ['"coffee shop', 'coffee "shop" "', 'NEAR(coffee shop) "'])
+def test_malformed_query_is_answered_with_400(web, q):
+    response = web.get("/api/expenses/search", query_string={"q": q})
+    assert response.status_code == 400
+    assert "unbalanced quote" in response.get_json()['error']
+
+
+def test_search_route_pages_matches(web, repository):
+    for index in range(3):
+        assert repository.add_expense(index + 1, "Food", f"zanzibar {index}")
+    first = web.get("/api/expenses/search?q=zanzibar&limit=2").get_json()
+    second = web.get("/api/expenses/search", query_string={"q": "zanzibar", "limit": 2,
+                                                         "after": first['next_cursor']}).get_json()
+    assert [expense['description'] for expense in first['expenses'] + second['expenses']] == [
+        "zanzibar 2", "zanzibar 1", "zanzibar 0"]
+    assert second['next_cursor'] is None
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from db import ConnectionPool
+from migrations import INSERT_EXPENSE
+from snapshot import LedgerSnapshot
+
+SELECT_ROWS = "SELECT id, amount_cents, category_id, description, ts FROM expense_records ORDER BY id"
+SELECT_ROLLUP = "SELECT month, category_id, total_cents, count FROM monthly_rollup ORDER BY 1, 2"
+SELECT_STATS = "SELECT month, category_id, count, round(mean, 6) FROM amount_stats ORDER BY 1, 2"
+
+
+@pytest.fixture
+def pool(db_file):
+    pool = ConnectionPool(db_file, 2)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def snapshot(pool):
+    snapshot = LedgerSnapshot(pool, max_staleness=60)
+    yield snapshot
+    snapshot.close()
+
+
+def _read(source, sql):
+    with source.connection() as conn:
+        return [tuple(row) for row in conn.execute(sql).fetchall()]
+
+
+def test_replay_matches_the_ledger(pool, snapshot):
+    assert _read(snapshot, SELECT_ROWS) == _read(pool, SELECT_ROWS)
+
+    with pool.connection() as conn:
+        conn.executemany(INSERT_EXPENSE, [
+            (12.5, "Food", "new 1", "2025-06-01 08:00:00"),
+            (99.0, "Housing", "new 2", "2025-06-02 09:00:00"),
+        ])
+        first_id = conn.execute("SELECT MIN(id) FROM expense_records").fetchone()[0]
+        conn.execute("DELETE FROM expense_records WHERE id = ?", (first_id,))
+        conn.execute("UPDATE expense_records SET amount_cents = amount_cents + 1 WHERE id = ?", (first_id + 1,))
+        conn.commit()
+    snapshot.refresh()
+
+    assert snapshot.metrics()['incremental_refreshes'] == 1
+    for sql in (SELECT_ROWS, SELECT_ROLLUP, SELECT_STATS):
+        assert _read(snapshot, sql) == _read(pool, sql)
+    with pool.connection() as conn:
+        version = conn.execute("SELECT version FROM data_version").fetchone()[0]
+    assert snapshot.current_version() == version
+
+
+def test_unchanged_ledger_is_not_copied_again(snapshot):
+    # The first refresh takes the copy
+    for _ in range(3):
+        snapshot.refresh()
+    stats = snapshot.metrics()
+    assert stats['full_refreshes'] == 1
+    assert stats['unchanged_refreshes'] == 2
+
+
+def test_many_changes_take_a_new_copy(pool, snapshot):
+    snapshot.refresh()
+    with pool.connection() as conn:
+        conn.execute("DELETE FROM expense_records WHERE id % 2 = 0")
+        conn.commit()
+    snapshot.refresh()
+    assert snapshot.metrics()['full_refreshes'] == 2
+    assert _read(snapshot, SELECT_ROWS) == _read(pool, SELECT_ROWS)
+
+
+def test_replaced_copy_is_closed_by_its_last_reader(snapshot):
+    reading, done = threading.Event(), threading.Event()
+    seen = []
+
+    def reader():
+        with snapshot.connection() as conn:
+            reading.set()
+            done.wait(5)
+            seen.append(conn.execute("SELECT COUNT(*) FROM expense_records").fetchone()[0])
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    reading.wait(5)
+    # A full copy is swapped in while the reader is still on the old one
+    snapshot._copy()
+    assert snapshot.metrics()['open_copies'] == 2
+    done.set()
+    thread.join()
+
+    assert seen and seen[0] > 0
+    assert snapshot.metrics()['open_copies'] == 1
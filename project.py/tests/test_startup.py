@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmark import STARTUP_BUDGETS_MS, import_time_ms
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on the first analysis or chart, never at startup
+HEAVY_MODULES = ("numpy", "matplotlib", "columnar")
+
+
+@pytest.mark.parametrize("module", STARTUP_BUDGETS_MS)
+def test_entry_points_do_not_import_heavy_modules(module, tmp_path):
+    script = f"import sys, {module}; print(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=PROJECT_DIR), stdin=subprocess.DEVNULL, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == []
+
+
+def test_import_time_is_measured(tmp_path):
+    assert 0 < import_time_ms("app", str(tmp_path)) < 10_000
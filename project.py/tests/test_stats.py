@@ -0,0 +1,84 @@
+import math
+
+import pytest
+
+import stats
+from db import connect
+from stats import merge_moments, sketch_quantiles, spending_stats, verify_stats
+
+
+def test_stats_follow_writes(db_file):
+    conn = connect(db_file)
+    assert verify_stats(conn) == []
+    conn.execute("DELETE FROM expense_records WHERE id % 5 = 0")
+    conn.execute("UPDATE expense_records SET amount_cents = amount_cents * 3 WHERE id % 7 = 0")
+    conn.execute("UPDATE expense_records SET ts = ts - 86400 * 40 WHERE id % 13 = 0")
+    conn.commit()
+    assert verify_stats(conn) == []
+    conn.close()
+
+
+def test_stats_match_a_recomputation(db_file):
+    conn = connect(db_file)
+    amounts = [row[0] for row in conn.execute("SELECT amount_cents FROM expense_records")]
+    stats = spending_stats(conn)['all']
+    mean = sum(amounts) / len(amounts)
+    stddev = math.sqrt(sum((a - mean) ** 2 for a in amounts) / (len(amounts) - 1))
+    assert stats['count'] == len(amounts)
+    assert stats['total'] == round(sum(amounts) / 100, 2)
+    assert stats['mean'] == round(mean / 100, 2)
+    assert stats['stddev'] == round(stddev / 100, 2)
+
+    # The median is the exact one truncated to two significant digits
+    amounts.sort()
+    median = amounts[math.ceil(len(amounts) / 2) - 1]
+    assert stats['p50'] <= median / 100
+    assert stats['p50'] > median / 100 * 0.9
+    conn.close()
+
+
+def test_merge_moments_matches_one_pass():
+    a, b = [1.0, 2.0, 4.0], [8.0, 16.0]
+
+    def moments(values):
+        mean = sum(values) / len(values)
+        return len(values), mean, sum((v - mean) ** 2 for v in values)
+
+    merged = merge_moments(moments(a), moments(b))
+    expected = moments(a + b)
+    assert merged[0] == expected[0]
+    assert math.isclose(merged[1], expected[1])
+    assert math.isclose(merged[2], expected[2])
+
+
+def test_quantiles_never_overshoot_the_values():
+    assert sketch_quantiles([(5000, 1)]) == {0.5: 5000, 0.9: 5000, 0.95: 5000, 0.99: 5000}
+    assert sketch_quantiles([(100000, 200)])[0.99] == 100000
+    assert sketch_quantiles([(50, 1), (99, 1), (1000, 2)]) == {0.5: 99, 0.9: 1000, 0.95: 1000, 0.99: 1000}
+
+
+@pytest.mark.parametrize("path", ["/api/budgets", "/api/stats"])
+def test_budget_results_follow_the_month_without_writes(web, web_module, repository, monkeypatch, path):
+    repository.set_budget("Food", 100)
+    month = ["2030-01"]
+    monkeypatch.setattr(web_module, "current_month", lambda: month[0])
+    monkeypatch.setattr(stats, "current_month", lambda: month[0])
+
+    first = web.get(path)
+    assert first.status_code == 200
+    assert web.get(path, headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    # A new month, and nothing written since
+    month[0] = "2030-02"
+    second = web.get(path, headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+
+
+def test_budgets_for_a_given_month_keep_their_etag(web, web_module, monkeypatch):
+    month = ["2030-01"]
+    monkeypatch.setattr(web_module, "current_month", lambda: month[0])
+    first = web.get("/api/budgets?month=2025-06")
+    month[0] = "2030-02"
+    assert web.get("/api/budgets?month=2025-06",
+                   headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
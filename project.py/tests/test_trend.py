@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from db import connect
+from trend import bucket_totals, build_trend, lttb
+
+
+@pytest.fixture
+def conn(db_file):
+    conn = connect(db_file)
+    yield conn
+    conn.close()
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    y[517] = 10
+    kept = lttb(x, y, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert np.all(np.diff(kept) > 0)
+    assert 517 in kept
+
+
+@pytest.mark.parametrize("threshold", [2, 10, 11])
+def test_lttb_keeps_short_series_whole(threshold):
+    assert lttb(np.arange(10), np.arange(10.0), threshold).tolist() == list(range(10))
+
+
+@pytest.mark.parametrize("bucket", ["day", "week", "month"])
+def test_buckets_add_up_to_the_total(repository, conn, bucket):
+    dates, totals = bucket_totals(conn, bucket)
+    assert np.all(np.diff(dates.astype(np.int64)) > 0)
+    assert totals.sum() == pytest.approx(repository.get_total())
+    if bucket == "week":
+        # Mondays
+        assert {date.weekday() for date in dates.astype(object)} == {0}
+    elif bucket == "month":
+        assert all(str(date).endswith("-01") for date in dates)
+
+
+def test_trend_is_downsampled_cumulative_spend(repository, conn):
+    full = build_trend(conn, "day", points=None)
+    trend = build_trend(conn, "day", points=100)
+    assert len(trend['labels']) == len(trend['values']) == 100
+    assert trend['labels'][0] == full['labels'][0] and trend['labels'][-1] == full['labels'][-1]
+    assert set(trend['labels']) <= set(full['labels'])
+    assert trend['values'] == sorted(trend['values'])
+    assert trend['values'][-1] == pytest.approx(repository.get_total(), abs=0.01)
+    with pytest.raises(ValueError):
+        bucket_totals(conn, "hour")
+
+
+def test_trend_route(web):
+    response = web.get("/api/trend?bucket=week&points=1")
+    assert response.status_code == 200
+    # At least three points are always sent
+    assert len(response.get_json()['labels']) == 3
+    assert web.get("/api/trend?bucket=hour").status_code == 400
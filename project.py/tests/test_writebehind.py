@@ -0,0 +1,107 @@
+import sqlite3
+
+import pytest
+
+from db import ConnectionPool
+from writebehind import QueueFull, WriteBehindQueue
+
+
+@pytest.fixture
+def pool(db_file):
+    pool = ConnectionPool(db_file, 2)
+    yield pool
+    pool.close()
+
+
+def _count(pool, description):
+    with pool.connection() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM expense_records WHERE description = ?", (description,)).fetchone()[0]
+
+
+def test_a_failing_row_fails_alone(pool):
+    writer = WriteBehindQueue(pool, batch_size=4, flush_interval=0.5)
+    try:
+        futures = [writer.submit((10.0, "Food", "batched", "2025-06-01 12:00:00")) for _ in range(3)]
+        # A NaN amount breaks the table's CHECK constraint
+        bad = writer.submit((float("nan"), "Food", "batched", "2025-06-01 12:00:00"))
+        ids = [future.result(5) for future in futures]
+        with pytest.raises(sqlite3.IntegrityError):
+            bad.result(5)
+    finally:
+        writer.close()
+
+    assert len(set(ids)) == 3
+    assert _count(pool, "batched") == 3
+    stats = writer.metrics()
+    assert stats['committed'] == 3
+    assert stats['failed'] == 1
+
+
+def test_writer_survives_a_failing_listener(pool):
+    calls = []
+
+    def on_commit():
+        calls.append(1)
+        raise RuntimeError("listener failed")
+
+    writer = WriteBehindQueue(pool, batch_size=1, flush_interval=0.01, on_commit=on_commit)
+    try:
+        first = writer.add((1.0, "Food", "listened", "2025-06-01 12:00:00"), timeout=5)
+        second = writer.add((2.0, "Food", "listened", "2025-06-01 12:00:01"), timeout=5)
+    finally:
+        writer.close()
+
+    assert first != second
+    assert len(calls) == 2
+    assert _count(pool, "listened") == 2
+
+
+def test_full_queue_is_rejected(pool):
+    writer = WriteBehindQueue(pool, batch_size=100, flush_interval=5, max_queue=1)
+    try:
+        # The writer takes the first row and waits for more; the next fills the queue
+        writer.submit((1.0, "Food", "full", "2025-06-01 12:00:00"))
+        rejected = 0
+        for _ in range(3):
+            try:
+                writer.submit((1.0, "Food", "full", "2025-06-01 12:00:00"))
+            except QueueFull:
+                rejected += 1
+        assert rejected >= 1
+        assert writer.metrics()['rejected'] == rejected
+    finally:
+        writer.close()
+
+
+@pytest.mark.parametrize("amount", ["nan", "inf", "-inf", "1e400"])
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_non_finite_amounts_are_rejected(repository, write_behind, amount):
+    if write_behind:
+        repository.enable_write_behind(batch_size=1, flush_interval=0.01)
+    with pytest.raises(ValueError):
+        repository.add_expense(amount, "Food", "not a number")
+    assert repository.get_expenses_page(limit=1)[0][0]['description'] != "not a number"
+
+
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_web_rejects_non_finite_amounts(web, repository, write_behind):
+    if write_behind:
+        repository.enable_write_behind(batch_size=1, flush_interval=0.01)
+    for amount in ("nan", "inf", "-inf", "abc", None):
+        data = {'category': 'Food', 'description': 'web'}
+        if amount is not None:
+            data['amount'] = amount
+        response = web.post('/add_expense', data=data)
+        assert response.status_code == 400
+        assert response.get_data(as_text=True) == "Invalid amount"
+    assert web.post('/add_expense', data={'amount': '12.50', 'category': 'Food'},
+                    headers={'Accept': 'application/json'}).status_code == 201
+
+
+def test_web_maps_a_refused_row_to_400(web, repository, monkeypatch):
+    def refuse(*args):
+        raise sqlite3.IntegrityError("NOT NULL constraint failed")
+
+    monkeypatch.setattr(repository, "add_expense", refuse)
+    assert web.post('/add_expense', data={'amount': '1', 'category': 'Food'}).status_code == 400
@@ -0,0 +1,95 @@
+from archive import attach_archives
+
+# numpy is imported inside the functions so that importing this module (as the
+# web app does at startup) stays cheap
+BUCKETS = ("day", "week", "month")
+
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+
+
+def bucket_totals(conn, bucket="day"):
+    """Return (bucket start dates as datetime64[D], summed amounts) in date order"""
+    import numpy as np
+
+    if bucket == "month":
+        # Served straight from the monthly rollups, archived months included
+        rows = conn.execute('''
+            SELECT month || '-01', SUM(total_cents) FROM ledger_monthly_rollup
+            GROUP BY month ORDER BY month
+        ''').fetchall()
+        dates = np.array([row[0] for row in rows], dtype="datetime64[D]")
+    elif bucket in ("day", "week"):
+        # Whole days since the epoch, which NumPy takes as datetime64[D] directly
+        attach_archives(conn)
+        rows = conn.execute('''
+            SELECT day, SUM(total_cents) FROM ledger_daily_totals
+            GROUP BY day ORDER BY day
+        ''').fetchall()
+        dates = np.array([row[0] for row in rows], dtype=np.int64).astype("datetime64[D]")
+    else:
+        raise ValueError(f"Unsupported bucket: {bucket}")
+
+    totals = np.array([row[1] for row in rows], dtype=np.float64) / 100
+
+    if bucket == "week" and len(dates):
+        # Fold days onto the Monday starting their week (1970-01-01 was a Thursday)
+        weekday = (dates.astype(np.int64) + 3) % 7
+        weeks, inverse = np.unique(dates - weekday, return_inverse=True)
+        totals = np.bincount(inverse, weights=totals, minlength=len(weeks))
+        dates = weeks
+
+    return dates, totals
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices of the kept points"""
+    import numpy as np
+
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    # The points between the first and last are split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+
+    return kept
+
+
+def build_trend(conn, bucket="day", points=DEFAULT_POINTS):
+    """Cumulative spend per bucket, downsampled to at most points entries"""
+    import numpy as np
+
+    dates, totals = bucket_totals(conn, bucket)
+    cumulative = np.cumsum(totals)
+
+    if points and len(dates) > points:
+        kept = lttb(dates.astype(np.int64), cumulative, points)
+        dates, cumulative = dates[kept], cumulative[kept]
+
+    return {
+        'bucket': bucket,
+        'labels': [str(date) for date in dates],
+        'values': np.round(cumulative, 2).tolist(),
+    }
@@ -0,0 +1,172 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from migrations import INSERT_EXPENSE
+
+DEFAULT_WRITE_BATCH_SIZE = 500
+# Seconds the writer waits to fill a batch. With 0 it commits whatever queued
+# up during the previous commit (group commit), which suits WAL mode best.
+DEFAULT_FLUSH_INTERVAL = 0.0
+DEFAULT_MAX_QUEUE = 10000
+DEFAULT_ACK_TIMEOUT = 10.0
+
+_STOP = object()
+
+log = logging.getLogger("expenses.write_behind")
+
+
+class QueueFull(Exception):
+    """Raised when the write queue is full, so callers can shed load instead of piling up"""
+
+
+class WriteBehindQueue:
+    """Groups expense inserts from many threads into batched transactions on one writer thread.
+
+    submit() returns a Future that resolves to the new row id once the batch
+    holding it has committed, which is the durability acknowledgement; add()
+    waits for it. A batch is written when batch_size rows are queued or
+    flush_interval has passed since its first row, whichever comes first.
+    When the queue is full, submit() raises QueueFull rather than blocking.
+    Each row is inserted under its own savepoint, so a row that fails (say,
+    a NaN amount) fails only its own caller and the rest of the batch commits.
+    """
+
+    def __init__(self, pool, batch_size=DEFAULT_WRITE_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_queue=DEFAULT_MAX_QUEUE, on_commit=None):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_commit = on_commit
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0, 'rejected': 0, 'committed': 0, 'failed': 0, 'batches': 0,
+            'commit_ms_total': 0.0, 'commit_ms_max': 0.0, 'commit_ms_last': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, row, timeout=0.0):
+        """Queue an (amount, category, description, date) row, waiting at most timeout for room"""
+        future = Future()
+        try:
+            self._queue.put((row, future), block=timeout > 0, timeout=timeout or None)
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise QueueFull(f"Write queue is full ({self._queue.maxsize} pending)")
+        with self._lock:
+            self._stats['submitted'] += 1
+        return future
+
+    def add(self, row, timeout=DEFAULT_ACK_TIMEOUT):
+        """Queue a row and wait until it is committed, returning its id.
+
+        A TimeoutError means the row was not confirmed in time, not that it
+        was dropped: it stays queued and may still commit, so retrying it
+        blindly can store it twice. QueueFull means it was never queued.
+        """
+        return self.submit(row).result(timeout)
+
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Write what we have, then stop on the next call
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("BEGIN")
+                try:
+                    results = [self._insert(conn, row) for row, _ in batch]
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+        except Exception as e:
+            with self._lock:
+                self._stats['failed'] += len(batch)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        failed = sum(isinstance(result, Exception) for result in results)
+        with self._lock:
+            stats = self._stats
+            stats['committed'] += len(batch) - failed
+            stats['failed'] += failed
+            stats['batches'] += 1
+            stats['commit_ms_total'] += elapsed_ms
+            stats['commit_ms_last'] = elapsed_ms
+            stats['commit_ms_max'] = max(stats['commit_ms_max'], elapsed_ms)
+        if self.on_commit is not None:
+            # A failing listener must not take the writer thread down with it
+            try:
+                self.on_commit()
+            except Exception:
+                log.exception("write-behind on_commit listener failed")
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _insert(self, conn, row):
+        """Insert one row under a savepoint, returning its id, or the error that undid it"""
+        conn.execute("SAVEPOINT write_behind_row")
+        try:
+            row_id = conn.execute(INSERT_EXPENSE, row).lastrowid
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK TO write_behind_row")
+            conn.execute("RELEASE write_behind_row")
+            return e
+        conn.execute("RELEASE write_behind_row")
+        return row_id
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._write(batch)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats.pop('batches')
+        commit_ms_total = stats.pop('commit_ms_total')
+        stats.update({
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'batches': batches,
+            'avg_batch_size': round(stats['committed'] / batches, 1) if batches else 0.0,
+            'commit_ms_avg': round(commit_ms_total / batches, 2) if batches else 0.0,
+            'commit_ms_max': round(stats['commit_ms_max'], 2),
+            'commit_ms_last': round(stats['commit_ms_last'], 2),
+        })
+        return stats
+
+    def close(self):
+        """Flush everything queued so far and stop the writer thread"""
+        self._queue.put(_STOP)
+        self._thread.join()